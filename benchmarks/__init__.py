@@ -0,0 +1,25 @@
+"""
+效能測試腳本，從專案根目錄執行，例如：
+    python -m benchmarks.bench_cik_lookup
+"""
+import contextlib
+import os
+import tempfile
+
+import database as db
+
+
+@contextlib.contextmanager
+def temp_workdir():
+    """切換到暫存資料夾，讓 database/stock.db 建在裡面，不影響正式資料"""
+    old_cwd = os.getcwd()
+    old_path = db.DB_PATH
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path)
+        db.configure(path=os.path.join(path, 'database', 'stock.db'))
+        try:
+            yield path
+        finally:
+            db.close_connection()
+            db.configure(path=old_path)
+            os.chdir(old_cwd)
@@ -0,0 +1,112 @@
+"""
+比較 update_all_ticker 的逐檔抓取與批次抓取（離線模擬 yfinance，每次請求固定延遲）
+  single：每檔一次 fetcher 請求
+  batch ：最後日期相同的股票每 BATCH_SIZE 檔合併成一次 batch_fetcher 請求，寬表再一次拆回各檔
+
+模擬每日更新：大部分股票差 2 天、少部分差 5 天；每 FAIL_EVERY 檔在批次結果中缺漏，必須改用逐檔重抓。
+兩種方式寫入的股價必須完全相同。
+
+用法：
+    python -m benchmarks.bench_batch_fetch [tickers] [latency_ms] [workers]
+"""
+import contextlib
+import functools
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_sources
+import database as db
+import download_data as download
+from benchmarks import temp_workdir
+
+HISTORY_DAYS = 300
+FAIL_EVERY = 25
+
+
+@functools.lru_cache(maxsize=None)
+def _full_history(index):
+    rng = np.random.default_rng(index)
+    dates = pd.bdate_range(end="2025-12-31", periods=HISTORY_DAYS, tz="America/New_York", name="Date")
+    close = 100 + rng.standard_normal(HISTORY_DAYS).cumsum()
+    df = pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                       'Volume': rng.integers(1_000, 1_000_000, HISTORY_DAYS),
+                       'Dividends': 0.0, 'Stock Splits': 0.0}, index=dates)
+    return df
+
+
+def yahoo_history(index, start_date=None):
+    """產生與 Ticker.history 相同格式的假股價（模擬的成本只有請求延遲，資料先快取起來）"""
+    df = _full_history(index).copy()
+    if start_date:
+        df = df[df.index >= pd.Timestamp(start_date, tz="America/New_York")]
+    return df
+
+
+def make_fetchers(tickers, latency):
+    index = {t: i for i, t in enumerate(tickers)}
+    requests = {'single': 0, 'batch': 0}
+
+    def fetcher(ticker, start_date):
+        requests['single'] += 1
+        time.sleep(latency)
+        return yahoo_history(index[ticker], start_date)
+
+    def batch_fetcher(batch, start_date):
+        """與 yf.download(group_by="column") 相同的寬表：時區拿掉、以日期聯集對齊、欄位為 (Price, Ticker)"""
+        requests['batch'] += 1
+        time.sleep(latency)
+        frames = {}
+        for ticker in batch:
+            if index[ticker] % FAIL_EVERY == 0:
+                continue  # yfinance 的個別失敗只會記錄錯誤，不會出現在結果中
+            frames[ticker] = yahoo_history(index[ticker], start_date)
+        return data_sources.combine_histories(frames)
+
+    return fetcher, batch_fetcher, requests
+
+
+def run(tickers, latency, workers, batch_size):
+    with temp_workdir():
+        db.create_table()
+        # 先寫入舊資料：大部分差 2 個交易日，每 10 檔有一檔差 5 個交易日
+        history = []
+        for i, ticker in enumerate(tickers):
+            df = yahoo_history(i).iloc[:-(5 if i % 10 == 0 else 2)]
+            history.append(download.format_history(df, ticker))
+        db.insert_price(pd.concat(history))
+
+        fetcher, batch_fetcher, requests = make_fetchers(tickers, latency)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = download.update_all_ticker(workers=workers, fetcher=fetcher, batch_size=batch_size,
+                                                 batch_fetcher=batch_fetcher)
+        elapsed = time.perf_counter() - t0
+        prices = pd.concat([db.select_price(t) for t in tickers], ignore_index=True)
+    return elapsed, requests, summary, prices
+
+
+def main(n_tickers=500, latency_ms=50, workers=8):
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    latency = latency_ms / 1000
+    print(f"📊 update_all_ticker: {n_tickers} tickers, {latency_ms} ms per request, {workers} workers")
+
+    t_single, req_single, sum_single, expected = run(tickers, latency, workers, 0)
+    t_batch, req_batch, sum_batch, actual = run(tickers, latency, workers, download.BATCH_SIZE)
+
+    for name, elapsed, requests, summary in (("single", t_single, req_single, sum_single),
+                                              ("batch", t_batch, req_batch, sum_batch)):
+        print(f"   {name:<6} {elapsed:6.2f}s | {requests['batch']:3d} batch + {requests['single']:4d} single requests "
+              f"| {summary['success']} ok, {summary['failed']} failed")
+    ok = expected.equals(actual) and sum_batch['failed'] == 0
+    print(f"   speedup {t_single / t_batch:.1f}x")
+    print("   ✅ results identical" if ok else "   ❌ results differ")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    sys.exit(0 if main(*args) else 1)
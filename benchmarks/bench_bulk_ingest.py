@@ -0,0 +1,95 @@
+"""
+量測 bulk_ingest 從 companyfacts.zip 匯入基本面的速度
+  serial：逐檔 json.loads → build_fundamentals → insert_fundamentals（一家公司寫入一次）
+  bulk  ：bulk_ingest.ingest（process pool 串流解析、分批寫入）
+
+假的 zip 裡包含資料庫中沒有的 CIK（應該被略過），也有兩個 ticker 共用同一個 CIK 的情況；
+兩種方式寫入的 fundamentals_annual 必須完全相同。
+
+用法：
+    python -m benchmarks.bench_bulk_ingest [companies] [workers]
+"""
+import json
+import os
+import sys
+import time
+import zipfile
+
+import pandas as pd
+
+import bulk_ingest
+import database as db
+from benchmarks import temp_workdir
+from benchmarks.fixtures import make_companyfacts_zip
+from download_data import build_fundamentals
+
+# 每 10 家公司多放一家資料庫中沒有的公司
+UNMAPPED_EVERY = 10
+
+
+def setup_tickers(n_companies):
+    """建立 ticker 與 CIK 對照表，回傳 zip 中要放的 CIK"""
+    tickers = [f"T{i:04d}" for i in range(n_companies)] + ["T0000B"]
+    db.insert_price(pd.DataFrame({
+        'date': "2025-01-02", 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+        'volume': 100, 'dividends': 0.0, 'stock_splits': 0.0, 'ticker': tickers,
+    }))
+    index = {t: str(100000 + i).zfill(10) for i, t in enumerate(tickers[:-1])}
+    index["T0000B"] = index["T0000"]  # 不同股別共用同一個 CIK
+    db.replace_cik_index(index, time.time())
+
+    ciks = [100000 + i for i in range(n_companies)]
+    ciks += [900000 + i for i in range(n_companies // UNMAPPED_EVERY)]
+    return ciks
+
+
+def serial_ingest(zip_path):
+    by_cik = bulk_ingest.load_ticker_ciks()
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in zf.namelist():
+            tickers = by_cik.get(bulk_ingest._member_cik(name))
+            if not tickers:
+                continue
+            facts = json.loads(zf.read(name))
+            us_gaap = facts["facts"].get("us-gaap") or facts["facts"].get("ifrs-full")
+            for ticker in tickers:
+                df = build_fundamentals(ticker, us_gaap)
+                if df is not None:
+                    db.insert_fundamentals(df)
+
+
+def snapshot():
+    conn = db.get_connection()
+    return pd.read_sql_query(
+        f"SELECT {', '.join(db.FUNDAMENTAL_COLUMNS)} FROM fundamentals_annual ORDER BY ticker, year", conn)
+
+
+def main(n_companies=200, workers=None):
+    with temp_workdir() as tmp:
+        db.create_table()
+        ciks = setup_tickers(n_companies)
+        zip_path = os.path.join(tmp, "companyfacts.zip")
+        make_companyfacts_zip(zip_path, ciks)
+        print(f"📊 bulk ingest: {len(ciks)} companies in zip ({n_companies} mapped), "
+              f"{os.path.getsize(zip_path) / 1e6:.1f} MB compressed")
+
+        t0 = time.perf_counter()
+        serial_ingest(zip_path)
+        t_serial = time.perf_counter() - t0
+        expected = snapshot()
+
+        db.get_connection().execute("DELETE FROM fundamentals_annual")
+        db.get_connection().commit()
+        stats = bulk_ingest.ingest(zip_path, workers=workers)
+        actual = snapshot()
+
+    ok = expected.equals(actual) and len(expected) > 0
+    print(f"   serial {t_serial:.2f}s | bulk {stats['elapsed']:.2f}s "
+          f"({t_serial / stats['elapsed']:.1f}x) | {len(actual)} rows")
+    print("   ✅ results identical" if ok else "   ❌ results differ")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,104 @@
+"""
+比較 insert_price 的寫入方式（每種方式在獨立的子行程執行，才量得到各自的 peak RSS）：
+  legacy：逐列 strftime 日期 + list(df.itertuples()) 整份 tuple list + executemany
+  bulk  ：日期向量化轉天數 + 分批從欄位陣列寫入暫存表，再 INSERT ... SELECT ... ON CONFLICT
+
+用法：
+    python -m benchmarks.bench_bulk_insert [tickers] [rows_per_ticker]
+"""
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+from benchmarks import temp_workdir
+
+
+def make_history(ticker, n_rows, seed=0):
+    """產生跟 download_data.format_history 輸出相同格式的假股價（含時區的 datetime）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end="2025-12-31", periods=n_rows, tz="America/New_York")
+    close = np.round(100 + rng.standard_normal(n_rows).cumsum(), 2)
+    return pd.DataFrame({
+        'date': dates,
+        'open': close,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': rng.integers(1_000, 1_000_000, n_rows),
+        'dividends': 0.0,
+        'stock_splits': 0.0,
+        'ticker': ticker,
+    })
+
+
+def legacy_insert_price(data):
+    """改版前的寫法（對應 price_bars 格式）"""
+    data = data.copy()
+    data['date'] = data['date'].dt.strftime('%Y-%m-%d')
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    sql = """
+    INSERT INTO price_bars (
+        ticker_id, day, open, high, low, close, volume, dividends, stock_splits
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ticker_id, day)
+    DO UPDATE SET
+        open = excluded.open, high = excluded.high, low = excluded.low, close = excluded.close,
+        volume = excluded.volume, dividends = excluded.dividends, stock_splits = excluded.stock_splits;
+    """
+    with conn:
+        ticker_ids = {ticker: db._get_ticker_id(cursor, ticker) for ticker in data['ticker'].unique()}
+        rows = pd.DataFrame({
+            'ticker_id': data['ticker'].map(ticker_ids).values,
+            'day': db._to_day_numbers(data['date']),
+            **{col: data[col].values for col in db.PRICE_COLUMNS},
+        })
+        data_to_insert = list(rows.itertuples(index=False, name=None))
+        cursor.executemany(sql, data_to_insert)
+        for ticker_id in ticker_ids.values():
+            db._refresh_registry(cursor, ticker_id)
+
+
+def _max_rss_mb():
+    # Linux 單位是 KiB，macOS 是 bytes
+    scale = 1024 if sys.platform != "darwin" else 1024 * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _run(method, n_tickers, n_rows, queue):
+    frames = [make_history(f"T{i:04d}", n_rows, seed=i) for i in range(n_tickers)]
+    insert = legacy_insert_price if method == "legacy" else db.insert_price
+    with temp_workdir():
+        db.create_table()
+        rss_before = _max_rss_mb()
+        t0 = time.perf_counter()
+        for frame in frames:
+            insert(frame)
+        elapsed = time.perf_counter() - t0
+        rss_after = _max_rss_mb()
+        rows = db.get_connection().execute("SELECT COUNT(*) FROM price_bars").fetchone()[0]
+    queue.put((rows, elapsed, rss_before, rss_after))
+
+
+def main(n_tickers=20, n_rows=8000):
+    print(f"📊 insert_price: {n_tickers} tickers × {n_rows} rows (full-history load)")
+    ctx = multiprocessing.get_context("spawn")
+    for method in ("legacy", "bulk"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(method, n_tickers, n_rows, queue))
+        proc.start()
+        rows, elapsed, rss_before, rss_after = queue.get()
+        proc.join()
+        print(f"   {method:<7}: {rows / elapsed:>10,.0f} rows/s | "
+              f"peak RSS {rss_after:7.1f} MB (+{rss_after - rss_before:.1f} MB during insert)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
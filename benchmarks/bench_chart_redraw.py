@@ -0,0 +1,113 @@
+"""
+量測技術面圖表每次點擊（1M/6M/1Y/ALL、上一段/下一段）到重畫完成的時間
+  legacy：原本的 draw_chart（每次複製 df、重算均線、布林遮罩過濾、ax.clear() 後重畫）
+  chart ：charting.PriceChart（指標只算一次、二分搜尋找區間、原地更新 artist，
+          長區間用 min/max 金字塔降採樣、長條改週 / 月彙總）
+
+用法：
+    python -m benchmarks.bench_chart_redraw [years]
+"""
+import statistics
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from charting import PriceChart
+
+# 模擬使用者的點擊順序：(chart_type, period, offset)
+CLICKS = [("price", "6M", 0), ("price", "1M", 0), ("price", "1M", 1), ("price", "1M", 2),
+          ("price", "1Y", 0), ("price", "ALL", 0), ("price", "6M", 0), ("price", "6M", 1),
+          ("change", "6M", 0), ("change", "1Y", 0), ("change", "1Y", 1), ("change", "1M", 0)]
+
+
+def make_prices(years):
+    n = int(years * 252)
+    dates = pd.bdate_range(end="2025-12-31", periods=n)
+    close = 100 * np.exp(0.015 * np.random.default_rng(0).standard_normal(n).cumsum())
+    return pd.DataFrame({"date": dates, "close": close})
+
+
+def legacy_draw_chart(figure, ax, full_df, ticker, chart_type, period, time_offset):
+    ax.clear()
+    df = full_df.copy()
+
+    if len(df) >= 20:
+        df['MA20'] = df['close'].rolling(20).mean()
+    if len(df) >= 60:
+        df['MA60'] = df['close'].rolling(60).mean()
+
+    if period != "ALL":
+        end_date = df["date"].max()
+        months = {"1M": 1, "6M": 6, "1Y": 12}[period]
+        end_date -= pd.DateOffset(months=months * time_offset)
+        start_date = end_date - pd.DateOffset(months=months)
+        df = df[(df["date"] > start_date) & (df["date"] <= end_date)]
+
+    if chart_type == "price":
+        ax.plot(df["date"], df["close"], label="Close", color='blue')
+        if 'MA20' in df:
+            ax.plot(df["date"], df['MA20'], label="MA20", color='orange')
+        if 'MA60' in df:
+            ax.plot(df["date"], df['MA60'], label="MA60", color='green')
+        ax.set_title(f"{ticker} Price Chart ({period})")
+        ax.legend()
+    else:
+        df['daily_change'] = df['close'].pct_change() * 100
+        colors = ['red' if x > 0 else 'green' if x < 0 else 'gray' for x in df['daily_change']]
+        ax.bar(df["date"], df['daily_change'], color=colors, alpha=0.7, width=0.8)
+        ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+        ax.set_title(f"{ticker} Daily Price Change ({period})")
+
+    ax.set_xlabel("Date")
+    figure.autofmt_xdate()
+    figure.canvas.draw()
+
+
+def _measure(draw, rounds=3):
+    samples = {}
+    for _ in range(rounds):
+        for click in CLICKS:
+            t0 = time.perf_counter()
+            draw(*click)
+            samples.setdefault(click, []).append(time.perf_counter() - t0)
+    return samples
+
+
+def main(years=30):
+    df = make_prices(years)
+    print(f"📊 click-to-draw latency, {len(df)} daily bars ({years} years)")
+
+    figure = plt.Figure(figsize=(7, 4))
+    ax = figure.add_subplot(111)
+    figure.canvas.draw()
+    legacy = _measure(lambda c, p, o: legacy_draw_chart(figure, ax, df, "SYN", c, p, o))
+
+    figure = plt.Figure(figsize=(7, 4))
+    ax = figure.add_subplot(111)
+    chart = PriceChart(ax, df, "SYN")
+
+    def draw_new(c, p, o):
+        chart.draw(c, p, o)
+        figure.canvas.draw()
+
+    new = _measure(draw_new)
+
+    print(f"   {'click':<16} {'legacy ms':>10} {'chart ms':>10}")
+    for click in CLICKS:
+        name = f"{click[0]} {click[1]} -{click[2]}"
+        print(f"   {name:<16} {statistics.median(legacy[click]) * 1e3:>10.1f} "
+              f"{statistics.median(new[click]) * 1e3:>10.1f}")
+    total_legacy = sum(statistics.median(v) for v in legacy.values())
+    total_new = sum(statistics.median(v) for v in new.values())
+    print(f"   {'total':<16} {total_legacy * 1e3:>10.1f} {total_new * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:2]))
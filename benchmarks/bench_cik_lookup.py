@@ -0,0 +1,78 @@
+"""
+比較 ticker → CIK 查詢：
+  legacy：每檔股票都把 company_tickers.json 轉成 DataFrame 再線性過濾（不含下載時間）
+  index ：本地對照表，載入一次後用 dict 查詢
+"""
+import random
+import string
+import time
+
+import pandas as pd
+
+import database as db
+import download_data as download
+from benchmarks import temp_workdir
+
+
+def make_company_tickers(n=10000, seed=0):
+    """產生跟 SEC company_tickers.json 相同結構的假資料"""
+    rng = random.Random(seed)
+    data = {}
+    seen = set()
+    while len(data) < n:
+        ticker = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5)))
+        if ticker in seen:
+            continue
+        seen.add(ticker)
+        data[str(len(data))] = {"cik_str": rng.randint(1, 2_000_000), "ticker": ticker, "title": f"{ticker} Inc."}
+    return data
+
+
+def legacy_lookup(data, ticker):
+    df = pd.DataFrame(data).T
+    row = df[df["ticker"] == ticker.upper()]
+    if row.empty:
+        raise ValueError(f"{ticker} not found")
+    return str(row.iloc[0]["cik_str"]).zfill(10)
+
+
+def main(n_rows=10000, n_lookups=3000):
+    data = make_company_tickers(n_rows)
+    tickers = random.Random(1).sample([row["ticker"] for row in data.values()], n_lookups)
+
+    with temp_workdir():
+        db.create_table()
+        db.replace_cik_index(download.build_cik_index(data), time.time())
+        download._cik_index = None  # 強制從資料庫載入一次
+
+        # legacy 太慢，只量一小部分再換算
+        sample = tickers[:50]
+        t0 = time.perf_counter()
+        legacy = {t: legacy_lookup(data, t) for t in sample}
+        legacy_per_lookup = (time.perf_counter() - t0) / len(sample)
+
+        t0 = time.perf_counter()
+        download.load_cik_index()
+        load_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = download.tickers_to_ciks(tickers)
+        bulk_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for t in tickers:
+            download.ticker_to_cik(t)
+        single_time = time.perf_counter() - t0
+
+    assert all(result[t] == cik for t, cik in legacy.items())
+
+    print(f"📊 CIK lookup ({n_rows} rows, {n_lookups} tickers)")
+    print(f"   legacy DataFrame filter : {legacy_per_lookup * 1e3:8.3f} ms/lookup "
+          f"(≈ {legacy_per_lookup * n_lookups:.1f}s total, 不含每次下載)")
+    print(f"   index load from SQLite  : {load_time * 1e3:8.3f} ms (once)")
+    print(f"   tickers_to_ciks (bulk)  : {bulk_time / n_lookups * 1e6:8.3f} µs/lookup")
+    print(f"   ticker_to_cik (single)  : {single_time / n_lookups * 1e6:8.3f} µs/lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+比較 companyfacts 的兩種解析方式（peak 記憶體以 tracemalloc 量測 Python 配置的記憶體）：
+  json  ：讀出整份回應再 json.loads（改版前 get_company_facts 的 r.json()）
+  stream：xbrl_stream.parse 從 gzip 快取檔串流解析，只保留需要的 tag 與 10-K 資料
+
+兩種方式整理出的 fundamentals_annual 必須完全相同；裁減後的 dict 也要跟 json 版本裁減的結果一致。
+
+用法：
+    python -m benchmarks.bench_companyfacts_stream [synthetic_count]
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import xbrl_stream
+from benchmarks.fixtures import load_companyfacts
+from download_data import FACT_TAG_NAMES, build_fundamentals
+
+
+def select_standard(facts):
+    facts = facts.get("facts", {})
+    return facts.get("us-gaap") or facts.get("ifrs-full")
+
+
+def _measure(fn):
+    """時間與記憶體分開量（tracemalloc 會拖慢配置物件的速度）"""
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def json_path(path):
+    with gzip.open(path, "rb") as f:
+        facts = json.loads(f.read())
+    us_gaap = select_standard(facts)
+    return facts, (build_fundamentals("X", us_gaap) if us_gaap is not None else None)
+
+
+def stream_path(path):
+    with gzip.open(path, "rb") as f:
+        facts = xbrl_stream.parse(f, FACT_TAG_NAMES)
+    us_gaap = select_standard(facts)
+    return facts, (build_fundamentals("X", us_gaap) if us_gaap is not None else None)
+
+
+def main(count=10):
+    if not xbrl_stream.is_available():
+        print("⚠️ ijson is not installed: stream mode falls back to json.load (no memory savings)")
+    fixtures = load_companyfacts(count)
+    print(f"📊 companyfacts parse: {len(fixtures)} payloads")
+
+    ok = True
+    totals = {"json": [0.0, 0], "stream": [0.0, 0]}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, payload in fixtures:
+            path = os.path.join(tmp, "payload.json.gz")
+            with gzip.open(path, "wb", compresslevel=1) as f:
+                f.write(payload)
+            del payload
+
+            (full, expected), t_json, peak_json = _measure(lambda: json_path(path))
+            (reduced, actual), t_stream, peak_stream = _measure(lambda: stream_path(path))
+
+            same_rows = (expected is None and actual is None) or (
+                expected is not None and actual is not None and expected.equals(actual))
+            same_facts = xbrl_stream._reduce(full, FACT_TAG_NAMES) == reduced
+            del full
+            ok &= same_rows and same_facts
+            totals["json"][0] += t_json
+            totals["stream"][0] += t_stream
+            totals["json"][1] = max(totals["json"][1], peak_json)
+            totals["stream"][1] = max(totals["stream"][1], peak_stream)
+            print(f"   {name:<24} json {t_json * 1000:7.1f} ms / {peak_json / 1e6:7.1f} MB | "
+                  f"stream {t_stream * 1000:7.1f} ms / {peak_stream / 1e6:6.2f} MB "
+                  f"{'✅' if same_rows and same_facts else '❌'}")
+
+    print(f"   total: json {totals['json'][0]:.2f}s (peak {totals['json'][1] / 1e6:.1f} MB), "
+          f"stream {totals['stream'][0]:.2f}s (peak {totals['stream'][1] / 1e6:.2f} MB)")
+    print("   ✅ results identical" if ok else "   ❌ results differ")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(*(int(arg) for arg in sys.argv[1:2])) else 1)
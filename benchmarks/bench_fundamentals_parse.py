@@ -0,0 +1,197 @@
+"""
+比較 companyfacts 整理成 fundamentals_annual 的速度
+  legacy：改版前的寫法（每個欄位各呼叫一次 extract_annual_from_tags，
+          再用 dict comprehension 算比率、20 多個 list comprehension 組 DataFrame）
+  table ：download_data.build_fundamentals（依 FACT_TAGS 一次填入 年度 × 欄位 陣列，向量化計算比率）
+
+資料來源見 benchmarks/fixtures.py（有存下來的 companyfacts 就用，否則產生假資料），
+兩種寫法的結果必須完全相同。
+
+用法：
+    python -m benchmarks.bench_fundamentals_parse [synthetic_count]
+"""
+import json
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.fixtures import load_companyfacts
+from download_data import build_fundamentals
+
+REPEAT = 5
+
+
+def select_standard(facts):
+    facts = facts.get("facts", {})
+    return facts.get("us-gaap") or facts.get("ifrs-full")
+
+
+def extract_annual_from_tags(us_gaap, tags):
+    """改版前的寫法：每個欄位各掃一次自己的 tag"""
+    data = {}
+    for tag in tags:
+        if tag not in us_gaap:
+            continue
+        units = us_gaap[tag].get("units", {})
+        if not units:
+            continue
+        first_unit_key = list(units.keys())[0]
+        for r in units[first_unit_key]:
+            if r.get("form") == "10-K" and "fy" in r:
+                data[r["fy"]] = r["val"]
+    return data
+
+
+def legacy_build_fundamentals(ticker, us_gaap):
+    """改版前 fetch_and_store_fundamentals 中的整理流程"""
+    # 抓年度資料 - 損益表
+    revenue = extract_annual_from_tags(us_gaap, [
+        "SalesRevenueNet",
+        "Revenues",
+        "RevenueFromContractWithCustomerExcludingAssessedTax",
+        "Revenue"
+    ])
+
+    if not revenue:
+        return None
+
+    cogs = extract_annual_from_tags(us_gaap, [
+        "CostOfRevenue",
+        "CostOfGoodsAndServicesSold",
+        "CostOfRevenueIncludingSpecialItems"
+    ])
+    operating_income = extract_annual_from_tags(us_gaap, ["OperatingIncomeLoss"])
+    net_income = extract_annual_from_tags(us_gaap, ["NetIncomeLoss"])
+    shares = extract_annual_from_tags(us_gaap, [
+        "WeightedAverageNumberOfDilutedSharesOutstanding",
+        "WeightedAverageNumberOfSharesOutstandingDiluted"
+    ])
+
+    # 抓年度資料 - 現金流量表
+    operating_cash_flow = extract_annual_from_tags(us_gaap, [
+        "NetCashProvidedByUsedInOperatingActivities",
+        "CashProvidedByUsedInOperatingActivities"
+    ])
+    investing_cash_flow = extract_annual_from_tags(us_gaap, [
+        "NetCashProvidedByUsedInInvestingActivities",
+        "CashProvidedByUsedInInvestingActivities"
+    ])
+    financing_cash_flow = extract_annual_from_tags(us_gaap, [
+        "NetCashProvidedByUsedInFinancingActivities",
+        "CashProvidedByUsedInFinancingActivities"
+    ])
+    capex = extract_annual_from_tags(us_gaap, [
+        "PaymentsToAcquirePropertyPlantAndEquipment",
+        "CapitalExpendituresIncurredButNotYetPaid"
+    ])
+
+    # 抓年度資料 - 資產負債表
+    total_assets = extract_annual_from_tags(us_gaap, ["Assets"])
+    total_liabilities = extract_annual_from_tags(us_gaap, [
+        "Liabilities",
+        "LiabilitiesAndStockholdersEquity"
+    ])
+    current_liabilities = extract_annual_from_tags(us_gaap, [
+        "LiabilitiesCurrent",
+        "CurrentLiabilities"
+    ])
+    long_term_debt = extract_annual_from_tags(us_gaap, [
+        "LongTermDebtNoncurrent",
+        "LongTermDebt"
+    ])
+    stockholders_equity = extract_annual_from_tags(us_gaap, [
+        "StockholdersEquity",
+        "ShareholdersEquity"
+    ])
+
+    # 計算衍生指標
+    eps = {year: net_income[year] / shares[year] 
+           for year in net_income if year in shares and shares[year] != 0}
+
+    # 毛利率 / 營業利益率 / 淨利率
+    gross_margin = {year: (revenue[year] - cogs[year]) / revenue[year]
+                    for year in revenue if year in cogs and revenue[year] != 0}
+    operating_margin = {year: operating_income[year] / revenue[year]
+                        for year in revenue if year in operating_income and revenue[year] != 0}
+    net_margin = {year: net_income[year] / revenue[year]
+                  for year in revenue if year in net_income and revenue[year] != 0}
+
+    # 自由現金流 = 營運現金流 - 資本支出
+    free_cash_flow = {year: operating_cash_flow.get(year, 0) - abs(capex.get(year, 0))
+                      for year in operating_cash_flow}
+
+    # 負債比率
+    debt_to_asset_ratio = {year: total_liabilities[year] / total_assets[year]
+                           for year in total_assets if year in total_liabilities and total_assets[year] != 0}
+
+    # 整理 DataFrame
+    df = pd.DataFrame({
+        "ticker": ticker,
+        "year": [int(y) for y in revenue.keys()],
+        "revenue": [int(revenue[y]) for y in revenue],
+        "cogs": [int(cogs.get(y, 0)) for y in revenue],
+        "gross_margin": [round(float(gross_margin.get(y, 0)), 4) for y in revenue],
+        "operating_income": [int(operating_income.get(y, 0)) for y in revenue],
+        "operating_margin": [round(float(operating_margin.get(y, 0)), 4) for y in revenue],
+        "net_income": [int(net_income.get(y, 0)) for y in revenue],
+        "net_margin": [round(float(net_margin.get(y, 0)), 4) for y in revenue],
+        "shares": [int(shares.get(y, 0)) for y in revenue],
+        "eps": [round(float(eps.get(y, 0)), 4) for y in revenue],
+        "operating_cash_flow": [int(operating_cash_flow.get(y, 0)) for y in revenue],
+        "investing_cash_flow": [int(investing_cash_flow.get(y, 0)) for y in revenue],
+        "financing_cash_flow": [int(financing_cash_flow.get(y, 0)) for y in revenue],
+        "free_cash_flow": [int(free_cash_flow.get(y, 0)) for y in revenue],
+        "total_assets": [int(total_assets.get(y, 0)) for y in revenue],
+        "total_liabilities": [int(total_liabilities.get(y, 0)) for y in revenue],
+        "current_liabilities": [int(current_liabilities.get(y, 0)) for y in revenue],
+        "long_term_debt": [int(long_term_debt.get(y, 0)) for y in revenue],
+        "stockholders_equity": [int(stockholders_equity.get(y, 0)) for y in revenue],
+        "debt_to_asset_ratio": [round(float(debt_to_asset_ratio.get(y, 0)), 4) for y in revenue],
+    })
+    return df
+
+
+def _best(fn, *args):
+    times = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def main(count=20):
+    fixtures = load_companyfacts(count)
+    print(f"📊 fundamentals parse: {len(fixtures)} companyfacts payloads, "
+          f"{sum(len(p) for _, p in fixtures) / 1e6:.1f} MB JSON")
+
+    totals = {"json": 0.0, "legacy": 0.0, "table": 0.0}
+    mismatches = []
+    for name, payload in fixtures:
+        t_json, facts = _best(json.loads, payload)
+        us_gaap = select_standard(facts)
+        if us_gaap is None:
+            continue
+        t_legacy, expected = _best(legacy_build_fundamentals, name, us_gaap)
+        t_table, actual = _best(build_fundamentals, name, us_gaap)
+        totals["json"] += t_json
+        totals["legacy"] += t_legacy
+        totals["table"] += t_table
+        if (expected is None) != (actual is None) or (
+                expected is not None and not expected.equals(actual)):
+            mismatches.append(name)
+
+    print(f"   json.loads: {totals['json'] * 1000:8.1f} ms")
+    print(f"   legacy    : {totals['legacy'] * 1000:8.1f} ms")
+    print(f"   table     : {totals['table'] * 1000:8.1f} ms "
+          f"({totals['legacy'] / max(totals['table'], 1e-9):.1f}x faster extraction)")
+    if mismatches:
+        print(f"   ❌ results differ: {', '.join(mismatches)}")
+        return False
+    print("   ✅ results identical")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(*(int(arg) for arg in sys.argv[1:2])) else 1)
@@ -0,0 +1,67 @@
+"""
+量測各模組的匯入時間，並檢查不該在匯入時載入的重量級套件（例如命令列工具不能載入 tkinter / matplotlib）
+
+每個模組在全新的子行程中匯入 REPEAT 次取中位數；任何一個模組載入了禁止的套件就回傳錯誤碼，
+避免之後的修改又把這些套件放回模組開頭。
+
+用法：
+    python -m benchmarks.bench_import_time [repeat]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPEAT = 5
+
+# 模組 → 匯入後不應該出現在 sys.modules 的套件
+FORBIDDEN = {
+    'database': ['pandas', 'numpy'],
+    'data_sources': ['pandas', 'requests', 'yfinance'],
+    'download_data': ['pandas', 'numpy', 'requests', 'yfinance'],
+    'cli': ['tkinter', 'matplotlib', 'pandas', 'numpy', 'requests', 'yfinance'],
+    'main': ['matplotlib', 'yfinance', 'charting'],
+}
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, forbidden):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+                         cwd=root, capture_output=True, text=True)
+    if out.returncode != 0:
+        return None, out.stderr.strip().splitlines()[-1]
+    result = json.loads(out.stdout)
+    return result['elapsed'], result['loaded']
+
+
+def main(repeat=REPEAT):
+    print(f"📊 import time (median of {repeat} fresh interpreters)")
+    ok = True
+    for module, forbidden in FORBIDDEN.items():
+        times, loaded = [], []
+        for _ in range(repeat):
+            elapsed, loaded = measure(module, forbidden)
+            if elapsed is None:
+                break
+            times.append(elapsed)
+        if not times:
+            # 例如沒有 tkinter 的環境無法匯入 main
+            print(f"   {module:<14} ⚠️ import failed: {loaded}")
+            continue
+        ok &= not loaded
+        status = "✅" if not loaded else f"❌ loads {', '.join(loaded)}"
+        print(f"   {module:<14} {statistics.median(times) * 1000:7.1f} ms  {status}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(*(int(arg) for arg in sys.argv[1:2])) else 1)
@@ -0,0 +1,123 @@
+"""
+技術指標：批次計算與增量更新的速度，並檢查增量結果與整批重算一致
+  full       ：indicators.compute_all 重算全部歷史
+  incremental：indicators.enable() 之後每檔 insert_price 幾天新資料，只更新尾端
+  rewrite    ：覆寫較舊的日期，應觸發整檔重算
+
+最後把增量維護的指標與在另一個資料庫整批重算的結果逐欄比對，誤差超過容許值時結束碼為 1。
+
+用法：
+    python -m benchmarks.bench_indicators [tickers] [years] [new_days]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+import indicators
+from benchmarks import temp_workdir
+
+TOLERANCE = 1e-8
+
+
+def make_history(ticker, dates, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(0.015 * rng.standard_normal(len(dates)).cumsum())
+    return pd.DataFrame({
+        'date': dates,
+        'open': close,
+        'high': close * (1 + 0.01 * rng.random(len(dates))),
+        'low': close * (1 - 0.01 * rng.random(len(dates))),
+        'close': close,
+        'volume': rng.integers(1_000, 1_000_000, len(dates)),
+        'dividends': 0.0,
+        'stock_splits': 0.0,
+        'ticker': ticker,
+    })
+
+
+def make_universe(n_tickers, years, new_days):
+    """每檔股票的完整資料；前面是既有歷史，最後 new_days 天當作之後的更新"""
+    dates = pd.bdate_range(end="2025-12-31", periods=int(years * 252) + new_days)
+    frames = {}
+    for i in range(n_tickers):
+        df = make_history(f"T{i:04d}", dates, seed=i)
+        if i % 7 == 1:
+            df = df.iloc[len(df) // 3:]  # 較晚上市
+        if i % 11 == 2:
+            df = df.drop(df.index[100:120])  # 中途停牌
+        frames[df['ticker'].iloc[0]] = df.reset_index(drop=True)
+    return frames
+
+
+def snapshot():
+    return {ticker: db.select_indicators(ticker) for ticker in db.get_all_tickers()}
+
+
+def max_difference(left, right):
+    worst = 0.0
+    for ticker, a in left.items():
+        b = right[ticker]
+        if len(a) != len(b) or not (a['date'].values == b['date'].values).all():
+            return np.inf
+        for col in db.INDICATOR_COLUMNS:
+            x, y = a[col].to_numpy(float), b[col].to_numpy(float)
+            if (np.isnan(x) != np.isnan(y)).any():
+                return np.inf
+            scale = np.maximum(1.0, np.abs(y))
+            diff = np.nan_to_num(np.abs(x - y) / scale)
+            worst = max(worst, diff.max(initial=0.0))
+    return worst
+
+
+def main(n_tickers=200, years=10, new_days=5):
+    frames = make_universe(n_tickers, years, new_days)
+    print(f"📊 indicators: {n_tickers} tickers × {years} years, then {new_days} new days per ticker")
+
+    with temp_workdir():
+        db.create_table()
+        for df in frames.values():
+            db.insert_price(df.iloc[:-new_days])
+
+        t0 = time.perf_counter()
+        rows = indicators.compute_all(verbose=False)
+        elapsed = time.perf_counter() - t0
+        print(f"   full       : {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+        indicators.enable()
+        t0 = time.perf_counter()
+        for df in frames.values():
+            db.insert_price(df.iloc[-new_days:])
+        elapsed = time.perf_counter() - t0
+        print(f"   incremental: {elapsed:7.2f}s ({elapsed / n_tickers * 1000:.2f} ms/ticker, "
+              f"includes insert_price)")
+
+        # 覆寫較舊的日期（例如股價被修正），應該整檔重算
+        ticker, df = next(iter(frames.items()))
+        rewrite = df.iloc[len(df) // 2:len(df) // 2 + 3].copy()
+        rewrite['close'] *= 1.05
+        t0 = time.perf_counter()
+        db.insert_price(rewrite)
+        print(f"   rewrite    : {time.perf_counter() - t0:7.3f}s ({ticker}, 3 older days)")
+        indicators.disable()
+        frames[ticker] = pd.concat([df.drop(rewrite.index), rewrite]).sort_values('date')
+
+        incremental = snapshot()
+
+    with temp_workdir():
+        db.create_table()
+        for df in frames.values():
+            db.insert_price(df)
+        indicators.compute_all(verbose=False)
+        full = snapshot()
+
+    worst = max_difference(incremental, full)
+    ok = worst <= TOLERANCE
+    print(f"   equivalence: max relative difference {worst:.2e} {'✅' if ok else '❌'}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(*(int(arg) for arg in sys.argv[1:4])) else 1)
@@ -0,0 +1,112 @@
+"""
+instrumentation 的額外負擔與匯出格式
+
+  1. 單次 timer() / count() 的成本（開啟與 disable() 後）
+  2. 用重播資料跑完整的 add → update → again 流程，比較開啟與關閉統計的總耗時
+  3. 檢查開啟時各階段都有記錄，JSON 與 Prometheus textfile 可以正確讀回
+
+用法：
+    python -m benchmarks.bench_instrumentation [tickers] [workers] [repeat]
+"""
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import data_sources
+import instrumentation
+from benchmarks.bench_replay_pipeline import build_recording, run_pipeline
+
+CALLS = 200000
+
+# 完整流程後一定要出現的階段與計數
+EXPECTED_STAGES = ['fetch.price', 'fetch.price_batch', 'fetch.companyfacts', 'parse.companyfacts',
+                   'transform.price', 'transform.price_batch', 'transform.fundamentals',
+                   'write.price', 'write.fundamentals']
+EXPECTED_COUNTERS = ['bytes_downloaded.companyfacts', 'rows_written.price', 'rows_written.fundamentals']
+
+PROM_LINE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+
+
+def per_call_cost():
+    """回傳 (timer, count) 每次呼叫的微秒數"""
+    t0 = time.perf_counter()
+    for _ in range(CALLS):
+        with instrumentation.timer('bench.noop'):
+            pass
+    timer_us = (time.perf_counter() - t0) / CALLS * 1e6
+    t0 = time.perf_counter()
+    for _ in range(CALLS):
+        instrumentation.count('bench.noop')
+    count_us = (time.perf_counter() - t0) / CALLS * 1e6
+    return timer_us, count_us
+
+
+def pipeline_time(recording, tickers, workers):
+    timings, _ = run_pipeline(data_sources.ReplaySource(recording), tickers, workers)
+    return sum(timings.values())
+
+
+def check_exports(snap):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, prom_path = os.path.join(tmp, "run.json"), os.path.join(tmp, "run.prom")
+        instrumentation.export_json(json_path, snap)
+        instrumentation.export_prometheus(prom_path, snap)
+        with open(json_path, encoding="utf-8") as f:
+            json_ok = json.load(f) == snap
+        with open(prom_path, encoding="utf-8") as f:
+            samples = [line for line in f.read().splitlines() if not line.startswith("#")]
+    bad = [line for line in samples if not PROM_LINE.match(line)]
+    return json_ok, len(samples), bad
+
+
+def main(n_tickers=200, workers=8, repeat=3):
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    print(f"📊 instrumentation: {n_tickers} tickers, {workers} workers, best of {repeat}")
+
+    on = per_call_cost()
+    instrumentation.disable()
+    off = per_call_cost()
+    instrumentation.enable()
+    print(f"   timer() {on[0]:.2f} µs (disabled {off[0]:.2f} µs) | count() {on[1]:.2f} µs (disabled {off[1]:.2f} µs)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, "recording")
+        build_recording(recording, tickers)
+
+        times = {}
+        for label in ('disabled', 'enabled'):
+            (instrumentation.enable if label == 'enabled' else instrumentation.disable)()
+            times[label] = min(pipeline_time(recording, tickers, workers) for _ in range(repeat))
+        instrumentation.enable()
+
+        # 最後一次 run_pipeline 的 again 階段沒有新資料，另外跑一次不計時的流程收集完整的統計
+        instrumentation.reset()
+        run_pipeline(data_sources.ReplaySource(recording), tickers, workers)
+        snap = instrumentation.snapshot()
+
+    overhead = times['enabled'] / times['disabled'] - 1
+    print(f"   pipeline disabled {times['disabled']:.2f}s | enabled {times['enabled']:.2f}s ({overhead:+.1%})")
+    for line in instrumentation.format_stages(snap):
+        print(f"   {line}")
+    print("   " + " | ".join(f"{name} {value:,}" for name, value in snap['counters'].items()))
+
+    missing = [s for s in EXPECTED_STAGES if s not in snap['stages']]
+    missing += [c for c in EXPECTED_COUNTERS if not snap['counters'].get(c)]
+    json_ok, n_samples, bad = check_exports(snap)
+    print(f"   Prometheus textfile: {n_samples} samples" + (f", ❌ malformed: {bad[:3]}" if bad else ""))
+
+    ok = not missing and json_ok and not bad
+    if missing:
+        print(f"   ❌ missing: {', '.join(missing)}")
+    if not json_ok:
+        print("   ❌ JSON export differs from snapshot")
+    print("   ✅ all stages recorded, exports valid" if ok else "   ❌ check failed")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,124 @@
+"""
+用重播的資料來源離線跑完整的下載流程（抓取 → 解析 → 寫入），每個請求有模擬延遲
+
+先用假資料建立一份錄製資料夾（股價與 SEC 回應，部分股票在 SEC 查不到），再依序量測：
+  add   ：insert_ticker + fetch_and_store_fundamentals 新增股票
+  update：update_all_ticker(update_fundamentals=True, batch_size=BATCH_SIZE) 更新其餘股票（資料庫少了最後幾天）
+  again ：再跑一次 update，股價已是最新、SEC 回 304
+
+也驗證錄製：用 RecordingSource 包住重播來源跑一次，再重播錄到的資料夾，兩次的資料庫內容必須相同。
+
+用法：
+    python -m benchmarks.bench_replay_pipeline [tickers] [latency_ms] [workers]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import data_sources
+import database as db
+import download_data as download
+import sec_client
+from benchmarks import temp_workdir
+from benchmarks.bench_batch_fetch import yahoo_history
+from benchmarks.fixtures import make_companyfacts
+
+# 每 NO_SEC_EVERY 檔股票在 SEC 查不到（例如 ETF）
+NO_SEC_EVERY = 8
+# 新增的股票佔比，其餘股票一開始就在資料庫中（少了最後 STALE_DAYS 天）
+ADD_EVERY = 10
+STALE_DAYS = 3
+
+
+def build_recording(path, tickers):
+    recording = data_sources.Recording(path)
+    client = sec_client.get_client()
+    index = {}
+    for i, ticker in enumerate(tickers):
+        recording.save_history(ticker, yahoo_history(i))
+        if i % NO_SEC_EVERY == 0:
+            continue
+        cik = str(1000 + i).zfill(10)
+        index[str(i)] = {"cik_str": int(cik), "ticker": ticker, "title": ticker}
+        body = json.dumps(make_companyfacts(seed=i, unused_tags=50)).encode()
+        recording.save_response(client.data(f"/api/xbrl/companyfacts/CIK{cik}.json"), 200,
+                                {"ETag": f'"{cik}"', "Content-Type": "application/json"}, body)
+    recording.save_response(client.www(download.CIK_INDEX_PATH), 200, {}, json.dumps(index).encode())
+
+
+def snapshot(tickers):
+    prices = pd.concat([db.select_price(t) for t in tickers], ignore_index=True)
+    conn = db.get_connection()
+    fundamentals = pd.read_sql_query(
+        f"SELECT {', '.join(db.FUNDAMENTAL_COLUMNS)} FROM fundamentals_annual ORDER BY ticker, year", conn)
+    return prices, fundamentals
+
+
+def run_pipeline(source, tickers, workers):
+    """在暫存資料庫跑一次 add → update → again，回傳各階段耗時與最後的資料庫內容"""
+    previous = data_sources.set_source(source)
+    download._cik_index = None  # 不同的暫存資料庫之間不共用記憶體中的 CIK 對照表
+    timings = {}
+    try:
+        with temp_workdir(), contextlib.redirect_stdout(io.StringIO()):
+            db.create_table()
+            existing = [t for i, t in enumerate(tickers) if i % ADD_EVERY != 0]
+            db.insert_price(pd.concat([
+                download.format_history(yahoo_history(tickers.index(t)).iloc[:-STALE_DAYS], t)
+                for t in existing]))
+
+            t0 = time.perf_counter()
+            for i, ticker in enumerate(tickers):
+                if i % ADD_EVERY == 0:
+                    download.insert_ticker(ticker)
+                    download.fetch_and_store_fundamentals(ticker)
+            timings['add'] = time.perf_counter() - t0
+
+            for stage in ('update', 'again'):
+                t0 = time.perf_counter()
+                download.update_all_ticker(update_fundamentals=True, workers=workers,
+                                           batch_size=download.BATCH_SIZE)
+                timings[stage] = time.perf_counter() - t0
+            result = snapshot(tickers)
+    finally:
+        data_sources.set_source(previous)
+    return timings, result
+
+
+def same(a, b):
+    return all(x.equals(y) for x, y in zip(a, b))
+
+
+def main(n_tickers=200, latency_ms=100, workers=8):
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    print(f"📊 replay pipeline: {n_tickers} tickers, {latency_ms} ms per request, {workers} workers")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original, recorded = os.path.join(tmp, "original"), os.path.join(tmp, "recorded")
+        build_recording(original, tickers)
+
+        replay = data_sources.ReplaySource(original, latency=latency_ms / 1000, jitter=0.5, seed=0)
+        timings, expected = run_pipeline(replay, tickers, workers)
+        print("   " + " | ".join(f"{stage} {elapsed:.2f}s" for stage, elapsed in timings.items())
+              + f" | {replay.requests} requests")
+
+        # 錄製 → 重播
+        run_pipeline(data_sources.RecordingSource(recorded, inner=data_sources.ReplaySource(original)),
+                     tickers, workers)
+        _, actual = run_pipeline(data_sources.ReplaySource(recorded), tickers, workers)
+
+    ok = same(expected, actual) and len(expected[1]) > 0
+    print(f"   {len(expected[0])} price rows, {len(expected[1])} fundamentals rows")
+    print("   ✅ record → replay identical" if ok else "   ❌ record → replay differs")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    sys.exit(0 if main(*args) else 1)
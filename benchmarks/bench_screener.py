@@ -0,0 +1,90 @@
+"""
+量測篩選器在整個股票池上的回應時間
+  cold：第一次篩選（讀取最新股價、指標與最近兩年基本面，建立面板）
+  warm：面板已快取，只計算條件式
+
+用法：
+    python -m benchmarks.bench_screener [tickers]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+import indicators
+import screener
+from benchmarks import temp_workdir
+from benchmarks.bench_indicators import make_history
+
+EXPRESSIONS = [
+    "revenue_yoy > 20% and net_margin > 15% and close > ma200",
+    "30 < rsi14 < 70 and macd > macd_signal",
+    "pe < 15 and debt_to_asset_ratio < 0.5 or eps_yoy > 50%",
+]
+
+
+def make_fundamentals(tickers, years=10, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(tickers) * years
+    df = pd.DataFrame({
+        'ticker': np.repeat(tickers, years),
+        'year': np.tile(np.arange(2025 - years, 2025), len(tickers)),
+    })
+    growth = 1 + 0.1 + 0.15 * rng.standard_normal(n)
+    df['revenue'] = 1e9 * np.cumprod(growth.reshape(len(tickers), years), axis=1).ravel()
+    df['net_income'] = df['revenue'] * rng.uniform(-0.05, 0.3, n)
+    df['net_margin'] = df['net_income'] / df['revenue']
+    df['shares'] = 1e8
+    df['eps'] = df['net_income'] / df['shares']
+    df['total_assets'] = df['revenue'] * 2
+    df['total_liabilities'] = df['total_assets'] * rng.uniform(0.1, 0.9, n)
+    df['debt_to_asset_ratio'] = df['total_liabilities'] / df['total_assets']
+    for col in db.FUNDAMENTAL_COLUMNS:
+        if col not in df:
+            df[col] = 0.0
+    return df[db.FUNDAMENTAL_COLUMNS]
+
+
+def main(n_tickers=3000):
+    print(f"📊 screener: {n_tickers} tickers, 1 year of prices, 10 years of fundamentals")
+    dates = pd.bdate_range(end="2025-12-31", periods=260)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+
+    with temp_workdir():
+        db.create_table()
+        db.insert_price(pd.concat([make_history(t, dates, seed=i) for i, t in enumerate(tickers)]))
+        indicators.compute_all(verbose=False)
+        fundamentals = make_fundamentals(tickers)
+        for _, df in fundamentals.groupby('ticker'):
+            db.insert_fundamentals(df)
+        db.add_category("Sample")
+        category_id = db.get_all_categories()[0][0]
+        for t in tickers[::10]:
+            db.assign_ticker_to_category(t, category_id)
+
+        for expression in EXPRESSIONS:
+            screener.clear_cache()
+            t0 = time.perf_counter()
+            found = screener.screen(expression)
+            cold = time.perf_counter() - t0
+            warm = []
+            for _ in range(20):
+                t0 = time.perf_counter()
+                screener.screen(expression)
+                warm.append(time.perf_counter() - t0)
+            print(f"   {expression}")
+            print(f"      {len(found):5d} matched | cold {cold * 1000:7.1f} ms | "
+                  f"warm {statistics.median(warm) * 1000:6.2f} ms")
+
+        screener.clear_cache()
+        t0 = time.perf_counter()
+        found = screener.screen(EXPRESSIONS[0], category_id=category_id)
+        print(f"   category ({n_tickers // 10} tickers): {len(found)} matched | "
+              f"cold {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
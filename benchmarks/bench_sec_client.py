@@ -0,0 +1,155 @@
+"""
+用本地的假 SEC 伺服器驗證與量測 sec_client
+
+  keep-alive：同樣的請求數，每次 requests.get（每次新連線）vs 共用 session
+  download  ：多個 thread 同時跑 fetch_and_store_fundamentals，伺服器會對部分請求回 429 / 503，
+              檢查任何一秒內的請求數都不超過速率上限、重試後每檔的基本面都與直接解析的結果相同，
+              並印出 sec_client 的延遲統計
+
+用法：
+    python -m benchmarks.bench_sec_client [tickers] [threads] [rate]
+"""
+import contextlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+import database as db
+import download_data as download
+import sec_client
+from benchmarks import temp_workdir
+from benchmarks.fixtures import make_companyfacts
+
+# 每 THROTTLE_EVERY 個 CIK 第一次請求回 429，每 FAIL_EVERY 個回 503
+THROTTLE_EVERY = 5
+FAIL_EVERY = 7
+
+
+class StubSec(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # header 與 body 分開寫入，不關掉 Nagle 會卡在 delayed ACK
+    payloads = {}
+    tickers = b""
+    log = []
+    seen = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.log.append(time.monotonic())
+            first = self.path not in self.seen
+            self.seen.add(self.path)
+
+        if self.path == download.CIK_INDEX_PATH:
+            return self._send(200, self.tickers)
+        cik = self.path.rsplit("CIK", 1)[-1].removesuffix(".json")
+        if cik not in self.payloads:
+            return self._send(404, b"{}")
+        n = int(cik)
+        if first and n % THROTTLE_EVERY == 0:
+            return self._send(429, b"", {"Retry-After": "0"})
+        if first and n % FAIL_EVERY == 0:
+            return self._send(503, b"")
+        etag = f'"{cik}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"")
+        self._send(200, self.payloads[cik], {"ETag": etag})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def max_per_second(timestamps):
+    """任何 1 秒區間內的最大請求數"""
+    timestamps = sorted(timestamps)
+    best, j = 0, 0
+    for i, t in enumerate(timestamps):
+        while timestamps[j] <= t - 1.0:
+            j += 1
+        best = max(best, i - j + 1)
+    return best
+
+
+def bench_keep_alive(base_url, n=200):
+    url = base_url + download.CIK_INDEX_PATH
+    t0 = time.perf_counter()
+    for _ in range(n):
+        requests.get(url).content
+    t_new = time.perf_counter() - t0
+
+    client = sec_client.SecClient(www_url=base_url, rate=1e9, burst=1e9)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        client.get(client.www(download.CIK_INDEX_PATH)).content
+    t_pooled = time.perf_counter() - t0
+    client.close()
+    print(f"   keep-alive: {n} requests, new connection {t_new * 1000 / n:.2f} ms/req, "
+          f"pooled session {t_pooled * 1000 / n:.2f} ms/req ({t_new / t_pooled:.1f}x)")
+
+
+def main(n_tickers=60, threads=8, rate=10):
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    ciks = {t: str(1000 + i).zfill(10) for i, t in enumerate(tickers)}
+    StubSec.payloads = {cik: json.dumps(make_companyfacts(seed=i, unused_tags=20)).encode()
+                        for i, cik in enumerate(ciks.values())}
+    StubSec.tickers = json.dumps({str(i): {"cik_str": int(cik), "ticker": t, "title": t}
+                                  for i, (t, cik) in enumerate(ciks.items())}).encode()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSec)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    print(f"📊 sec_client: {n_tickers} tickers, {threads} threads, {rate} req/s")
+
+    bench_keep_alive(base_url)
+
+    StubSec.log.clear()
+    client = sec_client.configure(www_url=base_url, data_url=base_url, rate=rate,
+                                  backoff=0.05, pool_size=threads)
+    with temp_workdir():
+        db.create_table()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(threads) as pool:
+            list(pool.map(download.fetch_and_store_fundamentals, tickers))
+        elapsed = time.perf_counter() - t0
+
+        ok = True
+        columns = db.FUNDAMENTAL_COLUMNS[1:]
+        for ticker in tickers:
+            us_gaap = json.loads(StubSec.payloads[ciks[ticker]])["facts"]["us-gaap"]
+            expected = download.build_fundamentals(ticker, us_gaap).sort_values('year')
+            actual = db.select_fundamentals(ticker)
+            ok &= len(actual) == len(expected) and np.allclose(
+                actual[columns].to_numpy(float), expected[columns].to_numpy(float), equal_nan=True)
+    server.shutdown()
+
+    peak = max_per_second(StubSec.log)
+    metrics = client.metrics.snapshot()
+    sec_client.configure()
+    # bucket 容量為 1 時，閉區間 [t, t + 1] 最多剛好 rate + 1 個請求
+    within_limit = peak <= rate + 1
+    print(f"   download: {len(StubSec.log)} requests in {elapsed:.2f}s "
+          f"({len(StubSec.log) / elapsed:.1f} req/s, peak {peak} in any 1s window "
+          f"{'✅' if within_limit else '❌'})")
+    print(f"   metrics: {json.dumps(metrics)}")
+    print("   ✅ all fundamentals stored" if ok else "   ❌ fundamentals missing or different")
+    return ok and within_limit
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,235 @@
+"""
+database.py 儲存與查詢層的基準測試
+
+run：在暫存資料夾（或 --db 指定的檔案）產生假資料庫（tickers × years 年的日線、基本面、分類），
+     量測 insert_price、insert_fundamentals、select_price、get_all_tickers、get_last_price_date、
+     get_tickers_by_category、delete_ticker，每個操作記錄呼叫次數與 p50 / p95 / mean，輸出 JSON
+compare：比較兩次 run 的 JSON，p50 變慢超過 threshold 的操作標示為退步，有退步時回傳錯誤碼；
+         差距小於 --min-delta-ms 的不算（微秒級的查詢容易受機器負載影響）
+
+用法：
+    python -m benchmarks.bench_storage run --tickers 500 --years 10 -o before.json
+    python -m benchmarks.bench_storage run --tickers 500 --years 10 -o after.json
+    python -m benchmarks.bench_storage compare before.json after.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+from benchmarks import temp_workdir
+from benchmarks.bench_bulk_insert import make_history
+from benchmarks.bench_screener import make_fundamentals
+
+TRADING_DAYS = 252
+
+# 寫入股價時每次 insert_price 的股票數
+INSERT_CHUNK_TICKERS = 50
+
+
+class Recorder:
+    """收集每個操作每次呼叫的耗時"""
+
+    def __init__(self):
+        self.samples = {}
+        self.rows = {}
+
+    @contextlib.contextmanager
+    def time(self, name, rows=0):
+        t0 = time.perf_counter()
+        yield
+        self.samples.setdefault(name, []).append(time.perf_counter() - t0)
+        self.rows[name] = self.rows.get(name, 0) + rows
+
+    def summary(self):
+        results = {}
+        for name, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            results[name] = {
+                'calls': len(samples),
+                'total_s': round(float(ms.sum()) / 1000, 4),
+                'p50_ms': round(float(np.percentile(ms, 50)), 4),
+                'p95_ms': round(float(np.percentile(ms, 95)), 4),
+                'mean_ms': round(float(ms.mean()), 4),
+            }
+            if self.rows[name]:
+                results[name]['rows'] = self.rows[name]
+                results[name]['rows_per_s'] = round(self.rows[name] / (ms.sum() / 1000))
+        return results
+
+
+def build(recorder, tickers, years, n_categories, seed):
+    """產生假資料庫，同時量測寫入"""
+    db.create_table()
+    n_rows = years * TRADING_DAYS
+    for start in range(0, len(tickers), INSERT_CHUNK_TICKERS):
+        chunk = tickers[start:start + INSERT_CHUNK_TICKERS]
+        df = pd.concat([make_history(t, n_rows, seed=seed + start + i) for i, t in enumerate(chunk)],
+                       ignore_index=True)
+        with recorder.time('insert_price', rows=len(df)):
+            db.insert_price(df)
+
+    fundamentals = make_fundamentals(tickers, years=max(years, 2), seed=seed)
+    for _, df in fundamentals.groupby('ticker'):
+        with recorder.time('insert_fundamentals', rows=len(df)):
+            db.insert_fundamentals(df)
+
+    rng = np.random.default_rng(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for k in range(n_categories):
+            db.add_category(f"Category {k:02d}")
+    category_ids = [cat_id for cat_id, _ in db.get_all_categories()]
+    for ticker in tickers:
+        # 每檔股票屬於 1 ~ 2 個分類
+        for cat_id in rng.choice(category_ids, size=rng.integers(1, 3), replace=False):
+            db.assign_ticker_to_category(ticker, int(cat_id))
+    return category_ids
+
+
+def query(recorder, tickers, category_ids, samples, seed):
+    rng = np.random.default_rng(seed + 1)
+    sample = [tickers[i] for i in rng.integers(0, len(tickers), samples)]
+
+    for ticker in sample:
+        db.clear_cache()  # 量測從 SQLite 讀取，不是記憶體快取
+        with recorder.time('select_price'):
+            df = db.select_price(ticker)
+        recorder.rows['select_price'] += len(df)
+    for ticker in sample:
+        with recorder.time('select_price_cached'):
+            db.select_price(ticker)
+
+    for _ in range(max(10, samples // 10)):
+        with recorder.time('get_all_tickers'):
+            db.get_all_tickers()
+    for ticker in sample:
+        with recorder.time('get_last_price_date'):
+            db.get_last_price_date(ticker)
+
+    for _ in range(max(1, samples // 50)):
+        with recorder.time('get_tickers_by_category(all)'):
+            db.get_tickers_by_category()
+        for cat_id in category_ids:
+            with recorder.time('get_tickers_by_category(id)'):
+                db.get_tickers_by_category(cat_id)
+
+    # 刪除放在最後：不重複刪同一檔
+    victims = list(dict.fromkeys(sample))[:max(1, samples // 10)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ticker in victims:
+            with recorder.time('delete_ticker'):
+                db.delete_ticker(ticker)
+
+
+def run(args):
+    tickers = [f"T{i:05d}" for i in range(args.tickers)]
+    recorder = Recorder()
+    print(f"📊 storage: {args.tickers} tickers × {args.years} years, {args.categories} categories")
+
+    context = temp_workdir() if args.db is None else contextlib.nullcontext()
+    with context:
+        if args.db is not None:
+            if os.path.exists(args.db):
+                sys.exit(f"❌ {args.db} already exists")
+            db.configure(path=args.db)
+        t0 = time.perf_counter()
+        category_ids = build(recorder, tickers, args.years, args.categories, args.seed)
+        build_time = time.perf_counter() - t0
+        query(recorder, tickers, category_ids, args.samples, args.seed)
+        db_size = sum(os.path.getsize(db.DB_PATH + suffix) for suffix in ("", "-wal")
+                      if os.path.exists(db.DB_PATH + suffix))
+
+    report = {
+        'meta': {
+            'tickers': args.tickers, 'years': args.years, 'categories': args.categories,
+            'samples': args.samples, 'seed': args.seed,
+            'build_s': round(build_time, 3), 'db_mb': round(db_size / 1e6, 1),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'pandas': pd.__version__, 'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': recorder.summary(),
+    }
+    for name, r in report['results'].items():
+        extra = f" | {r['rows_per_s']:>10,} rows/s" if 'rows_per_s' in r else ""
+        print(f"   {name:<30} {r['calls']:6d} calls | p50 {r['p50_ms']:9.3f} ms | p95 {r['p95_ms']:9.3f} ms{extra}")
+    print(f"   build {build_time:.1f}s, database {report['meta']['db_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   📝 {args.output}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    scale = ('tickers', 'years', 'categories', 'samples')
+    if any(baseline['meta'].get(k) != current['meta'].get(k) for k in scale):
+        print("⚠️ runs use different scales: " + ", ".join(
+            f"{k} {baseline['meta'].get(k)} → {current['meta'].get(k)}" for k in scale))
+
+    regressions = []
+    print(f"📊 {args.baseline} → {args.current} (threshold ±{args.threshold:.0%} and ≥{args.min_delta_ms} ms on p50)")
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        before, after = baseline['results'].get(name), current['results'].get(name)
+        if before is None or after is None:
+            print(f"   {name:<30} {'only in ' + (args.current if before is None else args.baseline)}")
+            continue
+        ratio = after['p50_ms'] / before['p50_ms'] if before['p50_ms'] > 0 else float('inf')
+        significant = abs(after['p50_ms'] - before['p50_ms']) >= args.min_delta_ms
+        if significant and ratio > 1 + args.threshold:
+            status = "❌ regression"
+            regressions.append(name)
+        elif significant and ratio < 1 - args.threshold:
+            status = "✅ faster"
+        else:
+            status = "   same"
+        print(f"   {name:<30} p50 {before['p50_ms']:9.3f} → {after['p50_ms']:9.3f} ms ({ratio:5.2f}x) {status}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("✅ no regressions")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the storage and query layer of database.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="產生假資料庫並量測")
+    p.add_argument("--tickers", type=int, default=200)
+    p.add_argument("--years", type=int, default=5, help="每檔股票的日線年數")
+    p.add_argument("--categories", type=int, default=10)
+    p.add_argument("--samples", type=int, default=200, help="查詢類操作抽樣的股票數")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--db", help="把資料庫留在這個路徑（必須不存在），預設建在暫存資料夾")
+    p.add_argument("-o", "--output", help="結果 JSON 檔")
+    p.set_defaults(func=run)
+
+    p = commands.add_parser("compare", help="比較兩次 run 的結果")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.2, help="p50 變化超過這個比例才算變快或退步")
+    p.add_argument("--min-delta-ms", type=float, default=0.05, help="p50 差距小於這個毫秒數時視為相同")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
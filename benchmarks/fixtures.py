@@ -0,0 +1,96 @@
+"""
+基本面效能測試用的 companyfacts 資料
+
+load_companyfacts() 優先讀取存下來的真實檔案（FIXTURE_DIR 或 sec_cache 裡的快取），
+沒有的話用 make_companyfacts() 產生結構相同的假資料：
+大量不會用到的 tag、每個 tag 有 10-K / 10-Q 多筆資料，以及同一年度被後續申報重述的情況。
+"""
+import glob
+import gzip
+import json
+import os
+import zipfile
+
+import numpy as np
+
+import sec_cache
+from download_data import FACT_TAGS
+
+FIXTURE_DIR = 'benchmarks/fixtures'
+
+# 大型公司的 us-gaap 通常有數百個 tag，實際只用到 FACT_TAGS 裡的幾十個
+UNUSED_TAGS = 500
+
+
+def _records(rng, years, per_year, base):
+    """一個 tag 的資料：每年一筆 10-K 加上幾筆 10-Q，並模擬隔年 10-K 重述前一年的數字"""
+    records = []
+    for year in years:
+        for quarter in range(per_year):
+            records.append({
+                "start": f"{year}-01-01", "end": f"{year}-12-31",
+                "val": int(base * (1 + 0.1 * rng.standard_normal())),
+                "accn": f"0000000000-{year % 100:02d}-{quarter:06d}",
+                "fy": int(year), "fp": "FY" if quarter == 0 else f"Q{quarter}",
+                "form": "10-K" if quarter == 0 else "10-Q", "filed": f"{year + 1}-02-15",
+            })
+        if year > years[0]:
+            records.append({**records[-per_year], "fy": int(year), "val": int(base * rng.uniform(0.9, 1.1)),
+                            "form": "10-K", "fp": "FY"})
+    return records
+
+
+def make_companyfacts(seed=0, years=15, unused_tags=UNUSED_TAGS, per_year=4):
+    """產生一份 companyfacts JSON（dict），結構與 SEC API 相同"""
+    rng = np.random.default_rng(seed)
+    span = list(range(2025 - years, 2025))
+    us_gaap = {}
+
+    for field, tags in FACT_TAGS.items():
+        base = 10 ** rng.integers(7, 11)
+        for k, tag in enumerate(tags):
+            # 部分候選 tag 缺少或只涵蓋部分年度，才會用到 tag 的優先順序
+            if rng.random() < 0.3 and k > 0:
+                continue
+            tag_years = span if k == 0 else span[rng.integers(0, years // 2):]
+            unit = "shares" if field == "shares" else "USD"
+            us_gaap[tag] = {"label": tag, "description": "",
+                            "units": {unit: _records(rng, tag_years, per_year, base)}}
+
+    for i in range(unused_tags):
+        us_gaap[f"UnusedConcept{i:04d}"] = {"label": "", "description": "",
+                                            "units": {"USD": _records(rng, span, per_year, 1e6)}}
+
+    return {"cik": 1000 + seed, "entityName": f"Synthetic {seed}",
+            "facts": {"dei": {}, "us-gaap": us_gaap}}
+
+
+def fixture_paths():
+    """存下來的 companyfacts 檔案：FIXTURE_DIR 的 .json / .json.gz，以及 sec_cache 裡的快取"""
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json")) +
+                   glob.glob(os.path.join(FIXTURE_DIR, "*.json.gz")))
+    paths += sorted(glob.glob(os.path.join(sec_cache.CACHE_DIR, "CIK*.json.gz")))
+    return paths
+
+
+def read_fixture(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return f.read()
+
+
+def load_companyfacts(count=20):
+    """回傳 [(名稱, JSON bytes), ...]；沒有存下來的檔案時產生 count 份假資料"""
+    paths = fixture_paths()
+    if paths:
+        return [(os.path.basename(p), read_fixture(p)) for p in paths]
+    return [(f"synthetic-{i}", json.dumps(make_companyfacts(seed=i)).encode()) for i in range(count)]
+
+
+def make_companyfacts_zip(path, ciks, unused_tags=50):
+    """產生與 SEC companyfacts.zip 相同格式的壓縮檔，每個 CIK 一個 CIK##########.json"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for seed, cik in enumerate(ciks):
+            facts = make_companyfacts(seed=seed, unused_tags=unused_tags)
+            facts["cik"] = int(cik)
+            zf.writestr(f"CIK{int(cik):010d}.json", json.dumps(facts))
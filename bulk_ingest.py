@@ -0,0 +1,155 @@
+"""
+從 SEC 的 companyfacts.zip 離線匯入基本面
+
+SEC 每天提供全部公司的 companyfacts 打包檔（https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip），
+下載一次就能更新整個股票池，不需要逐檔呼叫 API。
+zip 內每家公司一個 CIK##########.json，直接從 zip 串流讀取不解壓到磁碟；
+只處理對應到資料庫中 ticker 的 CIK，由多個 process 並行解析，主 process 分批寫入 fundamentals_annual。
+
+用法：
+    python bulk_ingest.py companyfacts.zip
+    python bulk_ingest.py companyfacts.zip --workers 8 --tickers-json company_tickers.json
+"""
+import argparse
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import database as db
+import download_data as download
+import xbrl_stream
+
+# 每個 worker 任務處理的檔案數（太小會花太多時間在行程間傳遞）
+MEMBERS_PER_TASK = 16
+
+# 解壓後小於這個大小的檔案直接整份 json.loads（比串流解析快），更大的才用 xbrl_stream 控制記憶體
+IN_MEMORY_BYTES = 16 * 1024 * 1024
+
+# 累積到這麼多列才寫入一次
+WRITE_BATCH_ROWS = 20000
+
+_zip = None
+
+
+def _open_zip(path):
+    """worker 初始化：每個 process 只開一次 zip"""
+    global _zip
+    _zip = zipfile.ZipFile(path)
+
+
+def _parse_members(names):
+    """
+    在 worker process 執行：解析一批 zip 內的檔案
+    回傳 [(cik, DataFrame 或 None, 解壓後大小), ...]，DataFrame 的 ticker 欄位由主 process 填入
+    """
+    results = []
+    for name in names:
+        info = _zip.getinfo(name)
+        if info.file_size < IN_MEMORY_BYTES:
+            standards = json.loads(_zip.read(info)).get("facts", {})
+        else:
+            with _zip.open(info) as source:
+                standards = xbrl_stream.parse(source, download.FACT_TAG_NAMES)["facts"]
+        us_gaap = standards.get("us-gaap") or standards.get("ifrs-full")
+        df = download.build_fundamentals("", us_gaap) if us_gaap is not None else None
+        results.append((_member_cik(name), df, info.file_size))
+    return results
+
+
+def _member_cik(name):
+    """CIK0000320193.json → 0000320193（與 cik_index 的 10 碼格式相同）"""
+    return os.path.basename(name)[3:-len(".json")]
+
+
+def load_ticker_ciks(tickers_json=None):
+    """
+    取得資料庫中股票的 {cik: [ticker, ...]}（同一家公司可能有多個 ticker，例如 GOOG / GOOGL）
+    tickers_json 為本地的 company_tickers.json，指定時不需要連網
+    """
+    tickers = db.get_all_tickers()
+    if tickers_json:
+        with open(tickers_json, encoding="utf-8") as f:
+            index = download.build_cik_index(json.load(f))
+        mapping = {t: index[t.upper()] for t in tickers if t.upper() in index}
+    else:
+        mapping = download.tickers_to_ciks(tickers)
+
+    by_cik = {}
+    for ticker, cik in mapping.items():
+        by_cik.setdefault(cik, []).append(ticker)
+    return by_cik
+
+
+def ingest(zip_path, workers=None, tickers_json=None, batch_rows=WRITE_BATCH_ROWS):
+    """
+    匯入 zip 中對應到資料庫股票的公司基本面，回傳統計 dict
+    """
+    by_cik = load_ticker_ciks(tickers_json)
+    with zipfile.ZipFile(zip_path) as zf:
+        members = [info for info in zf.infolist()
+                   if info.filename.endswith(".json") and _member_cik(info.filename) in by_cik]
+    members.sort(key=lambda info: info.file_size, reverse=True)  # 大檔先送出，避免最後只剩一個 worker 在跑
+    names = [info.filename for info in members]
+    total_bytes = sum(info.file_size for info in members)
+    print(f"📦 {len(names)} companies in {os.path.basename(zip_path)} match {len(by_cik)} CIKs "
+          f"({total_bytes / 1e6:.0f} MB uncompressed, workers: {workers or os.cpu_count()})")
+
+    stats = {'companies': 0, 'skipped': 0, 'rows': 0, 'bytes': 0}
+    pending = []
+    pending_rows = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal pending, pending_rows
+        if pending:
+            db.insert_fundamentals(pd.concat(pending, ignore_index=True))
+            stats['rows'] += pending_rows
+        pending, pending_rows = [], 0
+
+    tasks = [names[i:i + MEMBERS_PER_TASK] for i in range(0, len(names), MEMBERS_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_zip, initargs=(zip_path,)) as pool:
+        for results in pool.map(_parse_members, tasks):
+            for cik, df, size in results:
+                stats['bytes'] += size
+                if df is None:
+                    stats['skipped'] += 1
+                    continue
+                stats['companies'] += 1
+                for ticker in by_cik[cik]:
+                    pending.append(df.assign(ticker=ticker))
+                    pending_rows += len(df)
+            if pending_rows >= batch_rows:
+                flush()
+            done = stats['companies'] + stats['skipped']
+            elapsed = time.perf_counter() - started
+            print(f"   {done}/{len(names)} companies, {stats['bytes'] / 1e6 / elapsed:.1f} MB/s", end="\r")
+    flush()
+
+    stats['elapsed'] = time.perf_counter() - started
+    print(f"\n✅ {stats['companies']} companies, {stats['rows']} rows in {stats['elapsed']:.1f}s "
+          f"({stats['companies'] / stats['elapsed']:.1f} companies/s, "
+          f"{stats['bytes'] / 1e6 / stats['elapsed']:.1f} MB/s)")
+    if stats['skipped']:
+        print(f"   ⚠️ {stats['skipped']} companies had no us-gaap / ifrs-full revenue data")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ingest fundamentals from SEC companyfacts.zip")
+    parser.add_argument("zip_path", help="companyfacts.zip 路徑")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 檔案路徑")
+    parser.add_argument("--workers", type=int, default=None, help="解析用的 process 數，預設為 CPU 數")
+    parser.add_argument("--tickers-json", help="本地的 company_tickers.json（不指定時使用 CIK 對照表快取或下載）")
+    args = parser.parse_args()
+
+    db.configure(path=args.db)
+    db.create_table()
+    ingest(args.zip_path, workers=args.workers, tickers_json=args.tickers_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+技術面圖表（股價走勢 / 漲跌幅）
+
+每檔股票載入時只計算一次 MA20、MA60 與漲跌幅，切換 1M/6M/1Y/ALL 或上一段/下一段時，
+用二分搜尋在已排序的日期陣列上找出區間，再原地更新既有的線條與長條，不用 ax.clear() 重畫。
+
+長區間（例如 ALL）的點數遠多於畫面像素，線條改用預先算好的 min/max 金字塔降採樣，
+長條則改成週線或月線彙總，畫出的點數只跟圖表寬度有關。
+"""
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba
+
+# 各區間的長度（月）
+PERIOD_MONTHS = {"1M": 1, "6M": 6, "1Y": 12}
+
+BAR_WIDTH = 0.8  # 天
+
+# 每根長條至少要有幾個像素寬，不夠時改用週 / 月彙總
+MIN_BAR_PIXELS = 3
+
+# 彙總長條的層級：(名稱, pandas period, 大約天數)
+BAR_LEVELS = [("weekly", "W", 7), ("monthly", "M", 30.4)]
+
+
+def rolling_mean(values, window):
+    """用累加和計算移動平均，前 window-1 筆為 NaN"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+class MinMaxPyramid:
+    """
+    降採樣用的 min/max 金字塔：第 k 層把資料每 2^k 筆分一組，記錄組內最小值、最大值的位置
+    畫圖時挑出組數約等於像素寬度的層級，每組畫最小與最大兩個點，區間內的極值不會遺失
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self._vmin = np.where(np.isnan(values), np.inf, values)
+        self._vmax = np.where(np.isnan(values), -np.inf, values)
+        self.levels = []
+
+        imin = imax = np.arange(len(values))
+        while len(imin) > 1:
+            if len(imin) % 2:
+                imin = np.append(imin, imin[-1])
+                imax = np.append(imax, imax[-1])
+            a, b = imin[0::2], imin[1::2]
+            imin = np.where(self._vmin[b] < self._vmin[a], b, a)
+            a, b = imax[0::2], imax[1::2]
+            imax = np.where(self._vmax[b] > self._vmax[a], b, a)
+            self.levels.append((imin, imax))
+
+    def indices(self, lo, hi, max_points):
+        """回傳 [lo, hi) 區間降採樣後要畫的索引（已排序），點數不超過約 max_points"""
+        n = hi - lo
+        if n <= max_points:
+            return np.arange(lo, hi)
+
+        k = int(np.ceil(np.log2(2 * n / max_points)))
+        size = 1 << k
+        first, last = -(-lo // size), hi // size  # 完整落在區間內的組
+        if k > len(self.levels) or first >= last:
+            return np.arange(lo, hi)
+
+        imin, imax = self.levels[k - 1]
+        parts = [imin[first:last], imax[first:last]]
+        # 頭尾不完整的組直接從原始資料找極值
+        for start, stop in ((lo, first * size), (last * size, hi)):
+            if stop > start:
+                parts.append([start + np.argmin(self._vmin[start:stop]),
+                              start + np.argmax(self._vmax[start:stop])])
+        return np.unique(np.concatenate(parts))
+
+
+class PriceChart:
+    # 預先算好的指標欄位（indicator_daily）對應到圖上的名稱
+    PRECOMPUTED_MA = {"MA20": "sma20", "MA60": "sma60"}
+
+    def __init__(self, ax, df, ticker, indicators=None):
+        """indicators: db.select_indicators 的結果，日期與 df 完全一致時直接使用，否則自行計算"""
+        self.ax = ax
+        self.ticker = ticker
+        self.dates = df["date"].to_numpy(dtype="datetime64[ns]")
+        self.x = mdates.date2num(self.dates)
+        self.close = df["close"].to_numpy(dtype=float)
+
+        # 指標只算一次；資料不足時不畫（與原本 len(df) >= 20 / 60 的判斷相同）
+        aligned = (indicators is not None and len(indicators) == len(self.dates)
+                   and (indicators["date"].to_numpy(dtype="datetime64[ns]") == self.dates).all())
+        self.ma = {}
+        for name, window in (("MA20", 20), ("MA60", 60)):
+            if len(self.close) < window:
+                continue
+            if aligned:
+                self.ma[name] = indicators[self.PRECOMPUTED_MA[name]].to_numpy(dtype=float)
+            else:
+                self.ma[name] = rolling_mean(self.close, window)
+
+        self.change = np.full(len(self.close), np.nan)
+        if len(self.close) > 1:
+            self.change[1:] = (self.close[1:] / self.close[:-1] - 1) * 100
+        self.change_colors = np.array([to_rgba("gray")] * len(self.change))
+        self.change_colors[self.change > 0] = to_rgba("red")
+        self.change_colors[self.change < 0] = to_rgba("green")
+
+        self.pyramids = {"Close": MinMaxPyramid(self.close)}
+        for name, values in self.ma.items():
+            self.pyramids[name] = MinMaxPyramid(values)
+        self.bar_levels = self._build_bar_levels(df["date"])
+
+        self.mode = None
+        self.artists = {}
+
+    def _build_bar_levels(self, dates):
+        """
+        預先算好週線、月線的漲跌幅
+        每一層記錄各期最後一筆的索引（用來對應日線區間）、長條中心位置、寬度、漲跌幅與顏色
+        """
+        levels = {}
+        index = pd.DatetimeIndex(dates)
+        if len(index) == 0:
+            return levels
+        for name, freq, days in BAR_LEVELS:
+            keys = index.to_period(freq).asi8
+            ends = np.append(np.flatnonzero(keys[1:] != keys[:-1]), len(keys) - 1)
+            starts = np.insert(ends[:-1] + 1, 0, 0)
+            closes = self.close[ends]
+            change = np.full(len(ends), np.nan)
+            if len(ends) > 1:
+                change[1:] = (closes[1:] / closes[:-1] - 1) * 100
+            colors = np.array([to_rgba("gray")] * len(change))
+            colors[change > 0] = to_rgba("red")
+            colors[change < 0] = to_rgba("green")
+            levels[name] = {
+                "ends": ends,
+                "x": (self.x[starts] + self.x[ends]) / 2,
+                "width": days * BAR_WIDTH,
+                "change": change,
+                "colors": colors,
+            }
+        return levels
+
+    def _pixel_width(self):
+        width = self.ax.get_window_extent().width
+        return int(width) if width > 1 else 600
+
+    def window(self, period, offset=0):
+        """回傳區間在陣列中的 [lo, hi)，條件與原本的 (date > start) & (date <= end) 相同"""
+        if period == "ALL" or len(self.dates) == 0:
+            return 0, len(self.dates)
+        months = PERIOD_MONTHS[period]
+        end_date = pd.Timestamp(self.dates[-1]) - pd.DateOffset(months=months * offset)
+        start_date = end_date - pd.DateOffset(months=months)
+        lo = np.searchsorted(self.dates, np.datetime64(start_date), side="right")
+        hi = np.searchsorted(self.dates, np.datetime64(end_date), side="right")
+        return lo, hi
+
+    def _setup(self, chart_type):
+        """切換圖表類型時才重建 artist"""
+        ax = self.ax
+        ax.clear()
+        ax.xaxis_date()
+        ax.tick_params(axis="x", labelrotation=30)
+        ax.figure.subplots_adjust(bottom=0.2)
+        ax.set_xlabel("Date")
+        self.artists = {}
+
+        if chart_type == "price":
+            self.artists["Close"], = ax.plot([], [], label="Close", color="blue")
+            colors = {"MA20": "orange", "MA60": "green"}
+            for name in self.ma:
+                self.artists[name], = ax.plot([], [], label=name, color=colors[name])
+            ax.set_ylabel("Price")
+            ax.legend()
+        else:
+            self.artists["bars"] = PolyCollection([], alpha=0.7)
+            ax.add_collection(self.artists["bars"])
+            ax.axhline(y=0, color="black", linestyle="-", linewidth=0.5)
+            ax.set_ylabel("Change (%)")
+            self.artists["avg"] = ax.text(0.02, 0.98, "", transform=ax.transAxes, verticalalignment="top",
+                                          bbox=dict(boxstyle="round", facecolor="wheat", alpha=0.5))
+        self.mode = chart_type
+
+    def draw(self, chart_type="price", period="6M", offset=0):
+        if chart_type != self.mode:
+            self._setup(chart_type)
+
+        lo, hi = self.window(period, offset)
+        x = self.x[lo:hi]
+
+        pixels = self._pixel_width()
+
+        if chart_type == "price":
+            visible = []
+            series = {"Close": self.close, **self.ma}
+            for name, values in series.items():
+                # 每個像素最多畫最小、最大兩個點
+                idx = self.pyramids[name].indices(lo, hi, 2 * pixels)
+                self.artists[name].set_data(self.x[idx], values[idx])
+                visible.append(values[idx])
+            self.ax.set_title(f"{self.ticker} Price Chart ({period})")
+            self._set_limits(x, np.concatenate(visible))
+
+        elif chart_type == "change":
+            level_name = "daily"
+            bar_x, change, colors, width = x, self.change[lo:hi], self.change_colors[lo:hi], BAR_WIDTH
+            if hi - lo > pixels / MIN_BAR_PIXELS:
+                # 日線太密：改用週線，再不夠就用月線
+                for level_name, _, _ in BAR_LEVELS:
+                    level = self.bar_levels[level_name]
+                    plo = np.searchsorted(level["ends"], lo, side="left")
+                    phi = np.searchsorted(level["ends"], hi, side="left")
+                    bar_x, change = level["x"][plo:phi], level["change"][plo:phi]
+                    colors, width = level["colors"][plo:phi], level["width"]
+                    if phi - plo <= pixels / MIN_BAR_PIXELS:
+                        break
+
+            heights = np.nan_to_num(change)
+            verts = np.empty((len(bar_x), 4, 2))
+            verts[:, [0, 1], 0] = (bar_x - width / 2)[:, None]
+            verts[:, [2, 3], 0] = (bar_x + width / 2)[:, None]
+            verts[:, [0, 3], 1] = 0
+            verts[:, [1, 2], 1] = heights[:, None]
+            self.artists["bars"].set_verts(verts)
+            self.artists["bars"].set_facecolor(colors)
+            avg_change = np.nanmean(change) if np.isfinite(change).any() else np.nan
+            suffix = "" if level_name == "daily" else f" ({level_name})"
+            self.artists["avg"].set_text(f"Avg: {avg_change:.2f}%{suffix}")
+            self.ax.set_title(f"{self.ticker} Daily Price Change ({period})" if level_name == "daily"
+                              else f"{self.ticker} {level_name.capitalize()} Price Change ({period})")
+            self._set_limits(bar_x, np.append(heights, 0.0), pad_x=width)
+
+    def _set_limits(self, x, y, pad_x=0.0):
+        """collection 不會被 relim 計算，直接用 numpy 算出範圍"""
+        if len(x) == 0:
+            return
+        self.ax.set_xlim(x[0] - pad_x - 0.5, x[-1] + pad_x + 0.5)
+        y = y[np.isfinite(y)]
+        if len(y):
+            low, high = y.min(), y.max()
+            margin = (high - low) * 0.05 or abs(high) * 0.05 or 1.0
+            self.ax.set_ylim(low - margin, high + margin)
@@ -0,0 +1,162 @@
+"""
+命令列工具：排程更新、新增、刪除與匯出，不需要開啟 GUI
+
+不會載入 tkinter / matplotlib；pandas、yfinance 等也只在執行到需要的命令時才載入，
+例如 delete 完全不需要 pandas（啟動時間見 benchmarks/bench_import_time.py）。
+
+用法：
+    python cli.py update                         # 更新股價（批次抓取）
+    python cli.py update-fundamentals            # 更新股價與基本面
+    python cli.py add AAPL MSFT --category 科技
+    python cli.py delete AAPL
+    python cli.py export AAPL MSFT -o prices.csv
+    python cli.py export --fundamentals -o fundamentals.csv
+    python cli.py --replay recordings/2025-06 --latency 200 update   # 用錄製的資料離線執行
+    python cli.py --metrics-prom /var/lib/node_exporter/textfile/usstock.prom update   # 匯出各階段統計
+"""
+import argparse
+import os
+import sys
+
+import data_sources
+import database as db
+import instrumentation
+
+
+def _update(args, update_fundamentals):
+    import columnar_store
+    import download_data as download
+    import indicators
+    # 與 GUI 相同，寫入股價後增量更新技術指標與欄位式鏡像（有 pyarrow 時）
+    indicators.enable()
+    columnar_store.enable()
+    summary = download.update_all_ticker(update_fundamentals=update_fundamentals, workers=args.workers,
+                                         batch_size=0 if args.no_batch else args.batch_size)
+    # 全部失敗（通常是網路或來源出問題）才回傳錯誤碼，讓排程可以發出通知；個別下市的股票不算
+    return 0 if summary['failed'] < summary['total'] or summary['total'] == 0 else 1
+
+
+def cmd_update(args):
+    return _update(args, update_fundamentals=False)
+
+
+def cmd_update_fundamentals(args):
+    return _update(args, update_fundamentals=True)
+
+
+def cmd_add(args):
+    import columnar_store
+    import download_data as download
+    import indicators
+    indicators.enable()
+    columnar_store.enable()
+    tickers = [t.upper().strip() for t in args.tickers]
+    if len(tickers) == 1:
+        added = tickers if download.insert_ticker(tickers[0]) else []
+    else:
+        added = download.insert_tickers(tickers)
+    for ticker in added:
+        download.fetch_and_store_fundamentals(ticker)
+
+    if args.category and added:
+        categories = {name: cat_id for cat_id, name in db.get_all_categories()}
+        if args.category not in categories:
+            db.add_category(args.category)
+            categories = {name: cat_id for cat_id, name in db.get_all_categories()}
+        for ticker in added:
+            db.assign_ticker_to_category(ticker, categories[args.category])
+
+    failed = sorted(set(tickers) - set(added))
+    print(f"✅ Added {len(added)}/{len(tickers)}" + (f" | ❌ failed: {', '.join(failed)}" if failed else ""))
+    return 0 if not failed else 1
+
+
+def cmd_delete(args):
+    results = [db.delete_ticker(t.upper().strip()) for t in args.tickers]
+    return 0 if all(results) else 1
+
+
+def cmd_export(args):
+    import pandas as pd
+    tickers = [t.upper() for t in args.tickers] or db.get_all_tickers()
+    frames = []
+    for ticker in tickers:
+        if args.fundamentals:
+            df = db.select_fundamentals(ticker)
+        else:
+            df = db.select_price(ticker).assign(ticker=ticker)
+        frames.append(df)
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        print("⚠️ No data to export", file=sys.stderr)
+        return 1
+    out = pd.concat(frames, ignore_index=True)
+    out = out[['ticker'] + [col for col in out.columns if col != 'ticker']]
+    out.to_csv(args.output or sys.stdout, index=False)
+    if args.output:
+        print(f"📤 {len(out)} rows of {len(frames)} tickers → {args.output}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="USstock command line tools")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 檔案路徑")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="DIR", help="把抓到的回應錄製到 DIR")
+    source.add_argument("--replay", metavar="DIR", help="不連網，從 DIR 重播錄製的回應")
+    parser.add_argument("--latency", type=float, default=0.0, help="重播時每個請求的模擬延遲（毫秒）")
+    parser.add_argument("--metrics-json", metavar="PATH", help="結束時把各階段耗時與計數存成 JSON")
+    parser.add_argument("--metrics-prom", metavar="PATH", help="結束時寫成 Prometheus textfile")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, func, help_text in (("update", cmd_update, "更新所有股票的股價"),
+                                  ("update-fundamentals", cmd_update_fundamentals, "更新所有股票的股價與基本面")):
+        p = commands.add_parser(name, help=help_text)
+        p.add_argument("--workers", type=int, default=8, help="同時抓取的 thread 數")
+        p.add_argument("--batch-size", type=int, default=100, help="每次請求合併的股票數")
+        p.add_argument("--no-batch", action="store_true", help="逐檔抓取")
+        p.set_defaults(func=func)
+
+    p = commands.add_parser("add", help="新增股票（完整歷史股價與基本面）")
+    p.add_argument("tickers", nargs="+")
+    p.add_argument("--category", help="新增後指定到這個分類（不存在時自動建立）")
+    p.set_defaults(func=cmd_add)
+
+    p = commands.add_parser("delete", help="刪除股票與其所有資料")
+    p.add_argument("tickers", nargs="+")
+    p.set_defaults(func=cmd_delete)
+
+    p = commands.add_parser("export", help="匯出股價或基本面為 CSV")
+    p.add_argument("tickers", nargs="*", help="不指定時匯出全部股票")
+    p.add_argument("--fundamentals", action="store_true", help="匯出基本面（預設為股價）")
+    p.add_argument("-o", "--output", help="輸出檔案，預設為標準輸出")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db.configure(path=args.db)
+    db.create_table()
+    if args.record:
+        data_sources.set_source(data_sources.RecordingSource(args.record))
+    elif args.replay:
+        data_sources.set_source(data_sources.ReplaySource(args.replay, latency=args.latency / 1000))
+    try:
+        return args.func(args)
+    finally:
+        # 失敗的執行也匯出，才看得出卡在哪個階段
+        snap = instrumentation.snapshot()
+        if args.metrics_json:
+            instrumentation.export_json(args.metrics_json, snap)
+        if args.metrics_prom:
+            instrumentation.export_prometheus(args.metrics_prom, snap)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # 輸出被 head 等指令提早關閉，不印出 traceback
+        sys.stdout = open(os.devnull, "w")
+        sys.exit(1)
@@ -0,0 +1,171 @@
+"""
+股價的欄位式（Arrow IPC）鏡像，給大量讀取的分析用
+
+每檔股票一個未壓縮的 .arrow 檔，可以直接 memory-map，讀取時只取需要的欄位與日期區間。
+SQLite 仍是正式資料來源：enable() 之後每次 db.insert_price 會增量更新對應的檔案，
+檔案不存在、或與 tickers 登記表的日期區間與筆數不符（例如沒有 enable() 的程式寫過 SQLite）時，
+select_price 會改從 SQLite 讀取並重建。
+
+需要 pyarrow（選用套件），沒有安裝時 enable() 回傳 False，select_price 一律讀 SQLite。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import database as db
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+STORE_DIR = 'database/columnar'
+
+VALUE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits']
+
+
+def is_available():
+    return pa is not None
+
+
+def enable():
+    """開始在每次寫入後同步更新欄位式鏡像，沒有 pyarrow 時回傳 False"""
+    if pa is None:
+        return False
+    db.add_write_listener(_on_write)
+    return True
+
+
+def disable():
+    db.remove_write_listener(_on_write)
+
+
+def _path(ticker):
+    return os.path.join(STORE_DIR, ticker.replace(os.sep, "_") + ".arrow")
+
+
+def _read_table(ticker):
+    """memory-map 讀取整個檔案，不存在時回傳 None"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, 'r') as source:
+        return ipc.open_file(source).read_all()
+
+
+def _write_table(ticker, table):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(ticker)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _to_table(data):
+    """把 insert_price 的輸入格式轉成 Arrow table（day 為 1970-01-01 起算的天數）"""
+    columns = {'day': pa.array(db._to_day_numbers(data['date']).astype('int32'))}
+    for col in VALUE_COLUMNS:
+        values = data[col].to_numpy()
+        columns[col] = pa.array(values.astype('int64') if col == 'volume' else values.astype('float64'))
+    return pa.table(columns)
+
+
+def update(ticker, data):
+    """把新寫入的股價合併進檔案；新資料都在最後一天之後時直接接在後面"""
+    existing = _read_table(ticker)
+    if existing is None:
+        # 還沒有檔案：這次寫入可能只是最新幾天，從 SQLite 建完整的檔案
+        rebuild(ticker)
+        return
+
+    new = _to_table(data).sort_by('day')
+    if len(existing) and len(new) and new['day'][0].as_py() > existing['day'][-1].as_py():
+        merged = pa.concat_tables([existing, new])
+    else:
+        # 有覆寫舊日期：保留新資料，再依日期排序
+        keep = pc.invert(pc.is_in(existing['day'], value_set=new['day']))
+        merged = pa.concat_tables([existing.filter(keep), new]).sort_by('day')
+    _write_table(ticker, merged)
+
+
+def rebuild(ticker=None):
+    """從 SQLite 重建檔案，ticker 為 None 時重建全部股票"""
+    tickers = [ticker] if ticker else db.get_all_tickers()
+    for t in tickers:
+        df = db.select_price(t)
+        if df.empty:
+            delete(t)
+        else:
+            _write_table(t, _to_table(df))
+
+
+def delete(ticker):
+    try:
+        os.remove(_path(ticker))
+    except FileNotFoundError:
+        pass
+
+
+def _is_fresh(table, ticker):
+    """檔案的第一天、最後一天與筆數要跟 tickers 登記表一致"""
+    registry = db.get_price_date_range(ticker)
+    if registry is None or len(table) == 0:
+        return False
+    first_date, last_date, row_count = registry
+    days = table['day']
+    return (len(table) == row_count and days[0].as_py() == _to_day(first_date)
+            and days[-1].as_py() == _to_day(last_date))
+
+
+def _on_write(event, ticker, data):
+    if event == 'price':
+        update(ticker, data)
+    elif event == 'delete':
+        delete(ticker)
+
+
+def _to_day(value):
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype('int64'))
+
+
+def select_price(ticker, columns=None, start=None, end=None):
+    """
+    讀取股價，回傳與 db.select_price 相同格式的 DataFrame
+
+    Args:
+        columns: 只讀取的欄位（date 一定會包含），None 代表全部
+        start / end: 日期區間（含頭尾），可為字串或 datetime
+    """
+    columns = list(columns) if columns else VALUE_COLUMNS
+    table = _read_table(ticker) if pa is not None else None
+    if table is not None and not _is_fresh(table, ticker):
+        table = None
+
+    if table is None:
+        # 沒有檔案或檔案過期：讀 SQLite，有 pyarrow 的話順便重建
+        df = db.select_price(ticker)
+        if pa is not None:
+            if df.empty:
+                delete(ticker)
+            else:
+                _write_table(ticker, _to_table(df))
+        if start is not None:
+            df = df[df['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df['date'] <= pd.Timestamp(end)]
+        return df[['date'] + columns].reset_index(drop=True)
+
+    # day 已排序，用二分搜尋找出區間後直接切片（不複製資料）
+    days = table['day'].to_numpy()
+    lo = np.searchsorted(days, _to_day(start), 'left') if start is not None else 0
+    hi = np.searchsorted(days, _to_day(end), 'right') if end is not None else len(days)
+    table = table.slice(lo, hi - lo).select(['day'] + columns)
+
+    df = table.to_pandas()
+    df.insert(0, 'date', pd.to_datetime(df.pop('day').astype('int64'), unit='D').astype('datetime64[ns]'))
+    return df
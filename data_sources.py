@@ -0,0 +1,279 @@
+"""
+股價與 SEC 資料的來源
+
+download_data 不直接呼叫 yfinance 與 sec.gov，而是透過目前的資料來源：
+  LiveSource     ：yfinance + sec_client（預設）
+  RecordingSource：把另一個來源（預設 LiveSource）的回應存到資料夾，之後可以離線重播
+  ReplaySource   ：從錄製的資料夾回應，可以設定每個請求的模擬延遲，
+                   在沒有網路的環境下完整跑一次抓取、解析與寫入的流程來量測效能
+
+資料來源只提供原始回應（Ticker.history 格式的 DataFrame、HTTP 回應），
+格式轉換、SEC 快取與條件式請求仍由 download_data 處理，重播時也會執行到。
+yfinance、requests 與 pandas 都在第一次用到時才載入，只匯入這個模組不會拖慢命令列工具的啟動。
+
+錄製資料夾的結構：
+    prices/<ticker>.pkl         該檔股票收到過的所有股價（不同起始日期的回應合併），重播時依 start_date 篩選
+    sec/<path>.gz + .meta.json  SEC 回應的內容與狀態碼、ETag、Last-Modified
+
+用法：
+    data_sources.set_source(data_sources.RecordingSource("recordings/2025-06"))
+    data_sources.set_source(data_sources.ReplaySource("recordings/2025-06", latency=0.2))
+"""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import quote, urlsplit
+
+# 錄製 SEC 回應時保留的 header
+RECORDED_HEADERS = ("ETag", "Last-Modified", "Content-Type")
+
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+CHUNK_BYTES = 64 * 1024
+
+
+class DataSource(ABC):
+    """資料來源介面；缺少任何一個方法的實作在建立時就會拋出 TypeError，不會等到更新途中才失敗"""
+
+    @abstractmethod
+    def history(self, ticker, start_date=None):
+        """與 yf.Ticker(ticker).history 相同格式的 DataFrame，start_date 為 None 時為全部歷史"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def history_batch(self, tickers, start_date=None):
+        """與 yf.download(tickers, group_by="column") 相同格式的寬表"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def sec_get(self, url, headers=None, stream=False):
+        """對 SEC 送出 GET，回傳 requests.Response 相容的物件"""
+        raise NotImplementedError
+
+
+class LiveSource(DataSource):
+    def history(self, ticker, start_date=None):
+        import yfinance as yf
+        ticker_obj = yf.Ticker(ticker)
+        if start_date:
+            return ticker_obj.history(start=start_date)
+        return ticker_obj.history(period="max")
+
+    def history_batch(self, tickers, start_date=None):
+        # 參數與 Ticker.history 的預設相同（還原權值、含股利與分割），結果與逐檔抓取一致
+        import yfinance as yf
+        options = {'start': start_date} if start_date else {'period': "max"}
+        return yf.download(list(tickers), actions=True, auto_adjust=True, group_by="column",
+                           progress=False, threads=True, **options)
+
+    def sec_get(self, url, headers=None, stream=False):
+        import sec_client
+        return sec_client.get_client().get(url, headers=headers, stream=stream)
+
+
+def combine_histories(frames):
+    """
+    把 {ticker: Ticker.history 格式} 合併成 yf.download(group_by="column") 的寬表：
+    拿掉時區、以所有日期的聯集對齊、欄位為 (Price, Ticker)、代號為大寫
+    """
+    import pandas as pd
+    frames = {ticker.upper(): df.tz_localize(None) if df.index.tz is not None else df
+              for ticker, df in frames.items() if not df.empty}
+    if not frames:
+        return pd.DataFrame()
+    wide = pd.concat(frames.values(), axis=1, sort=True, keys=frames.keys(), names=['Ticker', 'Price'])
+    wide.columns = wide.columns.swaplevel(0, 1)
+    return wide.sort_index(level=0, axis=1)
+
+
+class Recording:
+    """錄製資料夾的讀寫"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _history_path(self, ticker):
+        return os.path.join(self.path, "prices", quote(ticker, safe="") + ".pkl")
+
+    def _response_paths(self, url):
+        base = os.path.join(self.path, "sec", quote(urlsplit(url).path, safe=""))
+        return base + ".gz", base + ".meta.json"
+
+    def load_history(self, ticker):
+        import pandas as pd
+        path = self._history_path(ticker)
+        return pd.read_pickle(path) if os.path.exists(path) else None
+
+    def save_history(self, ticker, df):
+        """與已錄製的股價合併（同一天以新的為準）"""
+        import pandas as pd
+        path = self._history_path(ticker)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old = self.load_history(ticker)
+            if old is not None and not old.empty:
+                df = pd.concat([old, df]) if not df.empty else old
+                df = df[~df.index.duplicated(keep='last')].sort_index()
+            df.to_pickle(path)
+
+    def load_response(self, url):
+        """回傳 (狀態碼, headers, 內容檔案路徑)，沒有錄製時回傳 None"""
+        body_path, meta_path = self._response_paths(url)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta["status"], meta["headers"], body_path
+
+    def save_response(self, url, status, headers, body):
+        body_path, meta_path = self._response_paths(url)
+        with self._lock:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            with gzip.open(body_path, "wb", compresslevel=1) as f:
+                f.write(body)
+            headers = {k: headers[k] for k in RECORDED_HEADERS if headers.get(k)}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"status": status, "headers": headers}, f)
+
+
+class ReplayResponse:
+    """重播用的回應，只實作 download_data 用到的 requests.Response 介面"""
+
+    def __init__(self, url, status_code, headers, body_path=None):
+        from requests.structures import CaseInsensitiveDict
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self._body_path = body_path
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            if self._body_path is None:
+                self._content = b""
+            else:
+                with gzip.open(self._body_path, "rb") as f:
+                    self._content = f.read()
+        return self._content
+
+    def iter_content(self, chunk_size=CHUNK_BYTES):
+        if self._content is not None or self._body_path is None:
+            content = self.content
+            for i in range(0, len(content), chunk_size):
+                yield content[i:i + chunk_size]
+            return
+        with gzip.open(self._body_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        import requests
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def close(self):
+        pass
+
+
+class RecordingSource(DataSource):
+    """
+    把 inner 的回應錄製到 path
+    SEC 請求會拿掉條件式 header，確保錄到完整內容（不會錄到沒有內容的 304）
+    """
+
+    def __init__(self, path, inner=None):
+        self.recording = Recording(path)
+        self.inner = inner or LiveSource()
+
+    def history(self, ticker, start_date=None):
+        df = self.inner.history(ticker, start_date)
+        self.recording.save_history(ticker, df)
+        return df
+
+    def history_batch(self, tickers, start_date=None):
+        # 逐檔抓取再合併：錄下來的是每檔原本的時區與格式，重播批次或逐檔請求都能使用
+        return combine_histories({ticker: self.history(ticker, start_date) for ticker in tickers})
+
+    def sec_get(self, url, headers=None, stream=False):
+        headers = {k: v for k, v in (headers or {}).items() if k not in CONDITIONAL_HEADERS}
+        r = self.inner.sec_get(url, headers=headers)
+        self.recording.save_response(url, r.status_code, r.headers, r.content)
+        return r
+
+
+class ReplaySource(DataSource):
+    """
+    從錄製的資料夾回應
+    每個請求（包含一次批次請求）先等待 latency 秒，jitter 為上下浮動的比例，例如 latency=0.2, jitter=0.5 為 0.1 ~ 0.3 秒
+    沒有錄到的股票回傳空的 DataFrame（與 yfinance 查不到代號時相同），沒有錄到的 SEC 網址回 404
+    """
+
+    def __init__(self, path, latency=0.0, jitter=0.0, seed=None):
+        self.recording = Recording(path)
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.requests = 0
+
+    def _wait(self):
+        with self._random_lock:
+            self.requests += 1
+            delay = self.latency * (1 + self.jitter * self._random.uniform(-1, 1))
+        if delay > 0:
+            time.sleep(delay)
+
+    def _history(self, ticker, start_date):
+        import pandas as pd
+        df = self.recording.load_history(ticker)
+        if df is None:
+            return pd.DataFrame()
+        if start_date and not df.empty:
+            df = df[df.index >= pd.Timestamp(start_date, tz=df.index.tz)]
+        return df
+
+    def history(self, ticker, start_date=None):
+        self._wait()
+        return self._history(ticker, start_date)
+
+    def history_batch(self, tickers, start_date=None):
+        self._wait()
+        return combine_histories({ticker: self._history(ticker, start_date) for ticker in tickers})
+
+    def sec_get(self, url, headers=None, stream=False):
+        self._wait()
+        recorded = self.recording.load_response(url)
+        if recorded is None:
+            return ReplayResponse(url, 404, {})
+        status, recorded_headers, body_path = recorded
+
+        # 與 SEC 相同的條件式請求：ETag 或 Last-Modified 相同時回 304
+        headers = headers or {}
+        etag, last_modified = recorded_headers.get("ETag"), recorded_headers.get("Last-Modified")
+        if status == 200 and ((etag and headers.get("If-None-Match") == etag) or
+                              (last_modified and headers.get("If-Modified-Since") == last_modified)):
+            return ReplayResponse(url, 304, recorded_headers)
+        return ReplayResponse(url, status, recorded_headers, body_path)
+
+
+_source = LiveSource()
+
+
+def get_source():
+    return _source
+
+
+def set_source(source):
+    """更換目前的資料來源，回傳原本的來源（方便還原）"""
+    global _source
+    previous, _source = _source, source
+    return previous
@@ -1,18 +1,217 @@
 import sqlite3
-import pandas as pd
 import os
+import threading
+from collections import OrderedDict
+
+import instrumentation
+
+# pandas / numpy 在讀寫 DataFrame、陣列的函式內才載入，只刪除股票或查清單的命令列操作不需要它們
+
+DB_PATH = 'database/stock.db'
+
+# 每條連線建立時套用的 PRAGMA，可用 configure() 調整
+PRAGMAS = {
+    'journal_mode': 'WAL',      # 更新時不會擋住讀取
+    'synchronous': 'NORMAL',    # WAL 模式下 NORMAL 已足夠安全，寫入快很多
+    'cache_size': -64000,       # 負數單位為 KiB，約 64 MB
+    'mmap_size': 268435456,     # 256 MB
+    'foreign_keys': 'ON',       # 讓 ON DELETE CASCADE 生效
+    'busy_timeout': 5000,       # 毫秒
+    'temp_store': 'MEMORY',     # 批次寫入用的暫存表放在記憶體
+}
+
+_local = threading.local()
+_config_version = 0
+
+
+def configure(path=None, **pragmas):
+    """
+    調整資料庫路徑或 PRAGMA，例如 configure(synchronous='FULL', cache_size=-200000)
+    已開啟的連線會在各 thread 下次取得連線時重新建立
+    """
+    global DB_PATH, _config_version
+    if path is not None:
+        DB_PATH = path
+        _frame_cache.clear()
+    PRAGMAS.update(pragmas)
+    _config_version += 1
+
+
+def get_connection():
+    """
+    取得目前 thread 共用的連線（thread-local），第一次使用時才建立
+    所有資料庫函式都透過這裡取得連線，不再每次呼叫都重新 connect
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.version == _config_version:
+        return conn
+    if conn is not None:
+        conn.close()
+
+    directory = os.path.dirname(DB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    _local.conn = conn
+    _local.version = _config_version
+    return conn
+
+
+def close_connection():
+    """關閉目前 thread 的連線（thread 結束時也會自動釋放）"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# ========== 讀取快取 ==========
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # select_price / select_fundamentals 快取上限
+
+
+class FrameCache:
+    """
+    以記憶體用量為上限的 LRU 快取，存放 select_price / select_fundamentals 的結果
+    key 為 (種類, ticker)；寫入或刪除某檔股票時呼叫 invalidate 讓它的資料失效
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, bytes)
+        self._versions = {}            # ticker -> 失效次數，避免寫入前讀到的舊資料在寫入後才放進快取
+        self._epoch = 0                # clear() 次數
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """命中時回傳複本（呼叫端可以自由修改），沒有時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+    def version(self, ticker):
+        """查詢資料庫前先取得版本，put 時版本不同代表中間有寫入，結果不放進快取"""
+        with self._lock:
+            return self._epoch, self._versions.get(ticker, 0)
+
+    def put(self, key, df, version):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if size > self.max_bytes or (self._epoch, self._versions.get(key[1], 0)) != version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (df, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, ticker):
+        with self._lock:
+            self._versions[ticker] = self._versions.get(ticker, 0) + 1
+            for key in [k for k in self._entries if k[1] == ticker]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_frame_cache = FrameCache(CACHE_MAX_BYTES)
+
+
+def cache_stats():
+    """讀取快取的統計：筆數、佔用 bytes、命中 / 未命中 / 淘汰次數"""
+    return _frame_cache.stats()
+
+
+def clear_cache():
+    _frame_cache.clear()
+
+
+def set_cache_limit(max_bytes):
+    """調整快取上限（bytes），0 代表停用快取"""
+    _frame_cache.max_bytes = max_bytes
+    _frame_cache.clear()
+
+
+# ========== 寫入通知 ==========
+# 其他模組（例如 columnar_store）可以註冊 listener，在資料寫入後同步更新自己的資料
+_write_listeners = []
+
+
+def add_write_listener(listener):
+    """
+    註冊寫入通知 listener(event, ticker, data)
+    event 為 'price'、'fundamentals'（data 為寫入的 DataFrame）、'delete'（data 為 None），
+    'category'（分類成員變動，data 為 category_id；刪除整個分類時 ticker 為 None），
+    或 'indicators'（寫入技術指標，ticker 為 None，data 為 ticker_id 陣列）
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def remove_write_listener(listener):
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+
+def _notify_write(event, ticker, data=None):
+    for listener in list(_write_listeners):
+        try:
+            listener(event, ticker, data)
+        except Exception as e:
+            # listener 失敗不影響已經寫入資料庫的資料
+            print(f"⚠️ {event} listener failed for {ticker}: {e}")
 
 
 def create_table():
-    os.makedirs('database', exist_ok=True)
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
 
-    # 原有的價格表
+    # 股票登記表（維度表）：價格表用 id 參照，另記錄第一天、最後一天與筆數，insert_price 時同步更新
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_daily (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT,
+        CREATE TABLE IF NOT EXISTS tickers (
+            id INTEGER PRIMARY KEY,
+            ticker TEXT UNIQUE NOT NULL,
+            first_date TEXT,
+            last_date TEXT,
+            row_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # 價格表：整數 ticker_id + 整數日期（1970-01-01 起算的天數），
+    # WITHOUT ROWID 讓資料直接依 (ticker_id, day) 聚集存放，不需要額外的索引
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_bars (
+            ticker_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
             open REAL,
             high REAL,
             low REAL,
@@ -20,9 +219,9 @@ def create_table():
             volume INTEGER,
             dividends REAL,
             stock_splits REAL,
-            ticker TEXT,
-            UNIQUE (ticker, date))
-            ''')
+            PRIMARY KEY (ticker_id, day)
+        ) WITHOUT ROWID
+    ''')
 
     # 原有的基本面表（擴充版：包含現金流和負債）
     cursor.execute('''
@@ -70,21 +269,188 @@ def create_table():
             FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
         )
     ''')
+    # 依分類找股票（篩選器、分類頁）用；主鍵是 (ticker, category_id)，反方向需要另外的索引
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ticker_categories_category
+        ON ticker_categories (category_id, ticker)
+    ''')
+
+    # 每檔股票目前的基本面來自哪一份 companyfacts（ETag / Last-Modified），與基本面同一個 transaction 寫入；
+    # 同一個 CIK 可能對應多檔股票（GOOG / GOOGL），所以以 ticker 為單位記錄，不能只看 CIK 的快取
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fundamentals_sources (
+            ticker TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT
+        )
+    ''')
+
+    # SEC ticker → CIK 對照表（本地快取，避免每檔股票都下載 company_tickers.json）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cik_index (
+            ticker TEXT PRIMARY KEY,
+            cik TEXT NOT NULL
+        )
+    ''')
+
+    # 技術指標（indicators.py 批次計算後寫入，畫圖與篩選直接讀取）
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS indicator_daily (
+            ticker_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            {', '.join(col + ' REAL' for col in INDICATOR_COLUMNS)},
+            PRIMARY KEY (ticker_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+    # 技術指標的增量計算狀態（每檔一列，記錄算到哪一天與 EMA / Wilder 平均的延續值）
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            ticker_id INTEGER PRIMARY KEY,
+            day INTEGER NOT NULL,
+            {', '.join(col + ' REAL' for col in INDICATOR_STATE_COLUMNS)}
+        )
+    ''')
+
+    # 雜項設定／時間戳記
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
 
     conn.commit()
     cursor.close()
-    conn.close()
+
+    # 舊版資料庫：把 price_daily 搬到 price_bars
+    if _table_exists('price_daily'):
+        migrate_price_daily()
+
+
+def _table_exists(name):
+    cursor = get_connection().execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def migrate_price_daily():
+    """
+    把舊版 price_daily（TEXT 日期、每列存 ticker 字串）轉成 price_bars，完成後刪除舊表
+    回傳搬移的筆數；檔案空間要 VACUUM 後才會釋放（見 migrate_db.py）
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO tickers (ticker) SELECT DISTINCT ticker FROM price_daily")
+        # julianday('1970-01-01') = 2440587.5
+        cursor = conn.execute("""
+            INSERT OR REPLACE INTO price_bars (
+                ticker_id, day, open, high, low, close, volume, dividends, stock_splits
+            )
+            SELECT t.id, CAST(julianday(p.date) - 2440587.5 AS INTEGER),
+                   p.open, p.high, p.low, p.close, p.volume, p.dividends, p.stock_splits
+            FROM price_daily p
+            JOIN tickers t ON t.ticker = p.ticker
+            WHERE p.date IS NOT NULL
+        """)
+        migrated = cursor.rowcount
+        conn.execute("DROP TABLE price_daily")
+    rebuild_ticker_registry()
+    _frame_cache.clear()
+    print(f"🔄 Migrated {migrated} rows from price_daily to price_bars")
+    return migrated
+
+
+def vacuum():
+    """重整資料庫檔案，釋放刪除資料後留下的空間"""
+    get_connection().execute("VACUUM")
+
+
+def _to_day_numbers(dates):
+    """把日期欄位（'YYYY-MM-DD' 字串或 datetime，可含時區）轉成 1970-01-01 起算的天數"""
+    import pandas as pd
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.values.astype('datetime64[D]').astype('int64')
+
+
+def _get_ticker_id(cursor, ticker):
+    """取得股票在 tickers 表的 id，沒有的話新增一筆"""
+    cursor.execute("INSERT OR IGNORE INTO tickers (ticker) VALUES (?)", (ticker,))
+    cursor.execute("SELECT id FROM tickers WHERE ticker = ?", (ticker,))
+    return cursor.fetchone()[0]
+
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits']
+
+FUNDAMENTAL_COLUMNS = [
+    'ticker', 'year', 'revenue', 'cogs', 'gross_margin',
+    'operating_income', 'operating_margin', 'net_income', 'net_margin',
+    'shares', 'eps', 'operating_cash_flow', 'investing_cash_flow',
+    'financing_cash_flow', 'free_cash_flow', 'total_assets',
+    'total_liabilities', 'current_liabilities', 'long_term_debt',
+    'stockholders_equity', 'debt_to_asset_ratio',
+]
+
+INDICATOR_COLUMNS = [
+    'sma20', 'sma50', 'sma60', 'sma200', 'ema12', 'ema26', 'rsi14',
+    'macd', 'macd_signal', 'macd_hist', 'bb_upper', 'bb_lower', 'atr14',
+]
+
+INDICATOR_STATE_COLUMNS = [
+    'ema12', 'ema26', 'macd_signal',
+    'rsi_gain', 'rsi_loss', 'rsi_gain_total', 'rsi_loss_total', 'rsi_count',
+    'atr', 'atr_total', 'atr_count',
+]
+
+# 每批寫入的筆數，每批一個 transaction
+BULK_BATCH_ROWS = 50000
+
+
+def _bulk_upsert(cursor, stage_table, columns, arrays, merge_sql, after_merge=None):
+    """
+    分批把欄位陣列寫進暫存表，再用一句 INSERT ... SELECT ... ON CONFLICT 合併到正式表
+    每批只把該批的欄位轉成 Python list，不會一次建立整份資料的 tuple list
+    after_merge(cursor, start, stop) 在同一批的 transaction 內、合併之後執行
+    """
+    conn = cursor.connection
+    placeholders = ", ".join("?" * len(columns))
+    insert_stage = f"INSERT INTO {stage_table} ({', '.join(columns)}) VALUES ({placeholders})"
+    n = len(arrays[0]) if arrays else 0
+    for start in range(0, n, BULK_BATCH_ROWS):
+        stop = min(start + BULK_BATCH_ROWS, n)
+        batch = [array[start:stop].tolist() for array in arrays]
+        with conn:
+            cursor.execute(f"DELETE FROM {stage_table}")
+            cursor.executemany(insert_stage, zip(*batch))
+            cursor.execute(merge_sql)
+            cursor.execute(f"DELETE FROM {stage_table}")
+            if after_merge is not None:
+                after_merge(cursor, start, stop)
 
 
 def insert_price(data):
-    conn = sqlite3.connect('database/stock.db')
+    """
+    寫入股價，data 欄位為 date, open, high, low, close, volume, dividends, stock_splits, ticker
+    date 可以是 'YYYY-MM-DD' 字串或 datetime（含時區亦可）
+    """
+    conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS _stage_price (
+            ticker_id INTEGER, day INTEGER, open REAL, high REAL, low REAL, close REAL,
+            volume INTEGER, dividends REAL, stock_splits REAL
+        )
+    """)
     sql = """
-    INSERT INTO price_daily (
-        date, open, high, low, close, volume, dividends, stock_splits,ticker
+    INSERT INTO price_bars (
+        ticker_id, day, open, high, low, close, volume, dividends, stock_splits
     )
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ON CONFLICT(ticker, date)
+    SELECT ticker_id, day, open, high, low, close, volume, dividends, stock_splits
+    FROM _stage_price
+    WHERE true
+    ON CONFLICT(ticker_id, day)
     DO UPDATE SET
         open = excluded.open,
         high = excluded.high,
@@ -94,15 +460,68 @@ def insert_price(data):
         dividends = excluded.dividends,
         stock_splits = excluded.stock_splits;
     """
-    data_to_insert = list(data.itertuples(index=False, name=None))
-    cursor.executemany(sql, data_to_insert)
-    conn.commit()
-    conn.close()
+    # 寫入監聽（例如技術指標的增量更新）不算在 write.price
+    with instrumentation.timer('write.price'):
+        with conn:
+            ticker_ids = {ticker: _get_ticker_id(cursor, ticker) for ticker in data['ticker'].unique()}
+
+        ids = data['ticker'].map(ticker_ids).to_numpy()
+        arrays = [ids, _to_day_numbers(data['date'])]
+        arrays += [data[col].to_numpy() for col in PRICE_COLUMNS]
+
+        def refresh(cursor, start, stop):
+            # 登記資料與股價在同一個 transaction 更新，中途失敗也不會不一致
+            for ticker_id in set(ids[start:stop].tolist()):
+                _refresh_registry(cursor, ticker_id)
+
+        _bulk_upsert(cursor, '_stage_price', ['ticker_id', 'day'] + PRICE_COLUMNS, arrays, sql,
+                     after_merge=refresh)
+    instrumentation.count('rows_written.price', len(data))
+
+    for ticker in ticker_ids:
+        _frame_cache.invalidate(ticker)
+        _notify_write('price', ticker, data if len(ticker_ids) == 1 else data[data['ticker'] == ticker])
+
+
+def _refresh_registry(cursor, ticker_id):
+    """依 price_bars 重新計算單一股票的登記資料（走 (ticker_id, day) 主鍵）"""
+    cursor.execute("""
+        UPDATE tickers
+        SET (first_date, last_date, row_count) = (
+            SELECT date(MIN(day) * 86400, 'unixepoch'), date(MAX(day) * 86400, 'unixepoch'), COUNT(*)
+            FROM price_bars
+            WHERE ticker_id = ?
+        )
+        WHERE id = ?
+    """, (ticker_id, ticker_id))
+
+
+def rebuild_ticker_registry():
+    """從 price_bars 全部重建股票登記表"""
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            UPDATE tickers
+            SET (first_date, last_date, row_count) = (
+                SELECT date(MIN(day) * 86400, 'unixepoch'), date(MAX(day) * 86400, 'unixepoch'), COUNT(*)
+                FROM price_bars
+                WHERE ticker_id = tickers.id
+            )
+        """)
 
 
-def insert_fundamentals(df):
-    conn = sqlite3.connect('database/stock.db')
+def insert_fundamentals(df, validators=None):
+    """
+    寫入基本面；validators 為資料來源 companyfacts 的 {'etag', 'last_modified'}，
+    與基本面在同一個 transaction 記錄到 fundamentals_sources（None 時刪除該股票的記錄，例如從 bulk 檔匯入）
+    """
+    conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS _stage_fundamentals (
+            ticker TEXT, year INTEGER, {', '.join(c + ' REAL' for c in FUNDAMENTAL_COLUMNS[2:])}
+        )
+    """)
 
     sql = """
     INSERT INTO fundamentals_annual (
@@ -113,7 +532,14 @@ def insert_fundamentals(df):
         total_liabilities, current_liabilities, long_term_debt, 
         stockholders_equity, debt_to_asset_ratio
     )
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    SELECT ticker, year, revenue, cogs, gross_margin,
+        operating_income, operating_margin, net_income, net_margin,
+        shares, eps, operating_cash_flow, investing_cash_flow,
+        financing_cash_flow, free_cash_flow, total_assets,
+        total_liabilities, current_liabilities, long_term_debt,
+        stockholders_equity, debt_to_asset_ratio
+    FROM _stage_fundamentals
+    WHERE true
     ON CONFLICT(ticker, year)
     DO UPDATE SET
         revenue=excluded.revenue,
@@ -137,142 +563,429 @@ def insert_fundamentals(df):
         debt_to_asset_ratio=excluded.debt_to_asset_ratio;
     """
 
-    data_to_insert = list(df.itertuples(index=False, name=None))
-    cursor.executemany(sql, data_to_insert)
-    conn.commit()
-    conn.close()
+    tickers = df['ticker'].unique().tolist()
+
+    def record_source(cursor, start, stop):
+        if stop < len(df):
+            return
+        if validators is None:
+            cursor.executemany("DELETE FROM fundamentals_sources WHERE ticker = ?", [(t,) for t in tickers])
+        else:
+            cursor.executemany("""
+                INSERT INTO fundamentals_sources (ticker, etag, last_modified) VALUES (?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified
+            """, [(t, validators.get('etag'), validators.get('last_modified')) for t in tickers])
+
+    with instrumentation.timer('write.fundamentals'):
+        arrays = [df[col].to_numpy() for col in FUNDAMENTAL_COLUMNS]
+        _bulk_upsert(cursor, '_stage_fundamentals', FUNDAMENTAL_COLUMNS, arrays, sql, after_merge=record_source)
+    instrumentation.count('rows_written.fundamentals', len(df))
+
+    for ticker in tickers:
+        _frame_cache.invalidate(ticker)
+        _notify_write('fundamentals', ticker, df)
 
 
 def select_fundamentals(ticker):
-    conn = sqlite3.connect('database/stock.db')
-    try:
-        sql = """
-        SELECT ticker, year, revenue, cogs, gross_margin, operating_income, 
-               operating_margin, net_income, net_margin, shares, eps,
-               operating_cash_flow, investing_cash_flow, financing_cash_flow,
-               free_cash_flow, total_assets, total_liabilities, 
-               current_liabilities, long_term_debt, stockholders_equity,
-               debt_to_asset_ratio
-        FROM fundamentals_annual
-        WHERE ticker = ?
-        ORDER BY year
-        """
-        df = pd.read_sql_query(sql, conn, params=(ticker,))
-        return df
-    finally:
-        conn.close()
+    import pandas as pd
+    cached = _frame_cache.get(('fundamentals', ticker))
+    if cached is not None:
+        return cached
+
+    version = _frame_cache.version(ticker)
+    conn = get_connection()
+    sql = """
+    SELECT ticker, year, revenue, cogs, gross_margin, operating_income, 
+           operating_margin, net_income, net_margin, shares, eps,
+           operating_cash_flow, investing_cash_flow, financing_cash_flow,
+           free_cash_flow, total_assets, total_liabilities, 
+           current_liabilities, long_term_debt, stockholders_equity,
+           debt_to_asset_ratio
+    FROM fundamentals_annual
+    WHERE ticker = ?
+    ORDER BY year
+    """
+    df = pd.read_sql_query(sql, conn, params=(ticker,))
+    _frame_cache.put(('fundamentals', ticker), df, version)
+    return df.copy()
+
+
+def select_latest_fundamentals(years=2, category_id=None):
+    """
+    一次讀出每檔股票最近 years 個年度的基本面（篩選器計算年增率用），依 (ticker, year) 排序
+    每檔的最新年度走 UNIQUE (ticker, year) 索引查出，不用掃描整張表再分組
+    """
+    import pandas as pd
+    conn = get_connection()
+    sql = f"""
+    SELECT {', '.join('f.' + col for col in FUNDAMENTAL_COLUMNS)}
+    FROM fundamentals_annual f
+    WHERE f.year > (SELECT MAX(year) FROM fundamentals_annual WHERE ticker = f.ticker) - ?
+    """
+    params = [years]
+    if category_id is not None:
+        sql += " AND f.ticker IN (SELECT ticker FROM ticker_categories WHERE category_id = ?)"
+        params.append(category_id)
+    return pd.read_sql_query(sql + " ORDER BY f.ticker, f.year", conn, params=params)
+
+
+def select_latest_prices(category_id=None):
+    """
+    每檔股票最後一個交易日的股價與技術指標（沒有計算過指標時為 NaN）
+    最後一天由 tickers.last_date 換算成天數，price_bars / indicator_daily 都走主鍵直接取得
+    """
+    import pandas as pd
+    conn = get_connection()
+    sql = f"""
+    SELECT t.ticker, t.last_date AS date, p.open, p.high, p.low, p.close, p.volume,
+           {', '.join('i.' + col for col in INDICATOR_COLUMNS)}
+    FROM tickers t
+    JOIN price_bars p
+      ON p.ticker_id = t.id AND p.day = CAST(julianday(t.last_date) - 2440587.5 AS INTEGER)
+    LEFT JOIN indicator_daily i ON i.ticker_id = p.ticker_id AND i.day = p.day
+    WHERE t.row_count > 0
+    """
+    params = ()
+    if category_id is not None:
+        sql += " AND t.ticker IN (SELECT ticker FROM ticker_categories WHERE category_id = ?)"
+        params = (category_id,)
+    df = pd.read_sql_query(sql + " ORDER BY t.ticker", conn, params=params)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def get_fundamentals_validators(ticker=None):
+    """
+    取得基本面來源的 {ticker: {'etag', 'last_modified'}}（insert_fundamentals 記錄的），
+    ticker 指定時只回傳該股票的 dict，沒有記錄時回傳 None
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    sql = """
+        SELECT s.ticker, s.etag, s.last_modified
+        FROM fundamentals_sources s
+        WHERE EXISTS (SELECT 1 FROM fundamentals_annual f WHERE f.ticker = s.ticker)
+    """
+    if ticker is not None:
+        cursor.execute(sql + " AND s.ticker = ?", (ticker,))
+    else:
+        cursor.execute(sql)
+    result = {t: {'etag': etag, 'last_modified': last_modified} for t, etag, last_modified in cursor.fetchall()}
+    return result if ticker is None else result.get(ticker)
+
+
+def has_fundamentals(ticker):
+    """檢查資料庫是否已有該股票的基本面資料"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM fundamentals_annual WHERE ticker = ? LIMIT 1", (ticker,))
+    result = cursor.fetchone()
+    return result is not None
 
 
 def select_price(ticker):
-    conn = sqlite3.connect('database/stock.db')
-    try:
-        sql = """
-        SELECT date, open, high, low, close, volume, dividends, stock_splits
-        FROM price_daily
-        WHERE ticker = ?
-        ORDER BY date
-        """
-        df = pd.read_sql_query(sql, conn, params=(ticker,))
-        df['date'] = pd.to_datetime(df['date'])
-        return df
-    finally:
-        conn.close()
+    import pandas as pd
+    cached = _frame_cache.get(('price', ticker))
+    if cached is not None:
+        return cached
+
+    version = _frame_cache.version(ticker)
+    conn = get_connection()
+    sql = """
+    SELECT p.day AS date, p.open, p.high, p.low, p.close, p.volume, p.dividends, p.stock_splits
+    FROM price_bars p
+    JOIN tickers t ON t.id = p.ticker_id
+    WHERE t.ticker = ?
+    ORDER BY p.day
+    """
+    df = pd.read_sql_query(sql, conn, params=(ticker,))
+    df['date'] = pd.to_datetime(df['date'], unit='D').astype('datetime64[ns]')
+    _frame_cache.put(('price', ticker), df, version)
+    return df.copy()
 
 
 def get_all_tickers():
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT DISTINCT ticker
-        FROM price_daily
+        SELECT ticker
+        FROM tickers
+        WHERE row_count > 0
+        ORDER BY ticker
     """)
     tickers = [row[0] for row in cursor.fetchall()]
-    conn.close()
     return tickers
 
 
 def get_last_price_date(ticker):
     """取得指定股票的最後價格日期"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT MAX(date)
-        FROM price_daily
+        SELECT last_date
+        FROM tickers
         WHERE ticker = ?
     """, (ticker,))
     result = cursor.fetchone()
-    conn.close()
-    return result[0] if result[0] else None
+    return result[0] if result and result[0] else None
+
+
+def get_price_date_range(ticker):
+    """取得單一股票的價格區間 (first_date, last_date, row_count)，沒有股價時回傳 None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT first_date, last_date, row_count
+        FROM tickers
+        WHERE ticker = ? AND row_count > 0
+    """, (ticker,))
+    return cursor.fetchone()
+
+
+def get_price_date_ranges():
+    """
+    一次取得所有股票的價格區間
+    回傳 {ticker: (first_date, last_date, row_count)}
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ticker, first_date, last_date, row_count
+        FROM tickers
+        WHERE row_count > 0
+    """)
+    return {ticker: (first, last, count) for ticker, first, last, count in cursor.fetchall()}
+
+
+def get_last_price_dates():
+    """一次取得所有股票的最後價格日期，回傳 {ticker: last_date}"""
+    return {ticker: last for ticker, (_, last, _) in get_price_date_ranges().items()}
 
 
 def delete_ticker(ticker):
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         # 刪除股價資料
-        cursor.execute("DELETE FROM price_daily WHERE ticker = ?", (ticker,))
+        cursor.execute("""
+            DELETE FROM price_bars
+            WHERE ticker_id = (SELECT id FROM tickers WHERE ticker = ?)
+        """, (ticker,))
         price_deleted = cursor.rowcount
 
         # 刪除基本面資料
         cursor.execute("DELETE FROM fundamentals_annual WHERE ticker = ?", (ticker,))
         fundamentals_deleted = cursor.rowcount
 
+        cursor.execute("DELETE FROM fundamentals_sources WHERE ticker = ?", (ticker,))
+
         # 刪除分類關聯
         cursor.execute("DELETE FROM ticker_categories WHERE ticker = ?", (ticker,))
 
+        # 刪除技術指標
+        cursor.execute("""
+            DELETE FROM indicator_daily
+            WHERE ticker_id = (SELECT id FROM tickers WHERE ticker = ?)
+        """, (ticker,))
+        cursor.execute("""
+            DELETE FROM indicator_state
+            WHERE ticker_id = (SELECT id FROM tickers WHERE ticker = ?)
+        """, (ticker,))
+
+        # 刪除登記資料
+        cursor.execute("DELETE FROM tickers WHERE ticker = ?", (ticker,))
+
         conn.commit()
-        print(f"🗑️ {ticker} deleted | price_daily: {price_deleted}, fundamentals_annual: {fundamentals_deleted}")
+        _frame_cache.invalidate(ticker)
+        _notify_write('delete', ticker)
+        print(f"🗑️ {ticker} deleted | price_bars: {price_deleted}, fundamentals_annual: {fundamentals_deleted}")
         return (price_deleted + fundamentals_deleted) > 0
     except sqlite3.Error as e:
+        conn.rollback()
         print("❌ 刪除失敗：", e)
         return False
-    finally:
-        conn.close()
+
+
+# ========== 技術指標 ==========
+
+def get_ticker_ids(tickers=None):
+    """回傳有股價資料的 {ticker: ticker_id}，tickers 指定時只查這些股票"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if tickers is None:
+        cursor.execute("SELECT ticker, id FROM tickers WHERE row_count > 0 ORDER BY ticker")
+    else:
+        tickers = list(tickers)
+        cursor.execute(f"""
+            SELECT ticker, id FROM tickers
+            WHERE row_count > 0 AND ticker IN ({', '.join('?' * len(tickers))})
+            ORDER BY ticker
+        """, tickers)
+    return dict(cursor.fetchall())
+
+
+def select_price_arrays(ticker_ids, columns=('close',), start_day=None):
+    """
+    一次讀出多檔股票的股價欄位，回傳 numpy 陣列 dict（含 ticker_id、day），依 (ticker_id, day) 排序
+    start_day 指定時只讀該日（含）之後的資料
+    """
+    import numpy as np
+    conn = get_connection()
+    ticker_ids = [int(ticker_id) for ticker_id in ticker_ids]
+    placeholders = ", ".join("?" * len(ticker_ids))
+    sql = f"""
+        SELECT ticker_id, day, {', '.join(columns)}
+        FROM price_bars
+        WHERE ticker_id IN ({placeholders})
+    """
+    params = ticker_ids
+    if start_day is not None:
+        sql += " AND day >= ?"
+        params = ticker_ids + [int(start_day)]
+    rows = conn.execute(sql + " ORDER BY ticker_id, day", params).fetchall()
+
+    names = ['ticker_id', 'day'] + list(columns)
+    if not rows:
+        return {name: np.array([], dtype='int64' if name in ('ticker_id', 'day') else 'float64')
+                for name in names}
+    values = np.array(rows, dtype='float64')
+    result = {name: values[:, i] for i, name in enumerate(names)}
+    result['ticker_id'] = result['ticker_id'].astype('int64')
+    result['day'] = result['day'].astype('int64')
+    return result
+
+
+def select_price_tail(ticker_id, end_day, n, columns=('close',)):
+    """讀取單一股票在 end_day（含）之前的最後 n 筆股價，依日期由舊到新排列"""
+    import numpy as np
+    conn = get_connection()
+    rows = conn.execute(f"""
+        SELECT day, {', '.join(columns)}
+        FROM price_bars
+        WHERE ticker_id = ? AND day <= ?
+        ORDER BY day DESC
+        LIMIT ?
+    """, (int(ticker_id), int(end_day), int(n))).fetchall()
+    values = np.array(rows[::-1], dtype='float64').reshape(-1, len(columns) + 1)
+    result = {name: values[:, i + 1] for i, name in enumerate(columns)}
+    result['day'] = values[:, 0].astype('int64')
+    return result
+
+
+def upsert_indicators(ticker_ids, days, values):
+    """
+    寫入技術指標
+    ticker_ids, days: 等長的陣列；values: {指標欄位: 陣列}，NaN 會存成 NULL
+    """
+    import numpy as np
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS _stage_indicators (
+            ticker_id INTEGER, day INTEGER, {', '.join(col + ' REAL' for col in INDICATOR_COLUMNS)}
+        )
+    """)
+    columns = [col for col in INDICATOR_COLUMNS if col in values]
+    sql = f"""
+    INSERT INTO indicator_daily (ticker_id, day, {', '.join(columns)})
+    SELECT ticker_id, day, {', '.join(columns)}
+    FROM _stage_indicators
+    WHERE true
+    ON CONFLICT(ticker_id, day)
+    DO UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in columns)};
+    """
+    arrays = [np.asarray(ticker_ids), np.asarray(days)] + [np.asarray(values[col]) for col in columns]
+    _bulk_upsert(cursor, '_stage_indicators', ['ticker_id', 'day'] + columns, arrays, sql)
+    _notify_write('indicators', None, arrays[0])
+
+
+def select_indicator_state(ticker_ids):
+    """讀取增量計算狀態，回傳 {ticker_id: {'day': ..., 狀態欄位: ...}}，沒有狀態的股票不會出現"""
+    conn = get_connection()
+    ticker_ids = [int(ticker_id) for ticker_id in ticker_ids]
+    if not ticker_ids:
+        return {}
+    cursor = conn.execute(f"""
+        SELECT ticker_id, day, {', '.join(INDICATOR_STATE_COLUMNS)}
+        FROM indicator_state
+        WHERE ticker_id IN ({', '.join('?' * len(ticker_ids))})
+    """, ticker_ids)
+    names = ['day'] + INDICATOR_STATE_COLUMNS
+    return {row[0]: dict(zip(names, row[1:])) for row in cursor.fetchall()}
+
+
+def upsert_indicator_state(ticker_ids, days, values):
+    """寫入增量計算狀態，values: {狀態欄位: 陣列}，NaN 會存成 NULL"""
+    import numpy as np
+    conn = get_connection()
+    columns = ['ticker_id', 'day'] + INDICATOR_STATE_COLUMNS
+    arrays = [np.asarray(ticker_ids), np.asarray(days)] + [np.asarray(values[col]) for col in INDICATOR_STATE_COLUMNS]
+    rows = zip(*(array.tolist() for array in arrays))
+    with conn:
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO indicator_state ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        """, rows)
+
+
+def select_indicators(ticker, columns=None):
+    """讀取單一股票的技術指標，回傳含 date 欄位的 DataFrame（沒有計算過時為空）"""
+    import pandas as pd
+    columns = list(columns) if columns else INDICATOR_COLUMNS
+    conn = get_connection()
+    sql = f"""
+    SELECT i.day AS date, {', '.join('i.' + col for col in columns)}
+    FROM indicator_daily i
+    JOIN tickers t ON t.id = i.ticker_id
+    WHERE t.ticker = ?
+    ORDER BY i.day
+    """
+    df = pd.read_sql_query(sql, conn, params=(ticker,))
+    df['date'] = pd.to_datetime(df['date'], unit='D').astype('datetime64[ns]')
+    return df
 
 
 # ========== 新增：分類管理功能 ==========
 
 def get_all_categories():
     """取得所有分類"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, name FROM categories ORDER BY name")
     categories = cursor.fetchall()
-    conn.close()
     return categories
 
 
 def add_category(name):
     """新增分類"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("INSERT INTO categories (name) VALUES (?)", (name,))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False  # 分類已存在
-    finally:
-        conn.close()
 
 
 def delete_category(category_id):
     """刪除分類（會自動刪除相關的股票-分類關聯）"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM categories WHERE id = ?", (category_id,))
         conn.commit()
+        _notify_write('category', None, category_id)
         return True
     except sqlite3.Error:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 
 def assign_ticker_to_category(ticker, category_id):
     """將股票指定到分類"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("""
@@ -280,16 +993,16 @@ def assign_ticker_to_category(ticker, category_id):
             VALUES (?, ?)
         """, (ticker, category_id))
         conn.commit()
+        _notify_write('category', ticker, category_id)
         return True
     except sqlite3.Error:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 
 def remove_ticker_from_category(ticker, category_id):
     """將股票從分類中移除"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("""
@@ -297,16 +1010,16 @@ def remove_ticker_from_category(ticker, category_id):
             WHERE ticker = ? AND category_id = ?
         """, (ticker, category_id))
         conn.commit()
+        _notify_write('category', ticker, category_id)
         return True
     except sqlite3.Error:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 
 def get_ticker_categories(ticker):
     """取得股票所屬的所有分類"""
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT c.id, c.name
@@ -316,7 +1029,6 @@ def get_ticker_categories(ticker):
         ORDER BY c.name
     """, (ticker,))
     categories = cursor.fetchall()
-    conn.close()
     return categories
 
 
@@ -325,28 +1037,84 @@ def get_tickers_by_category(category_id=None):
     取得分類下的所有股票
     如果 category_id 為 None，回傳所有股票及其分類
     """
-    conn = sqlite3.connect('database/stock.db')
+    conn = get_connection()
     cursor = conn.cursor()
 
     if category_id is None:
         # 取得所有股票及其分類（支援多分類）
         cursor.execute("""
-            SELECT DISTINCT pd.ticker, c.name as category_name
-            FROM price_daily pd
-            LEFT JOIN ticker_categories tc ON pd.ticker = tc.ticker
+            SELECT DISTINCT t.ticker, c.name as category_name
+            FROM tickers t
+            LEFT JOIN ticker_categories tc ON t.ticker = tc.ticker
             LEFT JOIN categories c ON tc.category_id = c.id
-            ORDER BY pd.ticker
+            WHERE t.row_count > 0
+            ORDER BY t.ticker
         """)
     else:
         # 取得特定分類下的股票
         cursor.execute("""
-            SELECT DISTINCT pd.ticker
-            FROM price_daily pd
-            JOIN ticker_categories tc ON pd.ticker = tc.ticker
-            WHERE tc.category_id = ?
-            ORDER BY pd.ticker
+            SELECT t.ticker
+            FROM tickers t
+            JOIN ticker_categories tc ON t.ticker = tc.ticker
+            WHERE tc.category_id = ? AND t.row_count > 0
+            ORDER BY t.ticker
         """, (category_id,))
 
     result = cursor.fetchall()
-    conn.close()
     return result
+
+
+def get_ticker_category_map(category_id=None):
+    """
+    一次查出股票與其所有分類，回傳 {ticker: [分類名稱, ...]}（依 ticker 排序）
+    category_id 指定時只包含該分類下的股票；取代逐檔呼叫 get_ticker_categories
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    sql = """
+        SELECT t.ticker, c.name
+        FROM tickers t
+        LEFT JOIN ticker_categories tc ON t.ticker = tc.ticker
+        LEFT JOIN categories c ON tc.category_id = c.id
+        WHERE t.row_count > 0
+    """
+    params = ()
+    if category_id is not None:
+        sql += " AND t.ticker IN (SELECT ticker FROM ticker_categories WHERE category_id = ?)"
+        params = (category_id,)
+    cursor.execute(sql + " ORDER BY t.ticker, c.name", params)
+
+    result = {}
+    for ticker, name in cursor.fetchall():
+        names = result.setdefault(ticker, [])
+        if name is not None:
+            names.append(name)
+    return result
+
+# ========== SEC CIK 對照表 ==========
+
+def replace_cik_index(index, refreshed_at):
+    """整批覆蓋 ticker → CIK 對照表，並記錄更新時間（unix timestamp）"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    with conn:
+        cursor.execute("DELETE FROM cik_index")
+        cursor.executemany("INSERT INTO cik_index (ticker, cik) VALUES (?, ?)", index.items())
+        cursor.execute("""
+            INSERT INTO meta (key, value) VALUES ('cik_index_refreshed_at', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (str(refreshed_at),))
+
+
+def load_cik_index():
+    """
+    讀取整份 ticker → CIK 對照表
+    回傳 (dict, 更新時間)，尚未建立時回傳 ({}, None)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT ticker, cik FROM cik_index")
+    index = dict(cursor.fetchall())
+    cursor.execute("SELECT value FROM meta WHERE key = 'cik_index_refreshed_at'")
+    row = cursor.fetchone()
+    return index, (float(row[0]) if row else None)
@@ -1,174 +1,733 @@
-import yfinance as yf
+# pandas、numpy、requests、yfinance 在函式內用到時才載入，命令列工具只匯入這個模組時啟動較快
 import database as db
-import pandas as pd
-import requests
+import data_sources
+import instrumentation
+import sec_cache
+import xbrl_stream
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+PRICE_COLUMNS = {
+    'Date': 'date',
+    'Open': 'open',
+    'High': 'high',
+    'Low': 'low',
+    'Close': 'close',
+    'Volume': 'volume',
+    'Dividends': 'dividends',
+    'Stock Splits': 'stock_splits'
+}
+
+
+def fetch_history(ticker, start_date=None):
+    """從目前的資料來源（預設為 yfinance）抓取股價，start_date 為 None 時抓全部歷史"""
+    with instrumentation.timer('fetch.price'):
+        df = data_sources.get_source().history(ticker, start_date)
+    # yfinance 不提供回應大小，股價以抓到的列數計
+    instrumentation.count('rows_fetched.price', len(df))
+    return df
+
+
+# 批次模式一次請求的股票數
+BATCH_SIZE = 100
+
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close']
+
+
+def fetch_history_batch(tickers, start_date=None):
+    """
+    一次抓多檔股價，回傳 yf.download 的寬表（欄位為 (Price, Ticker) 的 MultiIndex）
+    """
+    with instrumentation.timer('fetch.price_batch'):
+        return data_sources.get_source().history_batch(tickers, start_date)
+
 
-HEADERS = {"User-Agent": "j74062@email.com"}
+def split_batch(wide, tickers):
+    """
+    把多檔的寬表轉成 insert_price 的欄位格式（一次 stack，不逐檔處理）
+    回傳 (DataFrame, 有資料的 ticker 集合)；yfinance 會把代號轉成大寫，這裡換回原本的 ticker
+    """
+    with instrumentation.timer('transform.price_batch'):
+        df, found = _split_batch(wide, tickers)
+    instrumentation.count('rows_fetched.price', len(df))
+    return df, found
+
+
+def _split_batch(wide, tickers):
+    import pandas as pd
+    columns = ['date', 'open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits', 'ticker']
+    if wide is None or wide.empty or not isinstance(wide.columns, pd.MultiIndex):
+        return pd.DataFrame(columns=columns), set()
+
+    long = wide.stack(level='Ticker', future_stack=True)
+    # 合併時以所有股票日期的聯集對齊，該檔沒有交易的日期整列都是 NaN
+    long = long.dropna(subset=[c for c in PRICE_FIELDS if c in long.columns], how='all')
+    df = long.reset_index().rename(columns={**PRICE_COLUMNS, 'Ticker': 'ticker'})
+    df.columns.name = None
+    for col in ('dividends', 'stock_splits'):
+        if col not in df:
+            df[col] = 0.0
+    df[['dividends', 'stock_splits', 'volume']] = df[['dividends', 'stock_splits', 'volume']].fillna(0)
+
+    original = {t.upper(): t for t in tickers}
+    df['ticker'] = df['ticker'].map(original)
+    df = df[df['ticker'].notna()][columns]
+    price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
+    df[price_cols] = df[price_cols].round(2)
+    df['volume'] = df['volume'].astype(int)
+    return df, set(df['ticker'].unique())
+
+
+def format_history(df, ticker):
+    """把 yfinance 的 history 轉成 insert_price 的欄位格式"""
+    with instrumentation.timer('transform.price'):
+        return _format_history(df, ticker)
+
+
+def _format_history(df, ticker):
+    df = df.reset_index()
+    df['ticker'] = ticker
+    df = df.rename(columns=PRICE_COLUMNS)
+    df = df[['date', 'open', 'high', 'low', 'close',
+             'volume', 'dividends', 'stock_splits', 'ticker']]
+    # ⭐ 四捨五入兩位、volume 強制整數
+    price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
+    df[price_cols] = df[price_cols].round(2)
+    df['volume'] = df['volume'].astype(int)
+    return df
 
 
 def insert_ticker(ticker):  # 抓個股資料
     print(f"🔄 Fetching {ticker} up to today")
-    ticker_obj = yf.Ticker(ticker)
-    df = ticker_obj.history(period="max")
+    df = fetch_history(ticker)
     if df.empty:
         print(f"⚠️ No data for {ticker}")
         return False
     else:
-        df = df.reset_index()
-        df['ticker'] = ticker
-        df = df.rename(columns={
-            'Date': 'date',
-            'Open': 'open',
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'close',
-            'Dividends': 'dividends',
-            'Volume': 'volume',
-            'Stock Splits': 'stock_splits'
-        })
-        df = df[['date', 'open', 'high', 'low', 'close',
-                 'volume', 'dividends', 'stock_splits', 'ticker']]
-        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-        # ⭐ 四捨五入兩位、volume 強制整數
-        price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
-        df[price_cols] = df[price_cols].round(2)
-        df['volume'] = df['volume'].astype(int)
-
-        db.insert_price(df)
+        db.insert_price(format_history(df, ticker))
         return True
 
 
-def update_all_ticker(update_fundamentals=False):
+def insert_tickers(tickers, batch_size=BATCH_SIZE):
+    """
+    一次新增多檔股票的完整歷史，每 batch_size 檔合併成一次請求，批次中沒有資料的股票改用 insert_ticker 逐檔重抓
+    回傳成功新增的 ticker 列表
+    """
+    added = []
+    for i in range(0, len(tickers), batch_size):
+        chunk = tickers[i:i + batch_size]
+        print(f"🔄 Fetching {len(chunk)} tickers up to today")
+        try:
+            df, found = split_batch(fetch_history_batch(chunk), chunk)
+        except Exception as e:
+            print(f"⚠️ Batch fetch failed ({e}), fetching one by one")
+            df, found = None, set()
+        if found:
+            db.insert_price(df)
+        added += [t for t in chunk if t in found or insert_ticker(t)]
+    return added
+
+
+def _new_result(ticker):
+    return {'ticker': ticker, 'status': 'ok', 'df': None, 'fundamentals': [],
+            'message': '', 'fetch_time': 0.0}
+
+
+def _next_day(last_date):
+    """從最後日期的隔天開始抓"""
+    return (datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _fetch_fundamentals(ticker, result, prefetched):
+    """
+    抓基本面，(DataFrame, validators) 放進 result['fundamentals'] 交給 writer 寫入
+    CIK 對照表與各檔已寫入的基本面來源用 writer 預先查好的結果
+    """
+    fetch_and_store_fundamentals(ticker, store=lambda df, validators: result['fundamentals'].append((df, validators)),
+                                 cik_index=prefetched['cik_index'], validators=prefetched['validators'])
+
+
+def _fetch_update(ticker, last_date, update_fundamentals, fetcher, cancel_event=None, prefetched=None):
+    """
+    在 worker thread 執行：只做網路抓取與資料整理，不碰資料庫
+    回傳結果交給 writer 寫入
+    update_fundamentals 時 prefetched 為 writer 預先載入的 {'cik_index', 'validators'}
+    """
+    result = _new_result(ticker)
+    if cancel_event is not None and cancel_event.is_set():
+        result['status'] = 'cancelled'
+        return result
+    t0 = time.perf_counter()
+    try:
+        # 如果有最後日期，只抓取之後的資料（從最後日期的隔天開始抓）
+        if last_date:
+            df = fetcher(ticker, _next_day(last_date))
+            if df.empty:
+                result['status'] = 'up_to_date'
+                result['message'] = "✓ Already up to date"
+                return result
+            result['message'] = f"📥 {len(df)} new records"
+        else:
+            # 沒有歷史資料，抓全部
+            df = fetcher(ticker, None)
+            if df.empty:
+                result['status'] = 'failed'
+                result['message'] = "⚠️ No data available"
+                return result
+            result['message'] = f"📥 {len(df)} records (full history)"
+
+        result['df'] = format_history(df, ticker)
+
+        # 選擇性更新基本面：只抓資料，寫入同樣交給 writer
+        if update_fundamentals:
+            _fetch_fundamentals(ticker, result, prefetched)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['message'] = f"❌ Error: {e}"
+    finally:
+        result['fetch_time'] = time.perf_counter() - t0
+    return result
+
+
+def _fetch_batch(tickers, last_date, update_fundamentals, fetcher, batch_fetcher, cancel_event=None,
+                 prefetched=None):
+    """
+    在 worker thread 執行：最後日期相同的多檔股票合併成一次請求，再拆回每檔的結果（格式同 _fetch_update）
+    批次中沒有資料的股票改用 fetcher 逐檔重抓；有起始日期且整批都沒有資料時（例如週末）視為都已是最新，不逐檔重試
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return [_fetch_update(t, last_date, update_fundamentals, fetcher, cancel_event, prefetched)
+                for t in tickers]
+
+    t0 = time.perf_counter()
+    start_date = _next_day(last_date) if last_date else None
+    try:
+        df, found = split_batch(batch_fetcher(tickers, start_date), tickers)
+    except Exception:
+        df, found = None, set()  # 整批失敗，全部逐檔重抓
+    fetch_time = (time.perf_counter() - t0) / len(tickers)
+
+    if df is not None and not found and start_date:
+        results = []
+        for ticker in tickers:
+            result = _new_result(ticker)
+            result.update(status='up_to_date', message="✓ Already up to date", fetch_time=fetch_time)
+            results.append(result)
+        return results
+
+    groups = {ticker: group.reset_index(drop=True) for ticker, group in df.groupby('ticker', sort=False)} \
+        if found else {}
+    results = []
+    for ticker in tickers:
+        if ticker not in groups:
+            result = _fetch_update(ticker, last_date, update_fundamentals, fetcher, cancel_event, prefetched)
+            if result['df'] is not None and result['df']['date'].dt.tz is not None:
+                # 逐檔抓取的日期含時區、批次結果沒有，統一成當地日期才能跟同批合併寫入
+                result['df']['date'] = result['df']['date'].dt.tz_localize(None)
+            results.append(result)
+            continue
+        result = _new_result(ticker)
+        result['df'] = groups[ticker]
+        result['message'] = f"📥 {len(result['df'])} " + ("new records" if start_date else "records (full history)")
+        result['fetch_time'] = fetch_time
+        if update_fundamentals:
+            t1 = time.perf_counter()
+            try:
+                _fetch_fundamentals(ticker, result, prefetched)
+            except Exception as e:
+                result['status'] = 'failed'
+                result['message'] = f"❌ Error: {e}"
+            result['fetch_time'] += time.perf_counter() - t1
+        results.append(result)
+    return results
+
+
+def update_all_ticker(update_fundamentals=False, workers=8, fetcher=None, progress=None, cancel_event=None,
+                      batch_size=0, batch_fetcher=None):
     """
     更新所有股票的價格資料
-    
+
+    網路抓取由 worker pool 並行處理，資料庫寫入只由呼叫端這一個 writer 執行，
+    避免多個連線同時寫 SQLite 造成 database is locked
+
     Args:
         update_fundamentals: 是否同時更新基本面資料（預設 False，因為基本面是年度資料）
+        workers: 同時抓取的 thread 數量，1 即為逐檔抓取
+        fetcher: 抓股價的函式 fetcher(ticker, start_date)，預設為 fetch_history，
+                 測試時可換成模擬延遲的離線版本
+        progress: 每寫完一檔呼叫 progress(done, total, ticker, message)，在 writer thread 執行
+        cancel_event: threading.Event，設定後寫完目前這檔就停止，尚未開始的抓取會被取消
+        batch_size: 大於 0 時啟用批次模式：最後日期相同的股票每 batch_size 檔合併成一次請求，
+                    失敗或沒有資料的股票再用 fetcher 逐檔重抓
+        batch_fetcher: 批次抓股價的函式 batch_fetcher(tickers, start_date)，回傳 yf.download 格式的寬表，
+                       預設為 fetch_history_batch
+
+    Returns:
+        dict: 更新統計（成功/失敗數、總耗時、每檔股票的抓取與寫入時間），
+              stages 為這次更新各階段的統計（格式同 instrumentation.snapshot()）
     """
+    import pandas as pd
+    fetcher = fetcher or fetch_history
+    batch_fetcher = batch_fetcher or fetch_history_batch
     tickers = db.get_all_tickers()
-    print(f"📈 Updating {len(tickers)} stocks (fundamentals: {update_fundamentals})")
-    
+    total = len(tickers)
+    print(f"📈 Updating {total} stocks (fundamentals: {update_fundamentals}, workers: {workers}"
+          + (f", batch: {batch_size})" if batch_size > 0 else ")"))
+
     success_count = 0
     fail_count = 0
-    
-    for i, ticker in enumerate(tickers, 1):
+    timings = {}
+    cancelled = False
+    started = time.perf_counter()
+
+    # 一次查好所有股票的最後更新日期，worker 不需要開資料庫連線
+    last_dates = db.get_last_price_dates()
+
+    # 基本面需要的 CIK 對照表（可能要下載並寫入資料庫）與各檔基本面的來源也在這裡先載入，worker 只負責抓取
+    prefetched = None
+    if update_fundamentals:
         try:
-            print(f"[{i}/{len(tickers)}] 🔄 Updating {ticker}...", end=" ")
-            
-            # 取得最後更新日期
-            last_date = db.get_last_price_date(ticker)
-            
-            ticker_obj = yf.Ticker(ticker)
-            
-            # 如果有最後日期，只抓取之後的資料
-            if last_date:
-                # 從最後日期的隔天開始抓
-                from datetime import datetime, timedelta
-                start_date = (datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
-                df = ticker_obj.history(start=start_date)
-                
-                if df.empty:
-                    print("✓ Already up to date")
+            prefetched = {'cik_index': load_cik_index(), 'validators': db.get_fundamentals_validators()}
+        except Exception as e:
+            print(f"⚠️ SEC ticker index unavailable ({e}), updating prices only")
+            update_fundamentals = False
+
+    # 階段統計以一次更新為單位，另外收集
+    with instrumentation.collect() as run, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        if batch_size > 0:
+            # 依最後日期分組，同一組的起始日期相同才能合併成一次請求
+            groups = {}
+            for ticker in tickers:
+                groups.setdefault(last_dates.get(ticker), []).append(ticker)
+            futures = []
+            for last_date, group in groups.items():
+                size = batch_size
+                if update_fundamentals:
+                    # 基本面是在批次內逐檔抓取，至少切成 workers 批才不會只剩一個 thread 在抓
+                    size = max(1, min(batch_size, -(-len(group) // max(1, workers))))
+                futures += [pool.submit(_fetch_batch, group[k:k + size], last_date, update_fundamentals,
+                                        fetcher, batch_fetcher, cancel_event, prefetched)
+                            for k in range(0, len(group), size)]
+        else:
+            futures = [pool.submit(lambda *args: [_fetch_update(*args)], ticker, last_dates.get(ticker),
+                                   update_fundamentals, fetcher, cancel_event, prefetched)
+                       for ticker in tickers]
+
+        done = 0
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                for pending in futures:
+                    pending.cancel()
+                break
+
+            # 同一批的股價合併成一次寫入
+            results = future.result()
+            fetched = [result for result in results if result['status'] == 'ok']
+            written = {result['ticker'] for result in fetched}
+            write_time = 0.0
+            if fetched:
+                t0 = time.perf_counter()
+                try:
+                    db.insert_price(pd.concat([result['df'] for result in fetched], ignore_index=True))
+                    for result in fetched:
+                        for fundamentals_df, validators in result['fundamentals']:
+                            db.insert_fundamentals(fundamentals_df, validators)
+                        if update_fundamentals:
+                            result['message'] += " + fundamentals"
+                        result['message'] += " ✅"
+                except Exception as e:
+                    for result in fetched:
+                        result['status'] = 'failed'
+                        result['message'] = f"❌ Error: {e}"
+                write_time = (time.perf_counter() - t0) / len(fetched)
+
+            for result in results:
+                done += 1
+                ticker = result['ticker']
+                if result['status'] == 'failed':
+                    fail_count += 1
+                else:
                     success_count += 1
-                    continue
-                    
-                print(f"📥 {len(df)} new records", end=" ")
-            else:
-                # 沒有歷史資料，抓全部
-                df = ticker_obj.history(period="max")
-                print(f"📥 {len(df)} records (full history)", end=" ")
-            
-            if df.empty:
-                print("⚠️ No data available")
-                fail_count += 1
-                continue
 
-            # 處理資料格式
-            df = df.reset_index()
-            df['ticker'] = ticker
-
-            df = df.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume',
-                'Dividends': 'dividends',
-                'Stock Splits': 'stock_splits'
-            })
-
-            df = df[['date', 'open', 'high', 'low', 'close',
-                     'volume', 'dividends', 'stock_splits', 'ticker']]
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-            
-            # 四捨五入兩位、volume 強制整數
-            price_cols = ['open', 'high', 'low', 'close', 'dividends', 'stock_splits']
-            df[price_cols] = df[price_cols].round(2)
-            df['volume'] = df['volume'].astype(int)
+                ticker_write = write_time if ticker in written else 0.0
+                timings[ticker] = {'fetch': result['fetch_time'], 'write': ticker_write}
+                print(f"[{done}/{total}] {ticker} {result['message']} "
+                      f"(fetch {result['fetch_time']:.2f}s, write {ticker_write:.3f}s)")
+                if progress is not None:
+                    progress(done, total, ticker, result['message'])
+
+    elapsed = time.perf_counter() - started
+    stages = run.snapshot()
+    slowest = sorted(timings.items(), key=lambda item: item[1]['fetch'], reverse=True)[:5]
 
-            db.insert_price(df)
-            
-            # 選擇性更新基本面
-            if update_fundamentals:
-                print("+ updating fundamentals...", end=" ")
-                fetch_and_store_fundamentals(ticker)
-            
-            print("✅")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            fail_count += 1
-    
     print(f"\n{'='*50}")
     print(f"📊 Update Summary:")
-    print(f"   ✅ Success: {success_count}/{len(tickers)}")
-    print(f"   ❌ Failed: {fail_count}/{len(tickers)}")
+    print(f"   ✅ Success: {success_count}/{total}")
+    print(f"   ❌ Failed: {fail_count}/{total}")
+    if cancelled:
+        print(f"   ⏹️ Cancelled: {total - success_count - fail_count} not updated")
+    print(f"   ⏱️ Elapsed: {elapsed:.1f}s")
+    if slowest:
+        print(f"   🐢 Slowest: " + ", ".join(f"{t} {s['fetch']:.2f}s" for t, s in slowest))
+    for line in instrumentation.format_stages(stages):
+        print(f"   🧭 {line}")
+    counters = stages['counters']
+    print(f"   📦 Downloaded {sum(v for k, v in counters.items() if k.startswith('bytes_downloaded')) / 1e6:.1f} MB"
+          f" | rows written: price {counters.get('rows_written.price', 0)},"
+          f" fundamentals {counters.get('rows_written.fundamentals', 0)}")
     print(f"{'='*50}")
 
+    return {
+        'success': success_count,
+        'failed': fail_count,
+        'total': total,
+        'cancelled': cancelled,
+        'elapsed': elapsed,
+        'timings': timings,
+        'stages': stages,
+    }
 
-def ticker_to_cik(ticker):
-    url = "https://www.sec.gov/files/company_tickers.json"
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-    data = r.json()
-    df = pd.DataFrame(data).T
-    row = df[df["ticker"] == ticker.upper()]
-    if row.empty:
+
+# ====== SEC ticker → CIK 對照表 ======
+CIK_INDEX_PATH = "/files/company_tickers.json"
+CIK_INDEX_TTL = 7 * 24 * 3600  # 對照表每 7 天重新下載一次
+STREAM_CHUNK_BYTES = 64 * 1024  # 串流下載 companyfacts 時每次讀取的大小
+
+_cik_index = None
+_cik_index_refreshed_at = None
+_cik_index_lock = threading.Lock()
+
+
+def build_cik_index(data):
+    """把 company_tickers.json 轉成 {ticker: 10 碼 CIK}，重複的 ticker 以第一筆為準"""
+    index = {}
+    for row in data.values():
+        index.setdefault(str(row["ticker"]).upper(), str(row["cik_str"]).zfill(10))
+    return index
+
+
+def load_cik_index(force_refresh=False):
+    """
+    取得 ticker → CIK 對照表
+    先用記憶體中的版本，再來是資料庫裡的快取，超過 CIK_INDEX_TTL 才重新下載
+    """
+    import sec_client
+    global _cik_index, _cik_index_refreshed_at
+    with _cik_index_lock:
+        now = time.time()
+        if not force_refresh and _cik_index is not None and now - _cik_index_refreshed_at < CIK_INDEX_TTL:
+            return _cik_index
+
+        if not force_refresh:
+            index, refreshed_at = db.load_cik_index()
+            if index and now - refreshed_at < CIK_INDEX_TTL:
+                _cik_index, _cik_index_refreshed_at = index, refreshed_at
+                return _cik_index
+
+        client = sec_client.get_client()
+        with instrumentation.timer('fetch.cik_index'):
+            r = data_sources.get_source().sec_get(client.www(CIK_INDEX_PATH))
+            r.raise_for_status()
+            body = r.content
+        instrumentation.count('bytes_downloaded.cik_index', len(body))
+        with instrumentation.timer('parse.cik_index'):
+            index = build_cik_index(json.loads(body))
+        db.replace_cik_index(index, now)
+        _cik_index, _cik_index_refreshed_at = index, now
+        return _cik_index
+
+
+def tickers_to_ciks(tickers, index=None):
+    """
+    批次查詢 CIK，回傳 {ticker: cik}，SEC 找不到的 ticker 不會出現在結果中
+    index 為預先載入的對照表，None 時用 load_cik_index()
+    """
+    index = index if index is not None else load_cik_index()
+    result = {}
+    for ticker in tickers:
+        cik = index.get(ticker.upper())
+        if cik is not None:
+            result[ticker] = cik
+    return result
+
+
+def ticker_to_cik(ticker, index=None):
+    cik = tickers_to_ciks([ticker], index).get(ticker)
+    if cik is None:
         raise ValueError(f"{ticker} not found")
-    return str(row.iloc[0]["cik_str"]).zfill(10)
+    return cik
 
 
 # ====== 取得公司標準化財報資料 ======
-def get_company_facts(cik):
-    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
-    r = requests.get(url, headers=HEADERS)
+def _load_cached_facts(cik, tags=None):
+    """從 sec_cache 讀取並解析，沒有快取時回傳 None"""
+    with instrumentation.timer('parse.companyfacts'):
+        return _parse_cached_facts(cik, tags)
+
+
+def _parse_cached_facts(cik, tags):
+    if tags is None:
+        payload = sec_cache.load(cik)
+        return json.loads(payload) if payload is not None else None
+    source = sec_cache.open_payload(cik)
+    if source is None:
+        return None
+    with source:
+        return xbrl_stream.parse(source, tags)
+
+
+def get_company_facts(cik, tags=None):
+    """下載 companyfacts JSON（透過 sec_cache 做條件式請求），參數見 fetch_company_facts"""
+    return fetch_company_facts(cik, tags=tags)[0]
+
+
+def fetch_company_facts(cik, ingested=None, tags=None):
+    """
+    下載 companyfacts JSON，並透過 sec_cache 做條件式請求，回傳 (facts, validators)
+    validators 為這份內容的 {'etag', 'last_modified'}，寫入基本面時一起記錄
+
+    Args:
+        ingested: 呼叫端目前資料來自的 validators（db.get_fundamentals_validators()）；
+                  跟快取的相同且 SEC 回 304（之後沒有新申報）時回傳 (None, validators)，讓呼叫端跳過解析與寫入，
+                  不同時（例如同一個 CIK 的另一檔股票已更新快取、或上次寫入沒有完成）改用快取內容
+        tags: 指定時改用串流模式：回應邊下載邊寫進快取，再用 xbrl_stream 只解析這些 tag 的 10-K 資料，
+              整份 JSON 不會同時放在記憶體裡；None 時回傳完整的 JSON
+    """
+    import sec_client
+    source = data_sources.get_source()
+    url = sec_client.get_client().data(f"/api/xbrl/companyfacts/CIK{cik}.json")
+    stream = tags is not None
+    cached = sec_cache.get_meta(cik)
+    with instrumentation.timer('fetch.companyfacts'):
+        r = source.sec_get(url, headers=sec_cache.validator_headers(cached), stream=stream)
+
+    if r.status_code == 304 and cached is not None:
+        instrumentation.count('not_modified.companyfacts')
+        if ingested is not None and ingested == cached and any(cached.values()):
+            return None, cached
+        facts = _load_cached_facts(cik, tags)
+        if facts is not None:
+            return facts, cached
+        # 快取剛好被淘汰，重新完整下載
+    if r.status_code == 304:
+        with instrumentation.timer('fetch.companyfacts'):
+            r = source.sec_get(url, stream=stream)
+
     r.raise_for_status()
-    return r.json()
+    validators = {'etag': r.headers.get("ETag"), 'last_modified': r.headers.get("Last-Modified")}
+    if not stream:
+        with instrumentation.timer('fetch.companyfacts_body'):
+            body = r.content
+        instrumentation.count('bytes_downloaded.companyfacts', len(body))
+        sec_cache.store(cik, body, validators['etag'], validators['last_modified'])
+        with instrumentation.timer('parse.companyfacts'):
+            return json.loads(body), validators
+
+    # 串流模式下回應內容是邊下載邊寫進快取，這段時間算在下載
+    with instrumentation.timer('fetch.companyfacts_body'):
+        try:
+            sec_cache.store_stream(cik, _counted(r.iter_content(STREAM_CHUNK_BYTES), 'bytes_downloaded.companyfacts'),
+                                   validators['etag'], validators['last_modified'])
+        except BaseException:
+            # 下載中斷：釋放連線，不讓讀到一半的回應留在連線池
+            r.close()
+            raise
+    facts = _load_cached_facts(cik, tags)
+    if facts is None:
+        # 單一回應就超過快取上限、寫入後立即被淘汰：直接從記憶體解析
+        with instrumentation.timer('fetch.companyfacts'):
+            r = source.sec_get(url)
+            r.raise_for_status()
+            body = r.content
+        instrumentation.count('bytes_downloaded.companyfacts', len(body))
+        with instrumentation.timer('parse.companyfacts'):
+            facts = xbrl_stream.parse(io.BytesIO(body), tags)
+    return facts, validators
+
+
+def _counted(chunks, counter):
+    """邊傳遞邊累計位元組數"""
+    n = 0
+    try:
+        for chunk in chunks:
+            n += len(chunk)
+            yield chunk
+    finally:
+        instrumentation.count(counter, n)
 
 
 # ====== 從多個 GAAP tag 抓年度資料 ======
-def extract_annual_from_tags(us_gaap, tags):
-    data = {}
-    for tag in tags:
-        if tag not in us_gaap:
-            continue
-        units = us_gaap[tag].get("units", {})
-        if not units:
-            continue
-        first_unit_key = list(units.keys())[0]
-        for r in units[first_unit_key]:
-            if r.get("form") == "10-K" and "fy" in r:
-                data[r["fy"]] = r["val"]
-    return data
+# 欄位 → 候選 GAAP tag（同一年度有多個 tag 時，後面的會覆寫前面的）
+FACT_TAGS = {
+    # 損益表
+    "revenue": [
+        "SalesRevenueNet",
+        "Revenues",
+        "RevenueFromContractWithCustomerExcludingAssessedTax",
+        "Revenue",
+    ],
+    "cogs": [
+        "CostOfRevenue",
+        "CostOfGoodsAndServicesSold",
+        "CostOfRevenueIncludingSpecialItems",
+    ],
+    "operating_income": ["OperatingIncomeLoss"],
+    "net_income": ["NetIncomeLoss"],
+    "shares": [
+        "WeightedAverageNumberOfDilutedSharesOutstanding",
+        "WeightedAverageNumberOfSharesOutstandingDiluted",
+    ],
+    # 現金流量表
+    "operating_cash_flow": [
+        "NetCashProvidedByUsedInOperatingActivities",
+        "CashProvidedByUsedInOperatingActivities",
+    ],
+    "investing_cash_flow": [
+        "NetCashProvidedByUsedInInvestingActivities",
+        "CashProvidedByUsedInInvestingActivities",
+    ],
+    "financing_cash_flow": [
+        "NetCashProvidedByUsedInFinancingActivities",
+        "CashProvidedByUsedInFinancingActivities",
+    ],
+    "capex": [
+        "PaymentsToAcquirePropertyPlantAndEquipment",
+        "CapitalExpendituresIncurredButNotYetPaid",
+    ],
+    # 資產負債表
+    "total_assets": ["Assets"],
+    "total_liabilities": [
+        "Liabilities",
+        "LiabilitiesAndStockholdersEquity",
+    ],
+    "current_liabilities": [
+        "LiabilitiesCurrent",
+        "CurrentLiabilities",
+    ],
+    "long_term_debt": [
+        "LongTermDebtNoncurrent",
+        "LongTermDebt",
+    ],
+    "stockholders_equity": [
+        "StockholdersEquity",
+        "ShareholdersEquity",
+    ],
+}
+
+
+FIELD_INDEX = {field: j for j, field in enumerate(FACT_TAGS)}
+
+
+def extract_annual_facts(us_gaap):
+    """
+    依 FACT_TAGS 一次掃過需要的 tag（只看第一個 unit 的 10-K 資料），填進 年度 × 欄位 陣列
+    回傳 (years, values)：years 依營收第一次出現的順序；values 為 float 陣列，沒有資料的位置為 NaN
+    """
+    import numpy as np
+    found = []
+    for tags in FACT_TAGS.values():
+        data = {}
+        for tag in tags:
+            units = us_gaap.get(tag, {}).get("units")
+            if not units:
+                continue
+            for r in next(iter(units.values())):
+                if r.get("form") == "10-K" and "fy" in r:
+                    data[r["fy"]] = r["val"]
+        found.append(data)
+
+    years = list(found[0])  # revenue
+    row_of = {year: i for i, year in enumerate(years)}
+    values = np.full((len(years), len(found)), np.nan)
+    for j, data in enumerate(found):
+        for year, val in data.items():
+            i = row_of.get(year)
+            if i is not None:
+                values[i, j] = val
+    return years, values
+
+
+def _ratio(numerator, denominator, mask):
+    """mask 成立且分母不為 0 時才計算，其他年度為 0"""
+    import numpy as np
+    out = np.zeros(len(numerator))
+    ok = mask & (denominator != 0)
+    out[ok] = numerator[ok] / denominator[ok]
+    return out
+
+
+# 串流解析時需要保留的 tag
+FACT_TAG_NAMES = {tag for tags in FACT_TAGS.values() for tag in tags}
+
+
+def build_fundamentals(ticker, us_gaap):
+    """把 companyfacts 的 us-gaap（或 ifrs-full）整理成 fundamentals_annual 格式，沒有營收時回傳 None"""
+    with instrumentation.timer('transform.fundamentals'):
+        return _build_fundamentals(ticker, us_gaap)
+
+
+def _build_fundamentals(ticker, us_gaap):
+    import numpy as np
+    import pandas as pd
+    years, values = extract_annual_facts(us_gaap)
+    if not years:
+        return None
+
+    col = dict(zip(FACT_TAGS, values.T))
+    has = {field: ~np.isnan(v) for field, v in col.items()}
+    revenue = col["revenue"]
+
+    # 計算衍生指標（毛利率 / 營業利益率 / 淨利率 / EPS / 負債比率）
+    derived = {
+        "gross_margin": _ratio(revenue - col["cogs"], revenue, has["cogs"]),
+        "operating_margin": _ratio(col["operating_income"], revenue, has["operating_income"]),
+        "net_margin": _ratio(col["net_income"], revenue, has["net_income"]),
+        "eps": _ratio(col["net_income"], col["shares"], has["net_income"] & has["shares"]),
+        "debt_to_asset_ratio": _ratio(col["total_liabilities"], col["total_assets"],
+                                      has["total_liabilities"] & has["total_assets"]),
+    }
+    # 自由現金流 = 營運現金流 - 資本支出（只有營運現金流的年度才計算）
+    free_cash_flow = np.where(has["operating_cash_flow"],
+                              col["operating_cash_flow"] - np.abs(np.nan_to_num(col["capex"])), 0)
+
+    # 金額欄位沒有資料時為 0，小數無條件捨去（同 int()）；比率四捨五入到小數 4 位
+    amounts = np.trunc(np.nan_to_num(values)).astype("int64")
+    columns = {"ticker": ticker, "year": np.array(years, dtype="int64")}
+    for name in db.FUNDAMENTAL_COLUMNS[2:]:
+        if name in derived:
+            columns[name] = np.round(derived[name], 4)
+        elif name == "free_cash_flow":
+            columns[name] = np.trunc(free_cash_flow).astype("int64")
+        else:
+            columns[name] = amounts[:, FIELD_INDEX[name]]
+    return pd.DataFrame(columns, copy=False)
 
 
 # ====== 抓歷史年度基本面並存資料庫 ======
-def fetch_and_store_fundamentals(ticker):
+def fetch_and_store_fundamentals(ticker, store=None, cik_index=None, validators=None):
+    """
+    Args:
+        store: 寫入函式 store(df, validators)，預設為 db.insert_fundamentals；
+               並行更新時由 worker 收集結果，交給 writer 寫入
+        cik_index: 預先載入的 ticker → CIK 對照表，None 時用 load_cik_index()
+        validators: 預先載入的 db.get_fundamentals_validators()，None 時查詢資料庫；
+                    worker 呼叫時兩者都要由 writer 先查好，worker 才不會碰資料庫
+    """
+    import requests
+    store = store or db.insert_fundamentals
     try:
-        cik = ticker_to_cik(ticker)
-        facts = get_company_facts(cik)
+        cik = ticker_to_cik(ticker, cik_index)
+        ingested = validators.get(ticker) if validators is not None else db.get_fundamentals_validators(ticker)
+        # 這檔的基本面已經來自快取的版本、且 SEC 回 304（沒有新申報）時才跳過解析
+        facts, source_validators = fetch_company_facts(cik, ingested=ingested, tags=FACT_TAG_NAMES)
+        if facts is None:
+            print(f"✓ {ticker} fundamentals unchanged")
+            return True
 
         # ⭐ 修正：檢查是否有 us-gaap 資料
         if "facts" not in facts:
@@ -184,123 +743,23 @@ def fetch_and_store_fundamentals(ticker):
             us_gaap = facts["facts"]["ifrs-full"]
             print(f"ℹ️  {ticker}: Using IFRS standards instead of US-GAAP")
         else:
-            # 列出可用的會計標準
+            # 列出可用的會計標準（串流解析只保留 us-gaap / ifrs-full，此時清單為空）
             available_standards = list(facts["facts"].keys())
-            print(f"⚠️  {ticker}: No us-gaap or ifrs-full found. Available: {available_standards}")
+            print(f"⚠️  {ticker}: No us-gaap or ifrs-full found."
+                  + (f" Available: {available_standards}" if available_standards else ""))
             return True  # 回傳 True 讓股票仍可新增
 
-        # 抓年度資料 - 損益表
-        revenue = extract_annual_from_tags(us_gaap, [
-            "SalesRevenueNet",
-            "Revenues",
-            "RevenueFromContractWithCustomerExcludingAssessedTax",
-            "Revenue"
-        ])
-
-        if not revenue:
+        df = build_fundamentals(ticker, us_gaap)
+        if df is None:
             print(f"⚠️  {ticker}: No revenue data found")
             return True
 
-        cogs = extract_annual_from_tags(us_gaap, [
-            "CostOfRevenue",
-            "CostOfGoodsAndServicesSold",
-            "CostOfRevenueIncludingSpecialItems"
-        ])
-        operating_income = extract_annual_from_tags(us_gaap, ["OperatingIncomeLoss"])
-        net_income = extract_annual_from_tags(us_gaap, ["NetIncomeLoss"])
-        shares = extract_annual_from_tags(us_gaap, [
-            "WeightedAverageNumberOfDilutedSharesOutstanding",
-            "WeightedAverageNumberOfSharesOutstandingDiluted"
-        ])
-
-        # 抓年度資料 - 現金流量表
-        operating_cash_flow = extract_annual_from_tags(us_gaap, [
-            "NetCashProvidedByUsedInOperatingActivities",
-            "CashProvidedByUsedInOperatingActivities"
-        ])
-        investing_cash_flow = extract_annual_from_tags(us_gaap, [
-            "NetCashProvidedByUsedInInvestingActivities",
-            "CashProvidedByUsedInInvestingActivities"
-        ])
-        financing_cash_flow = extract_annual_from_tags(us_gaap, [
-            "NetCashProvidedByUsedInFinancingActivities",
-            "CashProvidedByUsedInFinancingActivities"
-        ])
-        capex = extract_annual_from_tags(us_gaap, [
-            "PaymentsToAcquirePropertyPlantAndEquipment",
-            "CapitalExpendituresIncurredButNotYetPaid"
-        ])
-
-        # 抓年度資料 - 資產負債表
-        total_assets = extract_annual_from_tags(us_gaap, ["Assets"])
-        total_liabilities = extract_annual_from_tags(us_gaap, [
-            "Liabilities",
-            "LiabilitiesAndStockholdersEquity"
-        ])
-        current_liabilities = extract_annual_from_tags(us_gaap, [
-            "LiabilitiesCurrent",
-            "CurrentLiabilities"
-        ])
-        long_term_debt = extract_annual_from_tags(us_gaap, [
-            "LongTermDebtNoncurrent",
-            "LongTermDebt"
-        ])
-        stockholders_equity = extract_annual_from_tags(us_gaap, [
-            "StockholdersEquity",
-            "ShareholdersEquity"
-        ])
-
-        # 計算衍生指標
-        eps = {year: net_income[year] / shares[year] 
-               for year in net_income if year in shares and shares[year] != 0}
-
-        # 毛利率 / 營業利益率 / 淨利率
-        gross_margin = {year: (revenue[year] - cogs[year]) / revenue[year]
-                        for year in revenue if year in cogs and revenue[year] != 0}
-        operating_margin = {year: operating_income[year] / revenue[year]
-                            for year in revenue if year in operating_income and revenue[year] != 0}
-        net_margin = {year: net_income[year] / revenue[year]
-                      for year in revenue if year in net_income and revenue[year] != 0}
-
-        # 自由現金流 = 營運現金流 - 資本支出
-        free_cash_flow = {year: operating_cash_flow.get(year, 0) - abs(capex.get(year, 0))
-                          for year in operating_cash_flow}
-
-        # 負債比率
-        debt_to_asset_ratio = {year: total_liabilities[year] / total_assets[year]
-                               for year in total_assets if year in total_liabilities and total_assets[year] != 0}
-
-        # 整理 DataFrame
-        df = pd.DataFrame({
-            "ticker": ticker,
-            "year": [int(y) for y in revenue.keys()],
-            "revenue": [int(revenue[y]) for y in revenue],
-            "cogs": [int(cogs.get(y, 0)) for y in revenue],
-            "gross_margin": [round(float(gross_margin.get(y, 0)), 4) for y in revenue],
-            "operating_income": [int(operating_income.get(y, 0)) for y in revenue],
-            "operating_margin": [round(float(operating_margin.get(y, 0)), 4) for y in revenue],
-            "net_income": [int(net_income.get(y, 0)) for y in revenue],
-            "net_margin": [round(float(net_margin.get(y, 0)), 4) for y in revenue],
-            "shares": [int(shares.get(y, 0)) for y in revenue],
-            "eps": [round(float(eps.get(y, 0)), 4) for y in revenue],
-            "operating_cash_flow": [int(operating_cash_flow.get(y, 0)) for y in revenue],
-            "investing_cash_flow": [int(investing_cash_flow.get(y, 0)) for y in revenue],
-            "financing_cash_flow": [int(financing_cash_flow.get(y, 0)) for y in revenue],
-            "free_cash_flow": [int(free_cash_flow.get(y, 0)) for y in revenue],
-            "total_assets": [int(total_assets.get(y, 0)) for y in revenue],
-            "total_liabilities": [int(total_liabilities.get(y, 0)) for y in revenue],
-            "current_liabilities": [int(current_liabilities.get(y, 0)) for y in revenue],
-            "long_term_debt": [int(long_term_debt.get(y, 0)) for y in revenue],
-            "stockholders_equity": [int(stockholders_equity.get(y, 0)) for y in revenue],
-            "debt_to_asset_ratio": [round(float(debt_to_asset_ratio.get(y, 0)), 4) for y in revenue],
-        })
-
         if df.empty:
             print(f"⚠️  {ticker}: No valid fundamental data")
             return True
 
         # 存入資料庫
-        db.insert_fundamentals(df)
+        store(df, source_validators)
         print(f"✅ {ticker} fundamentals stored ({len(df)} years)")
         return True
 
@@ -0,0 +1,280 @@
+"""
+批次技術指標引擎
+
+從 price_bars 讀出多檔股票，排成 交易日 × 股票 的矩陣，用 NumPy 一次算完所有股票的
+SMA / EMA / RSI / MACD / 布林通道 / ATR，再寫入 indicator_daily，畫圖與篩選時直接讀取。
+
+enable() 之後每次寫入股價只會更新新增的尾端（EMA、RSI、ATR 的延續值存在 indicator_state），
+覆寫到已計算過的日期時才整檔重算。
+
+用法：
+    python indicators.py            # 重算全部股票
+    python indicators.py AAPL MSFT  # 只算指定股票
+"""
+import sys
+import time
+
+import numpy as np
+
+import database as db
+
+# 一次放進矩陣的股票數，控制記憶體用量（日期數 × 股票數 × 每個指標 8 bytes）
+CHUNK_TICKERS = 200
+
+SMA_WINDOWS = (20, 50, 60, 200)
+BOLLINGER_WINDOW = 20
+BOLLINGER_K = 2.0
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+
+
+# ========== 向量化指標（矩陣形狀為 (交易日, 股票)，沒有資料的位置為 NaN）==========
+
+def sma(x, n):
+    """簡單移動平均，視窗內必須每天都有值"""
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    ccount = np.cumsum(valid, axis=0)
+    csum = np.vstack([np.zeros((1, x.shape[1])), csum])
+    ccount = np.vstack([np.zeros((1, x.shape[1]), dtype=ccount.dtype), ccount])
+
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        window_sum = csum[n:] - csum[:-n]
+        window_count = ccount[n:] - ccount[:-n]
+        out[n - 1:] = np.where(window_count == n, window_sum / n, np.nan)
+    return out
+
+
+def rolling_std(x, n):
+    """移動標準差（母體標準差，布林通道慣用），先減去各股平均值降低數值誤差"""
+    center = np.nanmean(x, axis=0) if len(x) else np.zeros(x.shape[1])
+    shifted = x - np.nan_to_num(center)
+    mean = sma(shifted, n)
+    mean_sq = sma(shifted ** 2, n)
+    return np.sqrt(np.maximum(mean_sq - mean ** 2, 0.0))
+
+
+def ema(x, n, state=None):
+    """
+    指數移動平均（同 pandas ewm(span=n, adjust=False)），以各股第一筆資料為起點
+    state 為上一段最後的 EMA 值（增量計算用），回傳 (結果, 最後的 EMA 值)
+    """
+    alpha = 2.0 / (n + 1)
+    out = np.full(x.shape, np.nan)
+    state = np.full(x.shape[1], np.nan) if state is None else np.array(state, dtype=float)
+    for t in range(len(x)):
+        row = x[t]
+        state = np.where(np.isnan(state), row,
+                         np.where(np.isnan(row), state, alpha * row + (1 - alpha) * state))
+        out[t] = state
+    return out, state
+
+
+def wilder(x, n, state=None):
+    """
+    Wilder 平滑（RSI、ATR 用）：前 n 筆取平均作為起點，之後 avg = (avg * (n-1) + x) / n
+    state 為 (avg, 起點前的累加和, 已處理筆數)，回傳 (結果, 新的 state)
+    """
+    out = np.full(x.shape, np.nan)
+    if state is None:
+        avg = np.full(x.shape[1], np.nan)
+        total = np.zeros(x.shape[1])
+        count = np.zeros(x.shape[1])
+    else:
+        avg, total, count = (np.array(v, dtype=float) for v in state)
+    for t in range(len(x)):
+        row = x[t]
+        valid = ~np.isnan(row)
+        count += valid
+        total = np.where(valid & (count <= n), total + np.nan_to_num(row), total)
+        avg = np.where(valid & (count == n), total / n, avg)
+        avg = np.where(valid & (count > n), (avg * (n - 1) + row) / n, avg)
+        out[t] = np.where(count >= n, avg, np.nan)
+    return out, (avg, total, count)
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.where((avg_loss == 0) & ~np.isnan(avg_gain), 100.0, out)
+
+
+def compute(close, high, low, state=None, skip=0):
+    """
+    輸入 (交易日, 股票) 矩陣，回傳 ({指標欄位: 矩陣}, 最後的狀態)
+
+    增量計算時前 skip 列是已經算過的最後幾筆收盤價（只給移動視窗與前一日收盤使用），
+    state 為 {狀態欄位: 陣列}（INDICATOR_STATE_COLUMNS），結果只包含 skip 之後的列
+    """
+    state = state or {}
+    result = {f'sma{n}': sma(close, n)[skip:] for n in SMA_WINDOWS}
+    std = rolling_std(close, BOLLINGER_WINDOW)[skip:]
+    result['bb_upper'] = result[f'sma{BOLLINGER_WINDOW}'] + BOLLINGER_K * std
+    result['bb_lower'] = result[f'sma{BOLLINGER_WINDOW}'] - BOLLINGER_K * std
+
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[1:] = close[:-1]
+    delta = (close - prev_close)[skip:]
+    # fmax 會忽略 NaN：第一天沒有前一日收盤，TR = high - low
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))[skip:]
+    new_close = close[skip:]
+
+    new_state = {}
+    result['ema12'], new_state['ema12'] = ema(new_close, 12, state.get('ema12'))
+    result['ema26'], new_state['ema26'] = ema(new_close, 26, state.get('ema26'))
+    result['macd'] = result['ema12'] - result['ema26']
+    result['macd_signal'], new_state['macd_signal'] = ema(result['macd'], 9, state.get('macd_signal'))
+    result['macd_hist'] = result['macd'] - result['macd_signal']
+
+    gain_state = loss_state = atr_state = None
+    if state:
+        gain_state = (state['rsi_gain'], state['rsi_gain_total'], state['rsi_count'])
+        loss_state = (state['rsi_loss'], state['rsi_loss_total'], state['rsi_count'])
+        atr_state = (state['atr'], state['atr_total'], state['atr_count'])
+
+    gain = np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0))
+    loss = np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0))
+    avg_gain, (new_state['rsi_gain'], new_state['rsi_gain_total'], new_state['rsi_count']) = \
+        wilder(gain, RSI_WINDOW, gain_state)
+    avg_loss, (new_state['rsi_loss'], new_state['rsi_loss_total'], _) = wilder(loss, RSI_WINDOW, loss_state)
+    result['rsi14'] = _rsi_from_averages(avg_gain, avg_loss)
+    result['atr14'], (new_state['atr'], new_state['atr_total'], new_state['atr_count']) = \
+        wilder(tr, ATR_WINDOW, atr_state)
+    return result, new_state
+
+
+# ========== 矩陣建立與寫入 ==========
+
+def build_matrix(prices, ticker_ids, align='end'):
+    """
+    把 select_price_arrays 的結果排成 交易日 × 股票 矩陣
+    每檔股票依自己的交易日排成一欄，不會把缺少的日子補值算進視窗，指標跟逐檔計算的結果完全相同
+    align='end'：靠最後一列對齊（完整歷史，較晚上市的股票上方為 NaN）
+    align='start'：靠第一列對齊（增量計算的新資料，接在上一段狀態之後）
+    回傳 ({欄位: 矩陣}, row, col)，row/col 為 prices 每一筆在矩陣中的位置
+    """
+    col = np.searchsorted(ticker_ids, prices['ticker_id'])
+    counts = np.bincount(col, minlength=len(ticker_ids))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    length = counts.max()
+    row = np.arange(len(col)) - starts[col]
+    if align == 'end':
+        row += length - counts[col]
+
+    matrices = {}
+    for name in ('close', 'high', 'low'):
+        if name in prices:
+            matrix = np.full((length, len(ticker_ids)), np.nan)
+            matrix[row, col] = prices[name]
+            matrices[name] = matrix
+    return matrices, row, col
+
+
+def _save(prices, ticker_ids, row, col, result, state):
+    """寫入指標與每檔股票最後一天的狀態"""
+    db.upsert_indicators(prices['ticker_id'], prices['day'],
+                         {name: matrix[row, col] for name, matrix in result.items()})
+    last = np.append(prices['ticker_id'][1:] != prices['ticker_id'][:-1], True)
+    cols = col[last]
+    db.upsert_indicator_state(ticker_ids[cols], prices['day'][last],
+                              {name: values[cols] for name, values in state.items()})
+
+
+def compute_all(tickers=None, chunk_size=CHUNK_TICKERS, verbose=True):
+    """重算指定股票（None 為全部）的技術指標並寫入 indicator_daily，回傳寫入筆數"""
+    id_map = db.get_ticker_ids(tickers)
+    all_ids = np.array(sorted(id_map.values()), dtype='int64')
+
+    started = time.perf_counter()
+    written = 0
+    for start in range(0, len(all_ids), chunk_size):
+        ticker_ids = all_ids[start:start + chunk_size]
+        prices = db.select_price_arrays(ticker_ids, ('high', 'low', 'close'))
+        if len(prices['day']) == 0:
+            continue
+        matrices, row, col = build_matrix(prices, ticker_ids)
+        result, state = compute(matrices['close'], matrices['high'], matrices['low'])
+        _save(prices, ticker_ids, row, col, result, state)
+        written += len(row)
+        if verbose:
+            print(f"📐 Indicators {min(start + chunk_size, len(all_ids))}/{len(all_ids)} tickers")
+
+    if verbose:
+        elapsed = time.perf_counter() - started
+        print(f"✅ {written} indicator rows for {len(all_ids)} tickers in {elapsed:.1f}s")
+    return written
+
+
+# ========== 增量更新 ==========
+
+# 增量計算需要往前讀的收盤價筆數（最長的移動視窗少一筆，另外也提供前一日收盤）
+HISTORY_ROWS = max(SMA_WINDOWS + (BOLLINGER_WINDOW,)) - 1
+
+
+def update_tail(states):
+    """
+    只計算上次狀態之後的新資料，每檔股票的成本只跟新資料筆數（加上固定的視窗長度）有關
+    states: db.select_indicator_state 的結果，回傳寫入筆數
+    """
+    if not states:
+        return 0
+    ticker_ids = np.array(sorted(states), dtype='int64')
+    last_days = np.array([states[t]['day'] for t in ticker_ids], dtype='int64')
+    prices = db.select_price_arrays(ticker_ids, ('high', 'low', 'close'), start_day=last_days.min() + 1)
+    keep = prices['day'] > last_days[np.searchsorted(ticker_ids, prices['ticker_id'])]
+    prices = {name: values[keep] for name, values in prices.items()}
+    if len(prices['day']) == 0:
+        return 0
+
+    # 只處理有新資料的股票
+    ticker_ids = np.unique(prices['ticker_id'])
+    history = np.full((HISTORY_ROWS, len(ticker_ids)), np.nan)
+    for i, ticker_id in enumerate(ticker_ids):
+        closes = db.select_price_tail(ticker_id, states[ticker_id]['day'], HISTORY_ROWS)['close']
+        history[HISTORY_ROWS - len(closes):, i] = closes
+
+    matrices, row, col = build_matrix(prices, ticker_ids, align='start')
+    padding = np.full(history.shape, np.nan)
+    state = {name: np.array([states[t][name] for t in ticker_ids], dtype=float)
+             for name in db.INDICATOR_STATE_COLUMNS}
+    result, state = compute(np.vstack([history, matrices['close']]),
+                            np.vstack([padding, matrices['high']]),
+                            np.vstack([padding, matrices['low']]),
+                            state=state, skip=HISTORY_ROWS)
+    _save(prices, ticker_ids, row, col, result, state)
+    return len(row)
+
+
+def update_ticker(ticker, first_day):
+    """
+    股價寫入後更新單一股票的指標
+    first_day 為這次寫入最早的日期（天數），都在上次狀態之後時只算尾端，有覆寫舊日期時整檔重算
+    """
+    ticker_id = db.get_ticker_ids([ticker]).get(ticker)
+    if ticker_id is None:
+        return 0
+    state = db.select_indicator_state([ticker_id]).get(ticker_id)
+    if state is None or first_day <= state['day']:
+        return compute_all([ticker], verbose=False)
+    return update_tail({ticker_id: state})
+
+
+def enable():
+    """每次 db.insert_price 後自動更新對應股票的指標"""
+    db.add_write_listener(_on_write)
+
+
+def disable():
+    db.remove_write_listener(_on_write)
+
+
+def _on_write(event, ticker, data):
+    # 刪除股票時 delete_ticker 已一併刪除指標與狀態
+    if event == 'price' and len(data):
+        update_ticker(ticker, int(db._to_day_numbers(data['date']).min()))
+
+
+if __name__ == "__main__":
+    db.create_table()
+    compute_all(sys.argv[1:] or None)
@@ -0,0 +1,235 @@
+"""
+下載流程的分段計時與計數
+
+download_data 與 database 在抓取（fetch）、解析（parse）、整理（transform）、寫入（write）四個階段
+用 timer() 記錄耗時，用 count() 累計下載的位元組數與寫入的列數，可以看出時間花在 HTTP、JSON 解析、
+pandas 還是 SQLite。階段名稱為「階段.項目」，例如 fetch.companyfacts、write.price。
+
+每次計時只有兩次 perf_counter 與每份統計一次加鎖，相對於動輒數毫秒的網路與資料庫操作可以忽略，預設開啟
+（額外負擔見 benchmarks/bench_instrumentation.py）；disable() 後 timer() 與 count() 不做任何事。
+
+統計分兩層：模組層級的統計累計整個行程（reset() 清除），collect() 則另外收集一段期間的統計，
+例如 update_all_ticker 用它回傳單次更新的摘要，不受同一行程中其他操作影響。
+
+snapshot() 回傳每個階段的呼叫次數、總耗時、p50 / p95 / max 與所有計數，
+可用 export_json() 存成 JSON，或用 export_prometheus() 寫成 node_exporter textfile collector 的格式：
+    python cli.py --metrics-prom /var/lib/node_exporter/textfile/usstock.prom update
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 每個階段只保留最近這麼多筆耗時計算 p50 / p95（次數與總耗時仍是全部的）
+STAGE_SAMPLES = 10000
+
+PROMETHEUS_PREFIX = "usstock"
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class StageMetrics:
+    """執行緒安全的階段耗時與計數統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self._calls = {}
+            self._totals = {}
+            self._counters = {}
+            self._started = time.time()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=STAGE_SAMPLES)
+                self._calls[stage] = 0
+                self._totals[stage] = 0.0
+            samples.append(seconds)
+            self._calls[stage] += 1
+            self._totals[stage] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            ms = lambda v: None if v is None else round(v * 1000, 3)
+            stages = {}
+            for stage in sorted(self._samples):
+                samples = sorted(self._samples[stage])
+                stages[stage] = {
+                    'calls': self._calls[stage],
+                    'total_s': round(self._totals[stage], 4),
+                    'p50_ms': ms(_percentile(samples, 0.50)),
+                    'p95_ms': ms(_percentile(samples, 0.95)),
+                    'max_ms': ms(samples[-1] if samples else None),
+                }
+            return {
+                'started': round(self._started, 3),
+                'elapsed_s': round(time.time() - self._started, 3),
+                'stages': stages,
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+
+class _Timer:
+    __slots__ = ('stage', 't0')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # 失敗的呼叫也計入，逾時等錯誤同樣是花掉的時間
+        seconds = time.perf_counter() - self.t0
+        for metrics in _collectors:
+            metrics.record(self.stage, seconds)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_metrics = StageMetrics()
+# 目前接收記錄的統計；collect() 進出時整個換掉，記錄端不需要加鎖就能走訪
+_collectors = (_metrics,)
+_collectors_lock = threading.Lock()
+_null_timer = _NullTimer()
+_enabled = True
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def timer(stage):
+    """with instrumentation.timer('fetch.price'): ... 記錄區塊的耗時"""
+    return _Timer(stage) if _enabled else _null_timer
+
+
+def count(name, n=1):
+    """累計計數，例如 count('bytes_downloaded', len(body))"""
+    if _enabled:
+        for metrics in _collectors:
+            metrics.count(name, n)
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    with instrumentation.collect() as run: ... 期間的記錄另外收集到 run（StageMetrics），
+    結束後用 run.snapshot() 取得這段期間的統計；模組層級的統計照常累計
+    """
+    global _collectors
+    run = StageMetrics()
+    with _collectors_lock:
+        _collectors = _collectors + (run,)
+    try:
+        yield run
+    finally:
+        with _collectors_lock:
+            _collectors = tuple(m for m in _collectors if m is not run)
+
+
+def reset():
+    """清除模組層級的統計"""
+    _metrics.reset()
+
+
+def snapshot():
+    """模組層級（整個行程）的統計"""
+    return _metrics.snapshot()
+
+
+def format_stages(snap):
+    """把 snapshot 的階段整理成摘要文字，每個階段一行"""
+    return [f"{stage:<24} {s['calls']:6d} calls | total {s['total_s']:8.2f}s | "
+            f"p50 {s['p50_ms']:9.2f} ms | p95 {s['p95_ms']:9.2f} ms"
+            for stage, s in snap['stages'].items()]
+
+
+def _write_atomic(path, text):
+    """先寫暫存檔再改名，讀取端（例如 node_exporter）不會讀到寫一半的檔案"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export_json(path, snap=None):
+    snap = snap if snap is not None else snapshot()
+    _write_atomic(path, json.dumps(snap, indent=2, ensure_ascii=False) + "\n")
+
+
+def _split_name(name):
+    """'fetch.companyfacts' → ('fetch', 'companyfacts')，沒有項目時為空字串"""
+    base, _, item = name.partition('.')
+    return base, item
+
+
+def to_prometheus(snap, prefix=PROMETHEUS_PREFIX):
+    """
+    轉成 Prometheus 文字格式：
+      <prefix>_stage_seconds{stage, item, quantile}  summary（p50 / p95，以及 _sum / _count）
+      <prefix>_<計數名稱>_total{item}                 每個計數一個 counter
+      <prefix>_run_start_timestamp_seconds、<prefix>_run_duration_seconds
+    """
+    lines = [f"# HELP {prefix}_stage_seconds Duration of ingestion stages.",
+             f"# TYPE {prefix}_stage_seconds summary"]
+    for name, s in snap['stages'].items():
+        stage, item = _split_name(name)
+        labels = f'stage="{stage}",item="{item}"'
+        for quantile, key in (("0.5", 'p50_ms'), ("0.95", 'p95_ms')):
+            lines.append(f'{prefix}_stage_seconds{{{labels},quantile="{quantile}"}} {s[key] / 1000:.6f}')
+        lines.append(f"{prefix}_stage_seconds_sum{{{labels}}} {s['total_s']:.6f}")
+        lines.append(f"{prefix}_stage_seconds_count{{{labels}}} {s['calls']}")
+
+    counters = {}
+    for name, value in snap['counters'].items():
+        base, item = _split_name(name)
+        counters.setdefault(base, []).append((item, value))
+    for base, items in counters.items():
+        metric = f"{prefix}_{base}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for item, value in items:
+            lines.append(f'{metric}{{item="{item}"}} {value}')
+
+    lines += [f"# TYPE {prefix}_run_start_timestamp_seconds gauge",
+              f"{prefix}_run_start_timestamp_seconds {snap['started']}",
+              f"# TYPE {prefix}_run_duration_seconds gauge",
+              f"{prefix}_run_duration_seconds {snap['elapsed_s']}"]
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path, snap=None, prefix=PROMETHEUS_PREFIX):
+    snap = snap if snap is not None else snapshot()
+    _write_atomic(path, to_prometheus(snap, prefix))
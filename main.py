@@ -1,10 +1,105 @@
 import tkinter as tk
+import queue
+import threading
+import time
 import download_data as download
 import database as db
-from tkinter import messagebox
+import columnar_store
+import indicators
+import screener
+from tkinter import messagebox, ttk
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# matplotlib 與 charting 在第一次開啟圖表時才載入，主畫面開得比較快
+
+
+class VirtualTickerList(tk.Frame):
+    """
+    虛擬化的股票清單：只建立畫面看得到的列，捲動時重複使用同一批元件，
+    股票數量再多，開啟時間與記憶體用量都固定
+
+    Args:
+        items: [(ticker, 分類文字), ...]
+        actions: [(按鈕文字, 寬度, callback(ticker), 其他 Button 參數), ...]
+    """
+    ROW_HEIGHT = 52
+
+    def __init__(self, parent, items, actions):
+        super().__init__(parent)
+        self.items = items
+        self.actions = actions
+        self.offset = 0
+        self.rows = []
+
+        self.body = tk.Frame(self)
+        self.body.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.body.bind("<Configure>", lambda e: self._render())
+        self._bind_wheel(self.body)
+
+    @property
+    def visible_count(self):
+        return max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll(1))
+
+    def _make_row(self, slot):
+        frame = tk.Frame(self.body, relief=tk.RIDGE, borderwidth=1)
+        info_frame = tk.Frame(frame)
+        info_frame.pack(side=tk.LEFT, padx=10, pady=5)
+        name_label = tk.Label(info_frame, font=("Arial", 11, "bold"), width=10, anchor=tk.W)
+        name_label.pack(anchor=tk.W)
+        cat_label = tk.Label(info_frame, font=("Arial", 8), fg="gray", width=20, anchor=tk.W)
+        cat_label.pack(anchor=tk.W)
+
+        for text, width, callback, options in self.actions:
+            tk.Button(frame, text=text, width=width,
+                      command=lambda cb=callback, s=slot: cb(self.items[self.offset + s][0]),
+                      **options).pack(side=tk.LEFT, padx=5)
+
+        for widget in (frame, info_frame, name_label, cat_label, *frame.winfo_children()):
+            self._bind_wheel(widget)
+        return frame, name_label, cat_label
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.offset = int(float(value) * len(self.items))
+        elif action == "scroll":
+            step = self.visible_count if unit == "pages" else 1
+            self.offset += int(value) * step
+        self._render()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self._render()
+
+    def _render(self):
+        """依目前的 offset 把資料填進可見的列，不足的列才新建"""
+        visible = self.visible_count
+        total = len(self.items)
+        self.offset = max(0, min(self.offset, total - visible))
+
+        while len(self.rows) < min(visible, total):
+            self.rows.append(self._make_row(len(self.rows)))
+
+        for slot, (frame, name_label, cat_label) in enumerate(self.rows):
+            index = self.offset + slot
+            if slot < visible and index < total:
+                ticker, categories = self.items[index]
+                name_label.config(text=ticker)
+                cat_label.config(text=f"[{categories}]")
+                frame.place(x=5, y=slot * self.ROW_HEIGHT, relwidth=1, width=-10, height=self.ROW_HEIGHT - 4)
+            else:
+                frame.place_forget()
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
 
 
 class StockApp:
@@ -15,8 +110,11 @@ class StockApp:
 
         self.frame_stack = []
         self.current_frame = None
+        self.update_thread = None
 
         db.create_table()
+        columnar_store.enable()  # 有安裝 pyarrow 時同步維護欄位式股價鏡像
+        indicators.enable()  # 寫入股價後增量更新技術指標
         self.show_main_page()
 
     def show_frame(self, new_frame):
@@ -62,14 +160,90 @@ class StockApp:
                   command=self.show_category_selection_page).pack(pady=10)
         tk.Button(center_frame, text="管理分類", width=15, height=2,
                   command=self.show_category_management_page).pack(pady=10)
+        tk.Button(center_frame, text="篩選股票", width=15, height=2,
+                  command=self.show_screener_page).pack(pady=10)
         tk.Button(center_frame, text="快速更新股價", width=15, height=2, bg="lightblue",
-                  command=lambda: download.update_all_ticker(update_fundamentals=False)).pack(pady=10)
+                  command=lambda: self.start_update(update_fundamentals=False)).pack(pady=10)
         tk.Button(center_frame, text="完整更新（含基本面）", width=15, height=2, bg="lightgreen",
-                  command=lambda: download.update_all_ticker(update_fundamentals=True)).pack(pady=5)
+                  command=lambda: self.start_update(update_fundamentals=True)).pack(pady=5)
 
         main_frame.pack(fill=tk.BOTH, expand=True)
         self.current_frame = main_frame
 
+    # ===== 背景更新（進度條、速度、取消）=====
+    def start_update(self, update_fundamentals=False):
+        """在背景 thread 執行 update_all_ticker，透過 queue 回報進度，視窗不會卡住"""
+        if self.update_thread and self.update_thread.is_alive():
+            messagebox.showinfo("更新中", "已有更新正在進行")
+            return
+
+        progress_queue = queue.Queue()
+        cancel_event = threading.Event()
+        started = time.perf_counter()
+
+        win = tk.Toplevel(self.root)
+        win.title("完整更新（含基本面）" if update_fundamentals else "快速更新股價")
+        win.geometry("420x180")
+        win.transient(self.root)
+
+        status_label = tk.Label(win, text="準備中...")
+        status_label.pack(pady=10)
+        bar = ttk.Progressbar(win, length=360, mode="determinate")
+        bar.pack(pady=5)
+        speed_label = tk.Label(win, text="", fg="gray")
+        speed_label.pack(pady=5)
+
+        def cancel():
+            cancel_event.set()
+            cancel_button.config(state=tk.DISABLED, text="取消中...")
+
+        cancel_button = tk.Button(win, text="取消", width=12, command=cancel)
+        cancel_button.pack(pady=10)
+        win.protocol("WM_DELETE_WINDOW", cancel)
+
+        def run():
+            try:
+                summary = download.update_all_ticker(
+                    update_fundamentals=update_fundamentals,
+                    batch_size=download.BATCH_SIZE,
+                    progress=lambda done, total, ticker, message: progress_queue.put(
+                        ("progress", done, total, ticker, message)),
+                    cancel_event=cancel_event)
+                progress_queue.put(("done", summary))
+            except Exception as e:
+                progress_queue.put(("error", str(e)))
+
+        def poll():
+            # 只在 Tk 主執行緒更新元件
+            try:
+                while True:
+                    item = progress_queue.get_nowait()
+                    if item[0] == "progress":
+                        _, done, total, ticker, message = item
+                        bar.config(maximum=max(total, 1), value=done)
+                        status_label.config(text=f"[{done}/{total}] {ticker} {message}")
+                        elapsed = time.perf_counter() - started
+                        speed_label.config(text=f"{done / elapsed:.1f} tickers/sec | {elapsed:.0f}s")
+                    elif item[0] == "done":
+                        summary = item[1]
+                        win.destroy()
+                        title = "已取消" if summary["cancelled"] else "更新完成"
+                        messagebox.showinfo(title, f"成功：{summary['success']}/{summary['total']}\n"
+                                                   f"失敗：{summary['failed']}/{summary['total']}\n"
+                                                   f"耗時：{summary['elapsed']:.1f}s")
+                        return
+                    elif item[0] == "error":
+                        win.destroy()
+                        messagebox.showerror("更新失敗", item[1])
+                        return
+            except queue.Empty:
+                pass
+            self.root.after(100, poll)
+
+        self.update_thread = threading.Thread(target=run, daemon=True)
+        self.update_thread.start()
+        self.root.after(100, poll)
+
     # ===== 新增股票頁面（加入分類選擇）=====
     def show_insert_page(self):
         insert_frame = tk.Frame(self.root)
@@ -171,57 +345,103 @@ class StockApp:
 
         tk.Label(name_frame, text=f"Stock List - {category_name}", font=("Arial", 16)).pack(pady=10)
 
-        # 取得股票列表
-        if category_id is None:
-            tickers = db.get_all_tickers()
-        else:
-            tickers = [t[0] for t in db.get_tickers_by_category(category_id)]
-
-        # 建立可滾動的 Frame
-        container = tk.Frame(name_frame)
-        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        canvas = tk.Canvas(container)
-        scrollbar = tk.Scrollbar(container, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas)
-
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        # 一次查出股票與分類（避免每檔股票各查一次）
+        category_map = db.get_ticker_category_map(category_id)
+        items = [(ticker, ", ".join(cats) if cats else "未分類") for ticker, cats in category_map.items()]
 
-        # 股票列表
-        for ticker in tickers:
-            ticker_name = ticker[0] if isinstance(ticker, (tuple, list)) else ticker
+        actions = [
+            ("基本面", 10, self.view_fundamentals, {}),
+            ("技術面", 12, self.view_ticker, {}),
+            ("編輯分類", 10, self.edit_ticker_categories, {}),
+            ("刪除", 8, lambda t: self.delete_ticker_ui(t, category_id, category_name), {"fg": "white", "bg": "red"}),
+        ]
+        ticker_list = VirtualTickerList(name_frame, items, actions)
+        ticker_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-            row = tk.Frame(scrollable_frame, relief=tk.RIDGE, borderwidth=1)
-            row.pack(fill=tk.X, pady=3, padx=5)
+        tk.Button(name_frame, text="返回", width=15, command=self.back).pack(pady=10)
 
-            # 顯示股票分類標籤
-            ticker_cats = db.get_ticker_categories(ticker_name)
-            cat_labels = ", ".join([c[1] for c in ticker_cats]) if ticker_cats else "未分類"
+        self.show_frame(name_frame)
 
-            info_frame = tk.Frame(row)
-            info_frame.pack(side=tk.LEFT, padx=10, pady=5)
+    # ===== 股票篩選 =====
+    def show_screener_page(self):
+        screen_frame = tk.Frame(self.root)
 
-            tk.Label(info_frame, text=ticker_name, font=("Arial", 11, "bold")).pack(anchor=tk.W)
-            tk.Label(info_frame, text=f"[{cat_labels}]", font=("Arial", 8), fg="gray").pack(anchor=tk.W)
+        tk.Label(screen_frame, text="股票篩選", font=("Arial", 16)).pack(pady=10)
 
-            tk.Button(row, text="基本面", width=10,
-                      command=lambda t=ticker_name: self.view_fundamentals(t)).pack(side=tk.LEFT, padx=5)
-            tk.Button(row, text="技術面", width=12,
-                      command=lambda t=ticker_name: self.view_ticker(t)).pack(side=tk.LEFT, padx=5)
-            tk.Button(row, text="編輯分類", width=10,
-                      command=lambda t=ticker_name: self.edit_ticker_categories(t)).pack(side=tk.LEFT, padx=5)
-            tk.Button(row, text="刪除", width=8, fg="white", bg="red",
-                      command=lambda t=ticker_name: self.delete_ticker_ui(t, category_id, category_name)).pack(
-                side=tk.LEFT, padx=5)
+        input_frame = tk.Frame(screen_frame)
+        input_frame.pack(fill=tk.X, padx=10)
+        expr_entry = tk.Entry(input_frame, font=("Arial", 11))
+        expr_entry.insert(0, "revenue_yoy > 20% and net_margin > 15% and close > ma200")
+        expr_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        categories = db.get_all_categories()
+        category_box = ttk.Combobox(input_frame, state="readonly", width=14,
+                                    values=["全部股票"] + [name for _, name in categories])
+        category_box.current(0)
+        category_box.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(screen_frame, text="可用欄位：" + ", ".join(screener.available_columns()),
+                 font=("Arial", 8), fg="gray", wraplength=760, justify=tk.LEFT).pack(padx=10, pady=5, anchor=tk.W)
+        status_label = tk.Label(screen_frame, text="", fg="gray")
+        status_label.pack(anchor=tk.W, padx=10)
+
+        # Treeview 本身只繪製看得到的列，結果再多也不用虛擬化
+        table_frame = tk.Frame(screen_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(table_frame, show="headings")
+        scrollbar = tk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        tk.Button(name_frame, text="返回", width=15, command=self.back).pack(pady=10)
-
-        self.show_frame(name_frame)
+        def format_value(col, value):
+            if pd.isna(value):
+                return "-"
+            if col.endswith(("_yoy", "_margin", "_ratio")):
+                return f"{value * 100:.1f}%"
+            if abs(value) >= 1e6:
+                return f"{value:,.0f}"
+            return f"{value:.2f}"
+
+        def run_screen():
+            category_name = category_box.get()
+            category_id = next((cid for cid, name in categories if name == category_name), None)
+            t0 = time.perf_counter()
+            try:
+                result = screener.screen(expr_entry.get(), category_id=category_id)
+            except ValueError as e:
+                messagebox.showerror("條件錯誤", str(e))
+                return
+            elapsed = time.perf_counter() - t0
+
+            columns = ["ticker"] + list(result.columns)
+            tree.delete(*tree.get_children())
+            tree["columns"] = columns
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=90, anchor=tk.E if col != "ticker" else tk.W)
+            for ticker, row in zip(result.index, result.itertuples(index=False)):
+                tree.insert("", tk.END, iid=ticker,
+                            values=[ticker] + [format_value(col, v) for col, v in zip(result.columns, row)])
+            status_label.config(text=f"{len(result)} 檔符合（{elapsed * 1000:.0f} ms）")
+
+        def selected_ticker():
+            selection = tree.selection()
+            return selection[0] if selection else None
+
+        tree.bind("<Double-1>", lambda e: selected_ticker() and self.view_ticker(selected_ticker()))
+        expr_entry.bind("<Return>", lambda e: run_screen())
+        tk.Button(input_frame, text="篩選", width=8, command=run_screen).pack(side=tk.LEFT, padx=5)
+
+        btn_frame = tk.Frame(screen_frame)
+        btn_frame.pack(pady=5)
+        tk.Button(btn_frame, text="基本面", width=10,
+                  command=lambda: selected_ticker() and self.view_fundamentals(selected_ticker())).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="技術面", width=10,
+                  command=lambda: selected_ticker() and self.view_ticker(selected_ticker())).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="返回", width=10, command=self.back).pack(side=tk.LEFT, padx=5)
+
+        self.show_frame(screen_frame)
 
     # ===== 編輯股票分類 =====
     def edit_ticker_categories(self, ticker):
@@ -355,6 +575,9 @@ class StockApp:
 
     # ===== 以下是原有的技術面、基本面分析（保持不變）=====
     def view_ticker(self, ticker):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from charting import PriceChart
         self.ticker = ticker
         self.df = db.select_price(ticker)
         self.time_offset = 0
@@ -387,6 +610,7 @@ class StockApp:
         self.ax = self.figure.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.figure, chart_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.chart = PriceChart(self.ax, self.df, ticker, db.select_indicators(ticker, ["sma20", "sma60"]))
 
         tk.Button(chart_frame, text="返回", command=self.back).pack(pady=5)
 
@@ -413,54 +637,12 @@ class StockApp:
         self.draw_chart(self.chart_type, self.current_period)
 
     def draw_chart(self, chart_type="price", period="6M"):
-        self.ax.clear()
-        df = self.df.copy()
-
-        if len(df) >= 20:
-            df['MA20'] = df['close'].rolling(20).mean()
-        if len(df) >= 60:
-            df['MA60'] = df['close'].rolling(60).mean()
-
-        if period != "ALL":
-            end_date = df["date"].max()
-            if period == "1M":
-                end_date -= pd.DateOffset(months=self.time_offset)
-                start_date = end_date - pd.DateOffset(months=1)
-            elif period == "6M":
-                end_date -= pd.DateOffset(months=6 * self.time_offset)
-                start_date = end_date - pd.DateOffset(months=6)
-            elif period == "1Y":
-                end_date -= pd.DateOffset(years=self.time_offset)
-                start_date = end_date - pd.DateOffset(years=1)
-            df = df[(df["date"] > start_date) & (df["date"] <= end_date)]
-
-        if chart_type == "price":
-            self.ax.plot(df["date"], df["close"], label="Close", color='blue')
-            if 'MA20' in df:
-                self.ax.plot(df["date"], df['MA20'], label="MA20", color='orange')
-            if 'MA60' in df:
-                self.ax.plot(df["date"], df['MA60'], label="MA60", color='green')
-            self.ax.set_title(f"{self.ticker} Price Chart ({period})")
-            self.ax.set_ylabel("Price")
-            self.ax.legend()
-
-        elif chart_type == "change":
-            df['daily_change'] = df['close'].pct_change() * 100
-            colors = ['red' if x > 0 else 'green' if x < 0 else 'gray' for x in df['daily_change']]
-            self.ax.bar(df["date"], df['daily_change'], color=colors, alpha=0.7, width=0.8)
-            self.ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-            self.ax.set_title(f"{self.ticker} Daily Price Change ({period})")
-            self.ax.set_ylabel("Change (%)")
-            avg_change = df['daily_change'].mean()
-            self.ax.text(0.02, 0.98, f"Avg: {avg_change:.2f}%",
-                         transform=self.ax.transAxes, verticalalignment='top',
-                         bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
-
-        self.ax.set_xlabel("Date")
-        self.figure.autofmt_xdate()
-        self.canvas.draw()
+        self.chart.draw(chart_type, period, self.time_offset)
+        self.canvas.draw_idle()
 
     def view_fundamentals(self, ticker):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         self.ticker = ticker
         df = db.select_fundamentals(ticker)
 
@@ -0,0 +1,49 @@
+"""
+資料庫升級工具：把舊版 price_daily 轉成 price_bars 精簡格式並重整檔案
+
+用法：
+    python migrate_db.py                    # 預設 database/stock.db
+    python migrate_db.py --db path/to/stock.db --no-vacuum
+"""
+import argparse
+import os
+
+import database as db
+
+
+def _size_mb(path):
+    total = 0
+    for suffix in ("", "-wal"):
+        if os.path.exists(path + suffix):
+            total += os.path.getsize(path + suffix)
+    return total / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate price_daily to the compact price_bars layout")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 檔案路徑")
+    parser.add_argument("--no-vacuum", action="store_true", help="搬移後不執行 VACUUM")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"⚠️ {args.db} not found")
+        return
+
+    db.configure(path=args.db)
+    before = _size_mb(args.db)
+
+    if not db._table_exists('price_daily'):
+        print("✓ Already using price_bars, nothing to migrate")
+    db.create_table()  # 建立新表，並自動搬移 price_daily
+
+    if not args.no_vacuum:
+        print("🧹 VACUUM ...")
+        db.vacuum()
+        db.get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    after = _size_mb(args.db)
+    print(f"📦 {args.db}: {before:.1f} MB → {after:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+股票篩選器
+
+用簡單的條件式一次篩選所有股票（或某個分類），欄位包含最新年度的基本面、年增率、
+最後一個交易日的股價與技術指標，例如：
+
+    revenue_yoy > 20% and net_margin > 15% and close > ma200
+    rsi14 < 30 or (pe < 15 and debt_to_asset_ratio < 0.5)
+
+語法：比較 (> >= < <= == !=)、and / or / not、+ - * /、括號，數字可以加 % （20% 即 0.2）。
+比率欄位（net_margin、revenue_yoy…）都是小數，跟資料庫裡存的一樣。
+條件在整張表上以 pandas 向量化計算，缺少資料（NaN）的股票不會符合任何比較，
+加上 not 也一樣（not pe > 30 不會選出沒有本益比的股票）。
+
+用法：
+    python screener.py "revenue_yoy > 20% and close > ma200"
+"""
+import ast
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import database as db
+
+# 年增率欄位：最新年度相對前一年度的變化（小數）
+YOY_COLUMNS = ['revenue', 'net_income', 'operating_income', 'eps', 'free_cash_flow']
+
+# 技術指標的別名，讓條件可以寫 ma200
+ALIASES = {'ma20': 'sma20', 'ma50': 'sma50', 'ma60': 'sma60', 'ma200': 'sma200'}
+
+_PERCENT = re.compile(r'(\d+(?:\.\d*)?|\.\d+)\s*%')
+
+_COMPARE = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+class _Mask:
+    """
+    條件的結果：matches 為符合的列，fails 為確定不符合的列（用到的值都存在、比較不成立）
+    兩者都不是的列代表缺少資料；not 只交換兩者，缺資料的列仍然不符合
+    """
+    __slots__ = ('matches', 'fails')
+
+    def __init__(self, matches, fails):
+        self.matches = matches
+        self.fails = fails
+
+
+# 面板快取：股價、基本面、技術指標或分類成員變動後清除
+_panel_lock = threading.Lock()
+_panels = {}
+# 每次清除加一；建立面板期間有寫入時（版本不同）不放進快取，避免存下寫入前讀到的舊資料
+_panel_version = 0
+
+
+# ========== 資料面板 ==========
+
+def build_panel(category_id=None):
+    """每檔股票一列：最新年度基本面 + 年增率 + 最後一天股價與指標"""
+    # 只讀最新年度與前一年度；前一年度缺資料時年增率為 NaN
+    fundamentals = db.select_latest_fundamentals(years=2, category_id=category_id)
+    latest = fundamentals.drop_duplicates('ticker', keep='last').set_index('ticker')
+    previous = fundamentals[fundamentals.duplicated('ticker', keep='last')].set_index('ticker')
+
+    for col in YOY_COLUMNS:
+        prior = previous[col].reindex(latest.index)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            latest[f'{col}_yoy'] = np.where(prior != 0, (latest[col] - prior) / prior.abs(), np.nan)
+    latest = latest.rename(columns={'year': 'fiscal_year'})
+
+    prices = db.select_latest_prices(category_id=category_id).set_index('ticker')
+    panel = prices.join(latest, how='outer')
+
+    # 估值欄位需要股價與基本面同時存在
+    with np.errstate(divide='ignore', invalid='ignore'):
+        panel['pe'] = np.where(panel['eps'] > 0, panel['close'] / panel['eps'], np.nan)
+        panel['market_cap'] = panel['close'] * panel['shares']
+    panel.index.name = 'ticker'
+    return panel
+
+
+def get_panel(category_id=None):
+    key = (db.DB_PATH, category_id)
+    with _panel_lock:
+        panel = _panels.get(key)
+        version = _panel_version
+    if panel is None:
+        panel = build_panel(category_id)
+        with _panel_lock:
+            if version == _panel_version:
+                _panels[key] = panel
+    return panel
+
+
+def clear_cache():
+    global _panel_version
+    with _panel_lock:
+        _panels.clear()
+        _panel_version += 1
+
+
+def _on_write(event, ticker, data):
+    clear_cache()
+
+
+db.add_write_listener(_on_write)
+
+
+def available_columns():
+    """條件式可用的欄位名稱（含別名）"""
+    panel_columns = ['open', 'high', 'low', 'close', 'volume', *db.INDICATOR_COLUMNS,
+                     'fiscal_year', *db.FUNDAMENTAL_COLUMNS[2:], *(f'{c}_yoy' for c in YOY_COLUMNS),
+                     'pe', 'market_cap']
+    return panel_columns + list(ALIASES)
+
+
+# ========== 條件式 ==========
+
+def parse(expression):
+    """
+    把條件式解析成 Python AST，只允許篩選用得到的語法
+    有語法錯誤或不支援的寫法時拋出 ValueError
+    """
+    source = _PERCENT.sub(r'(\1 / 100)', expression.strip())
+    if not source:
+        raise ValueError("Empty expression")
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {expression}") from e
+
+    columns = set(available_columns())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in columns:
+                raise ValueError(f"Unknown column: {node.id}")
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                raise ValueError(f"Unsupported value: {node.value!r}")
+        elif not isinstance(node, (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not,
+                                   ast.USub, ast.UAdd, ast.BinOp, ast.Compare, ast.Load,
+                                   *_COMPARE, *_ARITHMETIC)):
+            raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+    return tree
+
+
+def _evaluate(node, panel):
+    """在整張面板上計算，條件回傳 _Mask、數值回傳 float 陣列"""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, panel)
+    if isinstance(node, ast.Name):
+        return panel[ALIASES.get(node.id, node.id)].to_numpy(dtype=float)
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, panel)
+        if isinstance(node.op, ast.Not):
+            mask = _as_mask(operand)
+            return _Mask(mask.fails, mask.matches)
+        operand = _as_number(operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp):
+        left, right = _as_number(_evaluate(node.left, panel)), _as_number(_evaluate(node.right, panel))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return _ARITHMETIC[type(node.op)](left, right)
+    if isinstance(node, ast.BoolOp):
+        masks = [_as_mask(_evaluate(value, panel)) for value in node.values]
+        matches = [mask.matches for mask in masks]
+        fails = [mask.fails for mask in masks]
+        if isinstance(node.op, ast.And):
+            return _Mask(np.logical_and.reduce(matches), np.logical_or.reduce(fails))
+        return _Mask(np.logical_or.reduce(matches), np.logical_and.reduce(fails))
+    if isinstance(node, ast.Compare):
+        # 支援連續比較，例如 30 < rsi14 < 70；NaN 的比較結果一律為 False
+        mask = np.ones(len(panel), dtype=bool)
+        defined = np.ones(len(panel), dtype=bool)
+        left = _as_number(_evaluate(node.left, panel))
+        for op, right_node in zip(node.ops, node.comparators):
+            right = _as_number(_evaluate(right_node, panel))
+            with np.errstate(invalid='ignore'):
+                mask &= np.broadcast_to(_COMPARE[type(op)](left, right), mask.shape)
+            defined &= np.broadcast_to(~np.isnan(left) & ~np.isnan(right), defined.shape)
+            left = right
+        return _Mask(mask, defined & ~mask)
+    raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+
+def _as_mask(value):
+    if isinstance(value, _Mask):
+        return value
+    raise ValueError("and / or / not need comparisons on both sides")
+
+
+def _as_number(value):
+    if isinstance(value, _Mask):
+        raise ValueError("comparisons cannot be used as numbers")
+    return value
+
+
+def screen(expression, category_id=None, sort_by=None, ascending=False, limit=None):
+    """
+    篩選股票，回傳符合條件的 DataFrame（index 為 ticker），
+    欄位包含條件式用到的欄位與最新收盤價
+
+    Args:
+        category_id: 只篩選該分類下的股票，None 為全部
+        sort_by: 排序欄位，預設依 ticker
+    """
+    tree = parse(expression)
+    panel = get_panel(category_id)
+    mask = _as_mask(_evaluate(tree, panel)).matches if len(panel) else np.zeros(0, dtype=bool)
+
+    used = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            column = ALIASES.get(node.id, node.id)
+            if column not in used:
+                used.append(column)
+    columns = ['close'] + [c for c in used if c != 'close']
+    if sort_by:
+        sort_by = ALIASES.get(sort_by, sort_by)
+        if sort_by not in columns:
+            columns.append(sort_by)
+
+    result = panel.loc[mask, columns]
+    if sort_by:
+        result = result.sort_values(sort_by, ascending=ascending, na_position='last')
+    if limit is not None:
+        result = result.head(limit)
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('Usage: python screener.py "<expression>"')
+        sys.exit(1)
+    t0 = time.perf_counter()
+    found = screen(sys.argv[1])
+    with pd.option_context('display.max_rows', 200, 'display.width', 160):
+        print(found)
+    print(f"✅ {len(found)} tickers matched in {time.perf_counter() - t0:.3f}s")
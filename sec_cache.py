@@ -0,0 +1,165 @@
+"""
+SEC companyfacts 的本地回應快取
+
+每個 CIK 存一份 gzip 壓縮的 JSON 與 ETag / Last-Modified，
+下次請求帶上條件式 header，SEC 回 304 時就不用重新下載與解析。
+快取總大小超過 MAX_CACHE_BYTES 時，依最後使用時間（檔案 mtime）淘汰最久沒用的。
+"""
+import gzip
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = 'database/sec_cache'
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # 512 MB
+# 超過這個秒數的暫存檔視為中斷的寫入（例如行程被強制結束），evict() 時刪除
+STALE_TMP_SECONDS = 3600
+
+_lock = threading.Lock()
+
+
+def _paths(cik):
+    base = os.path.join(CACHE_DIR, f"CIK{cik}")
+    return base + ".json.gz", base + ".meta.json"
+
+
+def get_meta(cik):
+    """回傳快取內容的 {'etag', 'last_modified'}，沒有快取時回傳 None"""
+    payload_path, meta_path = _paths(cik)
+    if not os.path.exists(payload_path):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {'etag': meta.get('etag'), 'last_modified': meta.get('last_modified')}
+
+
+def get_validators(cik):
+    """回傳條件式請求要帶的 header，沒有快取時回傳空 dict"""
+    return validator_headers(get_meta(cik))
+
+
+def validator_headers(meta):
+    """把 get_meta() 的結果轉成 If-None-Match / If-Modified-Since header"""
+    if not meta:
+        return {}
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def load(cik):
+    """讀取快取的原始 JSON bytes，並更新最後使用時間；沒有快取時回傳 None"""
+    payload_path, _ = _paths(cik)
+    try:
+        with gzip.open(payload_path, 'rb') as f:
+            payload = f.read()
+        os.utime(payload_path)
+        return payload
+    except (OSError, EOFError):
+        return None
+
+
+def store(cik, payload, etag=None, last_modified=None):
+    """寫入快取（先寫暫存檔再 rename，避免讀到寫一半的檔案），並視需要淘汰舊資料"""
+    store_stream(cik, [payload], etag, last_modified)
+
+
+def store_stream(cik, chunks, etag=None, last_modified=None):
+    """
+    邊下載邊寫入快取，chunks 為 bytes 的 iterable（例如 response.iter_content()），
+    整份回應不需要同時放在記憶體裡；下載或寫入失敗時刪除暫存檔，原有的快取不受影響
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    payload_path, meta_path = _paths(cik)
+    tmp_suffix = f".{threading.get_ident()}.tmp"
+
+    try:
+        with gzip.open(payload_path + tmp_suffix, 'wb', compresslevel=6) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        with open(meta_path + tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump({'etag': etag, 'last_modified': last_modified}, f)
+
+        os.replace(payload_path + tmp_suffix, payload_path)
+        os.replace(meta_path + tmp_suffix, meta_path)
+    except BaseException:
+        for path in (payload_path + tmp_suffix, meta_path + tmp_suffix):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        raise
+    evict()
+
+
+def open_payload(cik):
+    """以串流方式開啟快取的 JSON（解壓後的 bytes），並更新最後使用時間；沒有快取時回傳 None"""
+    payload_path, _ = _paths(cik)
+    try:
+        f = gzip.open(payload_path, 'rb')
+        os.utime(payload_path)
+        return f
+    except OSError:
+        return None
+
+
+def evict(max_bytes=None):
+    """
+    快取超過上限時，從最久沒使用的開始刪除，回傳刪除的 CIK 數量
+    也會刪除超過 STALE_TMP_SECONDS 的暫存檔（中斷的寫入）
+    """
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(CACHE_DIR)
+        except FileNotFoundError:
+            return 0
+        now = time.time()
+        for name in names:
+            if name.endswith(".tmp"):
+                path = os.path.join(CACHE_DIR, name)
+                try:
+                    if now - os.stat(path).st_mtime > STALE_TMP_SECONDS:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if not name.endswith(".json.gz"):
+                continue
+            try:
+                st = os.stat(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name[3:-len(".json.gz")]))
+            total += st.st_size
+
+        removed = 0
+        for _, size, cik in sorted(entries):
+            if total <= max_bytes:
+                break
+            for path in _paths(cik):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def invalidate(cik):
+    """刪除指定 CIK 的快取"""
+    for path in _paths(cik):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,216 @@
+"""
+SEC 的 HTTP 用戶端
+
+SEC 的公平使用規範是每秒最多 10 個請求，超過會回 429 甚至暫時封鎖 IP。
+所有 SEC 請求都透過這裡送出：
+  - 共用一個 requests.Session（keep-alive，連線池大小可設定），不用每次重新建立 TLS 連線
+  - token bucket 限速，所有 thread 共用同一個 bucket，並行下載也不會超過速率上限
+  - 429 / 5xx、連線錯誤與逾時會以指數退避加隨機抖動重試，回應有 Retry-After 時以它為準
+  - 每個請求都有逾時，並記錄延遲與狀態碼，metrics() 可以查看 p50 / p95
+
+網址的 host 可以透過 configure() 更換，例如指向本地的測試伺服器：
+    sec_client.configure(www_url="http://127.0.0.1:8000", data_url="http://127.0.0.1:8000")
+"""
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HEADERS = {"User-Agent": "j74062@email.com"}
+
+WWW_URL = "https://www.sec.gov"
+DATA_URL = "https://data.sec.gov"
+
+RATE_LIMIT = 10         # 每秒請求數
+BURST = 1               # bucket 容量，1 代表請求平均分散，任何一秒內都不會超過 RATE_LIMIT
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5   # 第 n 次重試等待 0 ~ BACKOFF_SECONDS * 2^n 秒
+MAX_BACKOFF_SECONDS = 30
+TIMEOUT = (5, 30)       # (連線, 讀取) 逾時秒數
+POOL_SIZE = 16          # 連線池大小，至少要跟下載的 thread 數一樣
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 延遲統計只保留最近這麼多筆
+LATENCY_SAMPLES = 10000
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket：每次 acquire 取一個 token，不夠時等待"""
+
+    def __init__(self, rate, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個 token，回傳等待的秒數"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先預約再等待：token 可以是負數，排在後面的 thread 會等更久，sleep 時不佔用鎖
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class RequestMetrics:
+    """請求延遲（收到 header 為止）、狀態碼、重試與限速等待的統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latencies = deque(maxlen=LATENCY_SAMPLES)
+            self._status = Counter()
+            self._requests = 0
+            self._retries = 0
+            self._errors = 0
+            self._throttled = 0.0
+
+    def record(self, latency, status):
+        """status 為 HTTP 狀態碼，連線錯誤或逾時為例外類別名稱"""
+        with self._lock:
+            self._requests += 1
+            self._status[status] += 1
+            if isinstance(status, int):
+                self._latencies.append(latency)
+            else:
+                self._errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self._retries += 1
+
+    def record_throttle(self, seconds):
+        with self._lock:
+            self._throttled += seconds
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            ms = lambda v: None if v is None else round(v * 1000, 2)
+            return {
+                'requests': self._requests,
+                'retries': self._retries,
+                'errors': self._errors,
+                'status': dict(self._status),
+                'throttled_seconds': round(self._throttled, 3),
+                'latency_ms': {
+                    'p50': ms(_percentile(latencies, 0.50)),
+                    'p95': ms(_percentile(latencies, 0.95)),
+                    'max': ms(latencies[-1] if latencies else None),
+                    'mean': ms(sum(latencies) / len(latencies) if latencies else None),
+                },
+            }
+
+
+class SecClient:
+    def __init__(self, www_url=WWW_URL, data_url=DATA_URL, rate=RATE_LIMIT, burst=BURST,
+                 retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS,
+                 timeout=TIMEOUT, pool_size=POOL_SIZE, headers=None):
+        self.www_url = www_url.rstrip("/")
+        self.data_url = data_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.metrics = RequestMetrics()
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS if headers is None else headers)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def www(self, path):
+        return self.www_url + path
+
+    def data(self, path):
+        return self.data_url + path
+
+    def _delay(self, attempt, response=None):
+        """第 attempt 次重試前要等待的秒數（full jitter），有 Retry-After 時至少等那麼久"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_backoff, float(retry_after)))
+            except ValueError:
+                pass  # HTTP 日期格式的 Retry-After 不處理，使用退避時間
+        return delay
+
+    def get(self, url, headers=None, stream=False):
+        """
+        送出 GET 請求，遇到 429 / 5xx、連線錯誤或逾時會自動重試
+        重試用完時：HTTP 錯誤回傳最後一次的回應（由呼叫端 raise_for_status），連線錯誤則拋出例外
+        """
+        for attempt in range(self.retries + 1):
+            self.metrics.record_throttle(self.bucket.acquire())
+            started = time.perf_counter()
+            try:
+                r = self.session.get(url, headers=headers, stream=stream, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.record(time.perf_counter() - started, type(e).__name__)
+                if attempt == self.retries:
+                    raise
+                self.metrics.record_retry()
+                time.sleep(self._delay(attempt))
+                continue
+
+            self.metrics.record(time.perf_counter() - started, r.status_code)
+            if r.status_code not in RETRY_STATUS or attempt == self.retries:
+                return r
+            r.close()  # 串流模式下要釋放連線
+            self.metrics.record_retry()
+            time.sleep(self._delay(attempt, r))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure(**options):
+    """
+    以新的設定建立共用的用戶端，參數同 SecClient，例如 configure(rate=5, data_url="http://127.0.0.1:8000")
+    應在開始下載前呼叫，舊的 session 會被關閉
+    """
+    global _client
+    with _client_lock:
+        old, _client = _client, SecClient(**options)
+    if old is not None:
+        old.close()
+    return _client
+
+
+def get_client():
+    """取得所有 thread 共用的用戶端，第一次使用時以預設值建立"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SecClient()
+        return _client
+
+
+def metrics():
+    return get_client().metrics.snapshot()
@@ -0,0 +1,111 @@
+"""
+companyfacts JSON 的串流解析
+
+大型公司的 companyfacts 可能有數十 MB，json.loads 會建立整棵物件樹，
+但基本面只用到幾十個 us-gaap / ifrs-full tag 的 10-K 資料。
+這裡用 ijson 一次取出一個 tag，只保留需要的 tag、第一個 unit、form == "10-K" 且有 fy 的資料列，
+記憶體用量只跟單一 tag 與保留下來的資料有關，與檔案大小無關。
+
+回傳的 dict 與 json.loads 的結構相同（只是內容被裁減），可以直接交給 download_data.build_fundamentals。
+需要 ijson（選用套件），沒有安裝時改用 json.load 後再裁減，結果相同但沒有省記憶體。
+"""
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# 依優先順序解析的會計準則，結果只包含第一個存在的準則（dei 等其他準則不會出現）
+STANDARDS = ("us-gaap", "ifrs-full")
+
+# 每筆資料只保留 build_fundamentals 會用到的欄位
+ROW_KEYS = ("form", "fy", "val")
+
+
+# 串流讀取時每次讀入的大小
+CHUNK_BYTES = 64 * 1024
+
+
+def is_available():
+    return ijson is not None
+
+
+def _reduce_concept(concept):
+    """只留下第一個 unit 中 form == "10-K" 且有 fy 的資料列"""
+    units = concept.get("units")
+    if not units:
+        return {"units": {}}
+    unit, rows = next(iter(units.items()))
+    return {"units": {unit: [{k: r[k] for k in ROW_KEYS if k in r}
+                             for r in rows if r.get("form") == "10-K" and "fy" in r]}}
+
+
+def _reduce(facts, tags):
+    """把完整的 companyfacts dict 裁減成與串流解析相同的結果（沒有 ijson 時使用，也用來驗證）"""
+    for standard in STANDARDS:
+        concepts = facts.get("facts", {}).get(standard)
+        if concepts:
+            return {"facts": {standard: {tag: _reduce_concept(concept)
+                                         for tag, concept in concepts.items() if tag in tags}}}
+    return {"facts": {}}
+
+
+def _number(value):
+    # ijson 預設把小數讀成 Decimal，轉成 float 與 json.loads 的結果相同（整數維持 int）
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _stream(source, tags, standard):
+    """
+    用 ijson 的 kvitems 逐一取出 facts.<準則> 底下的每個 tag（物件由 C 後端建立），
+    同一時間只有一個 tag 的資料在記憶體中，不需要的 tag 取出後立即丟棄
+    回傳 {tag: 裁減後的資料}，準則不存在時回傳 None
+    """
+    reduced = None
+    for tag, concept in ijson.kvitems(source, "facts." + standard, buf_size=CHUNK_BYTES):
+        if reduced is None:
+            reduced = {}
+        if tag not in tags:
+            continue
+        concept = _reduce_concept(concept)
+        for rows in concept["units"].values():
+            for row in rows:
+                for key in ("fy", "val"):
+                    if key in row:
+                        row[key] = _number(row[key])
+        reduced[tag] = concept
+    return reduced
+
+
+def parse(source, tags):
+    """
+    解析 companyfacts，回傳 {"facts": {準則: {tag: {"units": {unit: [資料列]}}}}}
+    只包含 STANDARDS 中第一個有資料的準則、tags 中的 tag，每個 tag 只有第一個 unit 的 10-K 資料
+
+    Args:
+        source: 以二進位模式開啟的檔案或串流（例如 gzip.open(...)、response.raw）
+        tags: 需要的 tag 名稱集合
+    """
+    tags = set(tags)
+    if ijson is None:
+        return _reduce(json.load(source), tags)
+
+    if not source.seekable():
+        # 找不到 us-gaap 時要從頭再讀一次，不能倒轉的串流先寫到暫存檔
+        with tempfile.TemporaryFile() as spool:
+            shutil.copyfileobj(source, spool, CHUNK_BYTES)
+            spool.seek(0)
+            return parse(spool, tags)
+
+    # 幾乎所有公司都用 us-gaap：一次只解析一個準則，沒有的話再從頭解析下一個
+    start = source.tell()
+    for standard in STANDARDS:
+        source.seek(start)
+        reduced = _stream(source, tags, standard)
+        if reduced is not None:
+            return {"facts": {standard: reduced}}
+    return {"facts": {}}